@@ -30,6 +30,14 @@ DB_HOST = os.getenv("DB_HOST", "")
 DB_NAME = os.getenv("DB_NAME", "")
 DB_DRIVER = os.getenv("DB_DRIVER", "ODBC Driver 18 for SQL Server")
 
+# =============================================================================
+# Local Database
+# Path of a SQLite file with a cost_lines table in the base_sql result schema
+# (built by `python -m benchmarks.local_db`). When set, it replaces SQL
+# Server, e.g. to load-test the API on a workstation. Ignored in TEST_MODE.
+# =============================================================================
+LOCAL_DB_PATH = os.getenv("LOCAL_DB_PATH", "")
+
 # =============================================================================
 # LLM API Configuration
 # Used for AI-powered chat about project data
@@ -39,6 +47,132 @@ api_key = os.getenv("LLM_API_KEY", "")
 TEMPERATURE = 0.4
 MAX_TOKENS = 5000
 FREQUENCY_PENALTY = 0.5
+# Outbound LLM HTTP client: per-request timeout and connection pool size
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+# Answers to identical (context, question) pairs are reused; 0 disables the cache
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+# At most LLM_MAX_IN_FLIGHT questions are sent to the LLM at once; up to
+# LLM_MAX_QUEUED more wait (for at most LLM_QUEUE_TIMEOUT_SECONDS), further
+# ones are rejected with 429 + Retry-After
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+LLM_MAX_QUEUED = int(os.getenv("LLM_MAX_QUEUED", "16"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "30"))
+
+# Size budget for the narrative summary used as LLM context (0 = unlimited).
+# Token budgets are estimated at SUMMARY_CHARS_PER_TOKEN characters per token.
+SUMMARY_MAX_CHARS = int(os.getenv("SUMMARY_MAX_CHARS", "24000")) or None
+SUMMARY_CHARS_PER_TOKEN = 4
+# Token budget of the context the backend builds for /api/chat when the
+# client only sends the analysis selection
+CHAT_CONTEXT_MAX_TOKENS = int(os.getenv("CHAT_CONTEXT_MAX_TOKENS", "4000"))
+
+# =============================================================================
+# Cache Configuration
+# Computed period comparisons are cached in-process so that drill-down
+# requests and repeated views don't re-run the whole pipeline
+# =============================================================================
+COMPARISON_CACHE_SIZE = int(os.getenv("COMPARISON_CACHE_SIZE", "256"))
+COMPARISON_CACHE_TTL_SECONDS = float(os.getenv("COMPARISON_CACHE_TTL_SECONDS", "600"))
+# Encoded per-period snapshots (one entry per YYYYMM period)
+PERIOD_CACHE_SIZE = int(os.getenv("PERIOD_CACHE_SIZE", "6"))
+PERIOD_CACHE_TTL_SECONDS = float(os.getenv("PERIOD_CACHE_TTL_SECONDS", "600"))
+# Per-project portfolio totals (one small entry per period). The cache always
+# holds at least a full window of the longest matrix (PORTFOLIO_MAX_MONTHS);
+# closed periods never change and are kept for PORTFOLIO_CLOSED_TTL_SECONDS
+PORTFOLIO_MAX_MONTHS = 60
+PORTFOLIO_CACHE_SIZE = int(os.getenv("PORTFOLIO_CACHE_SIZE", "72"))
+PORTFOLIO_CLOSED_TTL_SECONDS = float(os.getenv("PORTFOLIO_CLOSED_TTL_SECONDS", str(7 * 24 * 3600)))
+# Optional SQLite file shared by all uvicorn workers on the host (e.g.
+# /tmp/finance-dashboard-cache.sqlite). Empty = per-process caches only.
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "")
+# Size bound of the shared cache file's values; the oldest entries are
+# evicted beyond it (0 = unbounded)
+SHARED_CACHE_MAX_MB = float(os.getenv("SHARED_CACHE_MAX_MB", "1024"))
+
+# =============================================================================
+# Background Pre-computation
+# A scheduler started with the app polls for newly closed periods and warms
+# the period / comparison caches before users open the dashboard
+# =============================================================================
+PRECOMPUTE_ENABLED = os.getenv("PRECOMPUTE_ENABLED", "true").lower() == "true"
+PRECOMPUTE_INTERVAL_SECONDS = float(os.getenv("PRECOMPUTE_INTERVAL_SECONDS", "900"))
+# Max comparisons computed in parallel during a warm-up
+PRECOMPUTE_CONCURRENCY = int(os.getenv("PRECOMPUTE_CONCURRENCY", "2"))
+# With several uvicorn workers only the one holding a lease in this SQLite
+# file warms the caches; the last warmed period is kept there across restarts
+# (default: SHARED_CACHE_PATH, else <tmp>/finance-dashboard-scheduler.sqlite)
+PRECOMPUTE_STATE_PATH = os.getenv("PRECOMPUTE_STATE_PATH", "")
+
+# =============================================================================
+# CPU Execution
+# Number of worker processes for the CPU-bound pandas stages (combine +
+# normalize of a period). 0 runs them inline on the request thread.
+# =============================================================================
+PROCESS_POOL_WORKERS = int(os.getenv("PROCESS_POOL_WORKERS", "0"))
+
+# =============================================================================
+# Response Compression
+# Responses of at least GZIP_MINIMUM_SIZE bytes are gzip-compressed for
+# clients that accept it (event streams and xlsx/zip downloads excluded)
+# =============================================================================
+GZIP_ENABLED = os.getenv("GZIP_ENABLED", "true").lower() == "true"
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", "1024"))
+GZIP_COMPRESS_LEVEL = int(os.getenv("GZIP_COMPRESS_LEVEL", "6"))
+
+# =============================================================================
+# HTTP Caching
+# Results that only involve closed periods get immutable ETags. Bump
+# DATA_VERSION after reloading historical data to invalidate client caches.
+# =============================================================================
+DATA_VERSION = os.getenv("DATA_VERSION", "1")
+IMMUTABLE_MAX_AGE_SECONDS = int(os.getenv("IMMUTABLE_MAX_AGE_SECONDS", str(365 * 24 * 3600)))
+# How long the available periods/projects lists are cached
+FILTER_OPTIONS_TTL_SECONDS = float(os.getenv("FILTER_OPTIONS_TTL_SECONDS", "60"))
+
+# =============================================================================
+# Bulk Export Jobs
+# Portfolio exports run in background threads; finished files are kept in
+# EXPORT_DIR (default: <tmp>/finance-dashboard-exports) for EXPORT_JOB_TTL_SECONDS
+# =============================================================================
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+EXPORT_DIR = os.getenv("EXPORT_DIR", "")
+EXPORT_JOB_TTL_SECONDS = float(os.getenv("EXPORT_JOB_TTL_SECONDS", "3600"))
+
+# =============================================================================
+# Logging
+# With LOG_ASYNC, records are queued and written by a background thread.
+# LOG_SAMPLE_RATES keeps the INFO/DEBUG logs of only a fraction of the
+# requests to a path prefix, e.g. "/health=0,/api/analysis=0.1" (warnings
+# and errors are always kept). LLM request/response payloads are only
+# dumped at DEBUG.
+# =============================================================================
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() == "true"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
+# =============================================================================
+# Metrics
+# Per-stage pipeline timings, cache hit ratios and request latencies at
+# GET /metrics in Prometheus text format (requires prometheus_client)
+# =============================================================================
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Add a Server-Timing header (per-stage durations) to every response
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+
+# =============================================================================
+# Request Profiling
+# With PROFILING_ENABLED, a request sent with "X-Profile: 1" (or ?profile=1)
+# and, if PROFILING_TOKEN is set, "X-Profile-Token: <token>" is run under a
+# sampling profiler with allocation tracing. Profiles are kept in PROFILE_DIR
+# (default: <tmp>/finance-dashboard-profiles), the newest PROFILE_KEEP.
+# =============================================================================
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
 
 # =============================================================================
 # Metric Mapping
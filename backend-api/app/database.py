@@ -7,19 +7,25 @@ It provides:
 - SQLAlchemy engine and session factory
 - FastAPI dependency for database session injection
 - Test mode support for XLSX-based testing
+- A local SQLite stand-in for SQL Server (LOCAL_DB_PATH)
 """
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
 from contextlib import contextmanager
 import logging
-from app.config import DB_USER, DB_PASSWORD, DB_HOST, DB_NAME, DB_DRIVER, TEST_MODE
+from app.config import DB_USER, DB_PASSWORD, DB_HOST, DB_NAME, DB_DRIVER, TEST_MODE, LOCAL_DB_PATH
 
 logger = logging.getLogger(__name__)
 
 
 # Only create real database connection when not in test mode
-if not TEST_MODE:
+if not TEST_MODE and LOCAL_DB_PATH:
+    # Local stand-in: a SQLite file with the base_sql result rows
+    logger.info(f"LOCAL DATABASE: Using {LOCAL_DB_PATH} instead of SQL Server")
+    engine = create_engine(f"sqlite:///{LOCAL_DB_PATH}", connect_args={"check_same_thread": False})
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+elif not TEST_MODE:
     # Build the MSSQL connection string using pyodbc driver
     # The pool_pre_ping option ensures connections are validated before use
     connection_string = (
@@ -78,4 +84,25 @@ def get_db():
         yield db
     finally:
         db.close()
-        logger.debug("Database session closed")
\ No newline at end of file
+        logger.debug("Database session closed")
+
+
+@contextmanager
+def session_scope():
+    """
+    Context manager version of get_db for code that runs outside a request
+    (e.g. the background pre-computation scheduler).
+
+    Usage:
+        with session_scope() as db:
+            df = query_batch_to_df(db, "202401")
+    """
+    if TEST_MODE:
+        yield None
+        return
+
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
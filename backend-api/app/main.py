@@ -2,31 +2,67 @@
 Finance Dashboard API - Main Application Entry Point
 
 This module initializes the FastAPI application and configures:
+- Background pre-computation scheduler (started/stopped with the app)
 - CORS middleware for Next.js frontend communication
+- Queued, per-endpoint sampled logging
+- Gzip compression of large responses
+- Prometheus metrics at /metrics and Server-Timing response headers
+- Opt-in profiling of single requests (PROFILING_ENABLED)
 - API routers for projects and analysis endpoints
 - Health check and root endpoints
 """
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import Response
 import os
 import logging
-from app.routers import projects, analysis, download, chat
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+import time
+from app.config import (
+    PRECOMPUTE_ENABLED, GZIP_ENABLED, GZIP_MINIMUM_SIZE, GZIP_COMPRESS_LEVEL,
+    LOG_LEVEL, LOG_ASYNC, LOG_SAMPLE_RATES, METRICS_ENABLED, SERVER_TIMING_ENABLED,
+    PROFILING_ENABLED, PROFILING_TOKEN,
 )
+from app.routers import projects, analysis, download, chat, profiles
+from app.services.scheduler import scheduler
+from app.services import executor
+from app.services.chat_service import close_client as close_llm_client
+from app.services.export_jobs import export_jobs
+from app.utils.logging_setup import configure_logging, parse_sample_rates, LogSamplingMiddleware
+from app.utils.metrics import MetricsMiddleware, collect_timings, metrics_available, render_metrics
+from app.utils.profiling import ProfilingMiddleware
+from app.utils.responses import SelectiveGZipMiddleware, orjson
+
+# Configure logging (records are written by a background thread with LOG_ASYNC)
+configure_logging(level=LOG_LEVEL, use_queue=LOG_ASYNC)
 logger = logging.getLogger(__name__)
+log_sample_rates = parse_sample_rates(LOG_SAMPLE_RATES)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start/stop background services with the application."""
+    export_jobs.start()
+    if PRECOMPUTE_ENABLED:
+        scheduler.start()
+    else:
+        logger.info("Pre-computation scheduler disabled (PRECOMPUTE_ENABLED=false)")
+    yield
+    if PRECOMPUTE_ENABLED:
+        scheduler.stop()
+    export_jobs.shutdown()
+    executor.shutdown()
+    await close_llm_client()
+
 
 # Initialize FastAPI application with metadata for OpenAPI docs
 app = FastAPI(
     title="Finance Dashboard API",
     version="1.0.0",
-    description="API for financial forecast analysis - compares project costs across periods"
+    description="API for financial forecast analysis - compares project costs across periods",
+    lifespan=lifespan,
 )
 
 # Configure CORS to allow requests from the Next.js frontend
@@ -60,6 +96,49 @@ test_mode = os.getenv("TEST_MODE", "false").lower() == "true"
 logger.info(f"Test mode: {'ENABLED' if test_mode else 'DISABLED'}")
 app.add_middleware(TestModeMiddleware)
 
+# Middleware to report where the request's time went (db, combine, encode,
+# diff, serialize, llm) in a Server-Timing header. Stages that run after the
+# headers are sent (the body of a streamed chat answer) are not included.
+class ServerTimingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        start = time.perf_counter()
+        with collect_timings() as timings:
+            response = await call_next(request)
+        response.headers["Server-Timing"] = timings.header(total=time.perf_counter() - start)
+        # Lets the (cross-origin) frontend read the timings too
+        response.headers["Timing-Allow-Origin"] = " ".join(allowed_origins)
+        return response
+
+if SERVER_TIMING_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
+logger.info(f"Server-Timing header: {'ENABLED' if SERVER_TIMING_ENABLED else 'DISABLED'}")
+
+# Compress large responses (wraps the middleware above)
+if GZIP_ENABLED:
+    app.add_middleware(SelectiveGZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE, compresslevel=GZIP_COMPRESS_LEVEL)
+logger.info(f"Response compression: {'gzip >= ' + str(GZIP_MINIMUM_SIZE) + ' bytes' if GZIP_ENABLED else 'DISABLED'}")
+logger.info(f"JSON serializer: {'orjson' if orjson is not None else 'json (install orjson for faster responses)'}")
+
+# Time requests and let pipeline stages see which endpoint they serve
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+logger.info(f"Metrics: {'ENABLED' if METRICS_ENABLED and metrics_available() else 'DISABLED'}"
+            f"{'' if metrics_available() else ' (install prometheus_client)'}")
+
+# Profile requests that ask for it (X-Profile: 1 / ?profile=1)
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+    if not PROFILING_TOKEN:
+        logger.warning("Request profiling is enabled without PROFILING_TOKEN: any client can trigger it")
+logger.info(f"Request profiling: {'ENABLED' if PROFILING_ENABLED else 'DISABLED'}")
+
+# Decide per request whether its INFO/DEBUG logs are kept (outermost, so
+# every record of the request sees the decision)
+if log_sample_rates:
+    app.add_middleware(LogSamplingMiddleware, rates=log_sample_rates)
+logger.info(f"Logging: level={LOG_LEVEL}, {'queued' if LOG_ASYNC else 'synchronous'}, "
+            f"sampling={log_sample_rates or 'off'}")
+
 # Register API routers with their URL prefixes
 logger.info("Registering API routers...")
 app.include_router(projects.router, prefix="/api/projects", tags=["Projects"])
@@ -70,6 +149,9 @@ app.include_router(download.router, prefix="/api/download", tags=["Download"])
 logger.info("  - /api/download (Download endpoints)")
 app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
 logger.info("  - /api/chat (Chat endpoints)")
+if PROFILING_ENABLED:
+    app.include_router(profiles.router, prefix="/api/profiles", tags=["Profiling"])
+    logger.info("  - /api/profiles (Request profiles)")
 
 
 
@@ -101,4 +183,16 @@ def health_check():
     Returns a simple status indicating the API is operational.
     """
     logger.debug("Health check endpoint accessed")
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Prometheus scrape endpoint: pipeline stage timings, row/byte gauges,
+    cache hit ratios, LLM limiter gauges and request latencies.
+    """
+    if not (METRICS_ENABLED and metrics_available()):
+        return Response(status_code=501, content="Metrics are disabled or prometheus_client is not installed")
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
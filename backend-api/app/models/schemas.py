@@ -9,7 +9,7 @@ This module defines the data models (schemas) used for:
 All models use Pydantic for automatic validation and serialization.
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
@@ -99,13 +99,58 @@ class ProjectSummaryRequest(BaseModel):
     metric: str = Field(..., pattern="^(forecast_costs_at_completion|ytd_actual)$")
 
 
+class PortfolioExportRequest(BaseModel):
+    """
+    Request body for a bulk portfolio export job.
+
+    Attributes:
+        from_period: Start period in YYYYMM format
+        to_period:   End period in YYYYMM format
+        metric:      Which metric to compare
+        format:      "xlsx" (one workbook) or "zip" (CSV parts per project)
+        project_nos: Optional subset of projects; all projects when omitted
+    """
+    from_period: str = Field(..., pattern=r"^\d{6}$", description="Format: YYYYMM")
+    to_period: str = Field(..., pattern=r"^\d{6}$", description="Format: YYYYMM")
+    metric: str = Field(..., pattern="^(forecast_costs_at_completion|ytd_actual)$")
+    format: str = Field("xlsx", pattern="^(xlsx|zip)$")
+    project_nos: Optional[List[int]] = None
+
+
 class ChatRequest(BaseModel):
     """
     Request body for the AI chat endpoint.
 
+    Either the frontend sends the context itself in system_prompt, or it
+    sends only the analysis selection (project_no, from_period, to_period,
+    metric) and the backend builds the context from the cached comparison.
+
     Attributes:
         user_input:    The user's question about the project data.
         system_prompt: Financial context crafted by the frontend (cost summary text).
+        project_no:    Project to build the context for (server-side context).
+        from_period:   Start period in YYYYMM format (server-side context).
+        to_period:     End period in YYYYMM format (server-side context).
+        metric:        Metric of the analysis (server-side context).
+        bypass_cache:  Ask the LLM even if this question was answered before
+                       (the fresh answer replaces the cached one).
     """
     user_input: str
-    system_prompt: str
\ No newline at end of file
+    system_prompt: Optional[str] = None
+    project_no: Optional[int] = None
+    from_period: Optional[str] = Field(None, pattern=r"^\d{6}$", description="Format: YYYYMM")
+    to_period: Optional[str] = Field(None, pattern=r"^\d{6}$", description="Format: YYYYMM")
+    metric: Optional[str] = Field(None, pattern="^(forecast_costs_at_completion|ytd_actual)$")
+    bypass_cache: bool = False
+
+    @model_validator(mode="after")
+    def _check_context(self):
+        selection = [self.project_no, self.from_period, self.to_period, self.metric]
+        if self.system_prompt is None and any(v is None for v in selection):
+            raise ValueError("Provide either system_prompt or project_no, from_period, to_period and metric")
+        return self
+
+    @property
+    def server_context(self) -> bool:
+        """True when the backend should build the context (no system_prompt sent)."""
+        return self.system_prompt is None
@@ -6,39 +6,43 @@ project costs across different time periods. It replaces the
 run_forecast_pipeline_json function from the original Streamlit app.
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 import logging
 from app.database import get_db
 from app.models.schemas import ForecastComparisonRequest, ProjectSummaryRequest
-from app.services.sql_queries import query_batch_to_df
+from app.services.portfolio import get_portfolio_totals, build_portfolio_matrix, portfolio_matrix_frame
 import pandas as pd
 
-from app.services.data_processor import (
-    combine_projects_rows,
-    table_to_nested_json,
-    compute_forecast_diff,
-    hand_crafted_summary,
-    preprocess_df_collapse_projects
+from app.services.data_processor import collapse_portfolio_totals
+from app.services.comparison import get_comparison, PeriodNotFoundError
+from app.services.http_cache import (
+    comparison_validator,
+    periods_validator,
+    latest_period,
+    not_modified,
+    with_validator,
 )
 
 
-from app.config import projects_list, metric_map
-import tempfile
-import json
-from pathlib import Path
-from typing import Dict, Any, List
+from app.config import projects_list, metric_map, SUMMARY_MAX_CHARS, PORTFOLIO_MAX_MONTHS
+from app.utils.responses import FastJSONResponse
+from app.utils.tabular import negotiate_table_format, table_response, JSON, VARY
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+# Large payloads are returned as FastJSONResponse directly, which skips
+# FastAPI's response-model validation and jsonable_encoder pass
+router = APIRouter(default_response_class=FastJSONResponse)
 
 
 @router.post("/forecast-comparison")
 def compare_forecasts(
     request: ForecastComparisonRequest,
     db: Session = Depends(get_db)
-) -> Dict[str, Any]:
+) -> FastJSONResponse:
     """
     Main analysis endpoint - compares project costs between two periods.
     
@@ -50,6 +54,9 @@ def compare_forecasts(
     3. Transforms flat data into nested cost hierarchy
     4. Computes differences between periods at all levels
     
+    Being a POST, the response is not cacheable; the GET drill-down and
+    summary endpoints carry the ETags (see app.services.http_cache).
+    
     Args:
         request: Contains from_period, to_period, project_no, and metric
         db: Database session (injected by FastAPI)
@@ -61,71 +68,30 @@ def compare_forecasts(
         HTTPException 404: If no data found for a period
         HTTPException 500: If analysis fails
     """
-    logger.info("POST /api/analysis/forecast-comparison")
-    logger.info(f"  Request parameters:")
-    logger.info(f"    - From Period: {request.from_period}")
-    logger.info(f"    - To Period: {request.to_period}")
-    logger.info(f"    - Project No: {request.project_no}")
-    logger.info(f"    - Metric: {request.metric}")
+    logger.info("POST /api/analysis/forecast-comparison (%s -> %s, project %s, %s)",
+                request.from_period, request.to_period, request.project_no, request.metric)
     
     try:
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmpdir = Path(tmpdir)
-            out_paths = []
-
-            # Process each period (from and to)
-            for period in [request.from_period, request.to_period]:
-                logger.info(f"  Processing period: {period}")
-                # Query database for this period's data
-                df = query_batch_to_df(db, period)
-                
-                if df.empty:
-                    logger.warning(f"    No data found for period {period}")
-                    raise HTTPException(
-                        status_code=404,
-                        detail=f"No data found for period {period}"
-                    )
-                
-                logger.info(f"    Retrieved {len(df)} records from database")
-
-                # Combine related projects (e.g., 2171 & 2172 become one)
-                logger.debug(f"    Combining related projects...")
-                df = combine_projects_rows(
-                    df,
-                    project_groups=projects_list,
-                    sum_cols=metric_map[request.metric]
-                )
-                logger.info(f"    After combining: {len(df)} records")
-
-                # Convert flat DataFrame to nested JSON structure
-                logger.debug(f"    Converting to nested JSON structure...")
-                json_file = table_to_nested_json(df, request.project_no)
-
-                # Save to temp file for compute_forecast_diff
-                out_path = tmpdir / f"output_{period}_{request.project_no}.json"
-                with out_path.open("w", encoding="utf-8") as f:
-                    json.dump(json_file, f, ensure_ascii=False, indent=2)
-                logger.debug(f"    Saved to: {out_path.name}")
-                out_paths.append(out_path)
-
-            # Compute differences between the two periods
-            logger.info(f"  Computing forecast differences...")
-            result = compute_forecast_diff(out_paths, request.metric)
-            
-            # Log summary of results
-            if "projects" in result:
-                num_projects = len(result["projects"])
-                logger.info(f"  Analysis complete: {num_projects} project(s) analyzed")
+        result = get_comparison(
+            db, request.from_period, request.to_period, request.project_no, request.metric
+        ).result
+
+        # Log summary of results (per-project lines only at DEBUG)
+        if "projects" in result:
+            logger.info("  Analysis complete: %d project(s) analyzed", len(result["projects"]))
+            if logger.isEnabledFor(logging.DEBUG):
                 for proj_no, proj_data in result["projects"].items():
                     total_diff = proj_data.get(f"total_{request.metric}", {}).get("difference", 0)
-                    logger.info(f"    Project {proj_no}: {total_diff:,.2f} change")
-            
-            return result
+                    logger.debug("    Project %s: %.2f change", proj_no, total_diff)
 
+        return FastJSONResponse(result)
+
+    except PeriodNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"  Analysis failed: {str(e)}", exc_info=True)
+        logger.error("  Analysis failed: %s", e, exc_info=True)
         raise HTTPException(
             status_code=500,
             detail=f"Analysis failed: {str(e)}"
@@ -138,6 +104,10 @@ def get_project_summary(
     from_period: str,
     to_period: str,
     metric: str,
+    request: Request,
+    max_chars: Optional[int] = Query(None, gt=0),
+    max_tokens: Optional[int] = Query(None, gt=0),
+    stream: bool = False,
     db: Session = Depends(get_db)
 ):
     """
@@ -146,97 +116,115 @@ def get_project_summary(
     This endpoint is useful for AI chat functionality - it provides
     a human-readable narrative of the cost changes that can be used
     as context for an LLM to answer questions about the project.
+    Cost lines are listed in order of absolute impact and the text stops
+    at the character/token budget (SUMMARY_MAX_CHARS by default).
     
     Args:
         project_no: The project ID to analyze
         from_period: Start period in YYYYMM format
         to_period: End period in YYYYMM format  
         metric: Either 'forecast_costs_at_completion' or 'ytd_actual'
+        max_chars: Optional character budget (default: SUMMARY_MAX_CHARS)
+        max_tokens: Optional token budget (estimated from characters)
+        stream: If true, stream the summary as text/plain instead of JSON
         db: Database session
     
     Returns:
         dict: {"summary": "Human-readable cost summary text"}
     """
-    logger.info(f"GET /api/analysis/summary/{project_no}")
-    logger.info(f"  Parameters: {from_period} -> {to_period}, metric={metric}")
+    logger.info("GET /api/analysis/summary/%s", project_no)
+    logger.info("  Parameters: %s -> %s, metric=%s", from_period, to_period, metric)
     
     try:
-        # First run the full analysis
-        result = compare_forecasts(
-            ForecastComparisonRequest(
-                from_period=from_period,
-                to_period=to_period,
-                project_no=project_no,
-                metric=metric
-            ),
-            db=db
-        )
+        if max_chars is None:
+            max_chars = SUMMARY_MAX_CHARS
+
+        validator_args = (db, "summary", from_period, to_period, project_no, metric, max_chars, max_tokens, stream)
+        cached = not_modified(request, comparison_validator(*validator_args))
+        if cached is not None:
+            return cached
+
+        # Reuses the analysis of /forecast-comparison when it has already run
+        comparison = get_comparison(db, from_period, to_period, project_no, metric)
+        validator = comparison_validator(*validator_args, versions=comparison.versions)
+
+        if stream:
+            logger.debug("  Streaming human-readable summary...")
+            return StreamingResponse(
+                comparison.iter_summary(max_chars=max_chars, max_tokens=max_tokens),
+                media_type="text/plain; charset=utf-8",
+                headers=validator.headers,
+            )
 
         # Generate human-readable summary from the analysis results
         logger.debug("  Generating human-readable summary...")
-        summary = hand_crafted_summary(result["projects"], metric)
-        logger.info(f"  Summary generated ({len(summary)} characters)")
+        summary = comparison.summary(max_chars=max_chars, max_tokens=max_tokens)
+        logger.info("  Summary generated (%d characters)", len(summary))
 
-        return {"summary": summary}
+        return with_validator(FastJSONResponse({"summary": summary}), validator)
 
+    except PeriodNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"  Summary generation failed: {str(e)}", exc_info=True)
+        logger.error("  Summary generation failed: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/overall-summary")
 def get_overall_summary(
     request: ProjectSummaryRequest,
+    http_request: Request,
+    format: Optional[str] = Query(None, pattern="^(json|arrow|parquet)$"),
     db: Session = Depends(get_db)
-) -> List[Dict[str, Any]]:
+):
     """
     Get a collapsed project summary for a specific period.
     
+    The table is returned as JSON records by default, or as Arrow IPC /
+    Parquet when requested via the Accept header or `format`.
+    
     Arguments:
         request: Contains period and metric
+        format: Optional explicit format (json, arrow, parquet)
         db: Database session
         
     Returns:
         List of dictionaries with collapsed project data
     """
     logger.info("POST /api/analysis/overall-summary")
-    logger.info(f"  From Period: {request.period_from}, To period: {request.period_to}, Metric: {request.metric}")
+    logger.info("  From Period: %s, To period: %s, Metric: %s", request.period_from, request.period_to, request.metric)
+    sum_col = metric_map[request.metric]
     summary_dfs = []
     try:
+        fmt = negotiate_table_format(http_request, format)
+
         for period in [request.period_from, request.period_to]:
-            logger.info(f"  Processing period: {period}")
-            # Fetch data
-            df = query_batch_to_df(db, period)
-            if df.empty:
-                logger.warning(f"  No data found for period {period}")
+            logger.info("  Processing period: %s", period)
+            # Fetch per-project totals (aggregated and filtered in SQL)
+            totals = get_portfolio_totals(db, period)
+            if totals.empty:
+                logger.warning("  No data found for period %s", period)
                 raise HTTPException(
                     status_code=404,
                     detail=f"No data found for period {period}"
                 )
-            
-            logger.info(f"  Retrieved {len(df)} records from database")
-            logger.debug("  Combining projects...")
-            df = combine_projects_rows(
-                        df,
-                        project_groups=projects_list,
-                        sum_cols=metric_map[request.metric]
-                    )
-            logger.info(f"  Combined - now we have {len(df)} projects")
-            # Collapse projects
+
+            logger.info("  Retrieved totals for %d projects", len(totals))
+            # Collapse projects into their groups
             logger.debug("  Collapsing projects...")
-            summary_df = preprocess_df_collapse_projects(df, metric_map[request.metric])
-            logger.info(f"  Collapsed to {len(summary_df)} projects")
+            summary_df = collapse_portfolio_totals(totals, projects_list, sum_col)
+            logger.info("  Collapsed to %d projects", len(summary_df))
             summary_dfs.append(summary_df)
             
         if len(summary_dfs) != 2:
             raise HTTPException(status_code=500, detail="Expected exactly two periods of results.")
 
         df_from, df_to = summary_dfs[0].copy(), summary_dfs[1].copy()
-        cols = ["iProjNo", "iProjYear", "cProjDesc", "cClientDesc", "rForecast"]
-        df_from = df_from[cols].rename(columns={"rForecast": "rForecast_from"})
-        df_to   = df_to[cols].rename(columns={"rForecast": "rForecast_to"})
+        cols = ["iProjNo", "iProjYear", "cProjDesc", "cClientDesc", sum_col]
+        df_from = df_from[cols].rename(columns={sum_col: "rForecast_from"})
+        df_to   = df_to[cols].rename(columns={sum_col: "rForecast_to"})
 
         merged = df_to.merge(df_from, on="iProjNo", how="inner", suffixes=("_to", "_from"))
         out = pd.DataFrame({
@@ -250,8 +238,187 @@ def get_overall_summary(
             - pd.to_numeric(merged["rForecast_from"], errors="coerce").fillna(0.0)
         )/1000
         out = out.sort_values("difference", ascending=False).reset_index(drop=True)
-        return out.to_dict(orient="records")
+        return table_response(out, fmt)
 
+    except HTTPException:
+        raise
     except Exception as e: 
         logger.exception("Error in /overall-summary") 
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/portfolio-matrix")
+def get_portfolio_matrix(
+    request: Request,
+    metric: str = Query("forecast_costs_at_completion", pattern="^(forecast_costs_at_completion|ytd_actual)$"),
+    to_period: Optional[str] = Query(None, pattern=r"^\d{6}$"),
+    months: int = Query(24, ge=2, le=PORTFOLIO_MAX_MONTHS),
+    format: Optional[str] = Query(None, pattern="^(json|arrow|parquet)$"),
+    db: Session = Depends(get_db)
+):
+    """
+    Projects x months matrix of the metric and its month-over-month movement.
+
+    Built from cached per-period project totals, so only months that were
+    never requested before hit the database.
+
+    Arguments:
+        metric: Metric to track (default: forecast_costs_at_completion)
+        to_period: Last period of the window in YYYYMM format (default: latest available)
+        months: Window length in months (default: 24)
+
+    Returns:
+        {"metric", "periods", "period_labels", "projects", "values", "changes"}
+        values/changes are row-aligned with projects and column-aligned with
+        periods, in millions; null where a month has no data.
+        As Arrow IPC / Parquet (Accept header or `format`), a long-form table
+        with one row per project and period (see portfolio_matrix_frame).
+    """
+    logger.info("GET /api/analysis/portfolio-matrix (metric=%s, to_period=%s, months=%s)", metric, to_period, months)
+    try:
+        fmt = negotiate_table_format(request, format)
+        if to_period is None:
+            to_period = latest_period(db)
+            if to_period is None:
+                raise HTTPException(status_code=404, detail="No periods available")
+
+        # The window ends at to_period, so it is closed when to_period is
+        validator = periods_validator(db, "portfolio-matrix", [to_period], months, metric, fmt, vary=VARY)
+        cached = not_modified(request, validator)
+        if cached is not None:
+            return cached
+
+        result = build_portfolio_matrix(db, to_period, months, metric)
+        logger.info("  Matrix built: %d projects x %d periods", len(result['projects']), len(result['periods']))
+        if fmt != JSON:
+            return with_validator(table_response(portfolio_matrix_frame(result), fmt), validator)
+        return with_validator(FastJSONResponse(result, headers={"Vary": VARY}), validator)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error in /portfolio-matrix")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# =============================================================================
+# Drill-down endpoints
+# Serve one level of the cost hierarchy at a time from a cached, indexed
+# comparison: cost types first, then subcategories, then children.
+# =============================================================================
+
+PERIOD_PATTERN = r"^\d{6}$"
+METRIC_PATTERN = "^(forecast_costs_at_completion|ytd_actual)$"
+
+
+def _load_drilldown(db: Session, project_no: int, from_period: str, to_period: str, metric: str):
+    """The drill-down index of the comparison and the period versions it was computed from."""
+    try:
+        comparison = get_comparison(db, from_period, to_period, project_no, metric)
+        return comparison.drilldown, comparison.versions
+    except PeriodNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error("  Drill-down failed: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+
+@router.get("/drilldown/{project_no}/cost-types")
+def get_drilldown_cost_types(
+    request: Request,
+    project_no: int,
+    from_period: str = Query(..., pattern=PERIOD_PATTERN),
+    to_period: str = Query(..., pattern=PERIOD_PATTERN),
+    metric: str = Query(..., pattern=METRIC_PATTERN),
+    db: Session = Depends(get_db)
+) -> FastJSONResponse:
+    """
+    Top level of the drill-down: project totals and main cost types only.
+
+    Returns:
+        {"projects": {job_no: {"project_meta", "total_<metric>", "cost_types": [...]}}}
+        Each cost type row carries a child_count for the subcategory level.
+    """
+    logger.info("GET /api/analysis/drilldown/%s/cost-types (%s -> %s, %s)", project_no, from_period, to_period, metric)
+    validator_args = (db, "drilldown-cost-types", from_period, to_period, project_no, metric)
+    cached = not_modified(request, comparison_validator(*validator_args))
+    if cached is not None:
+        return cached
+
+    index, versions = _load_drilldown(db, project_no, from_period, to_period, metric)
+    validator = comparison_validator(*validator_args, versions=versions)
+    return with_validator(FastJSONResponse({
+        "projects": {
+            job_no: {**meta, "cost_types": index.cost_types.get(job_no, [])}
+            for job_no, meta in index.projects.items()
+        }
+    }), validator)
+
+
+@router.get("/drilldown/{project_no}/subcategories")
+def get_drilldown_subcategories(
+    request: Request,
+    project_no: int,
+    cost_type: str,
+    from_period: str = Query(..., pattern=PERIOD_PATTERN),
+    to_period: str = Query(..., pattern=PERIOD_PATTERN),
+    metric: str = Query(..., pattern=METRIC_PATTERN),
+    db: Session = Depends(get_db)
+) -> FastJSONResponse:
+    """
+    Second level of the drill-down: subcategories of one main cost type.
+
+    Returns:
+        {"projects": {job_no: [subcategory rows]}}
+    """
+    logger.info("GET /api/analysis/drilldown/%s/subcategories (cost_type=%s)", project_no, cost_type)
+    validator_args = (db, "drilldown-subcategories", from_period, to_period, project_no, metric, cost_type)
+    cached = not_modified(request, comparison_validator(*validator_args))
+    if cached is not None:
+        return cached
+
+    index, versions = _load_drilldown(db, project_no, from_period, to_period, metric)
+    validator = comparison_validator(*validator_args, versions=versions)
+    found = {
+        job_no: index.subcategories[(job_no, cost_type)]
+        for job_no in index.projects
+        if (job_no, cost_type) in index.subcategories
+    }
+    if not found:
+        raise HTTPException(status_code=404, detail=f"Cost type '{cost_type}' not found")
+    return with_validator(FastJSONResponse({"projects": found}), validator)
+
+
+@router.get("/drilldown/{project_no}/children")
+def get_drilldown_children(
+    request: Request,
+    project_no: int,
+    cost_type: str,
+    subcategory: str,
+    from_period: str = Query(..., pattern=PERIOD_PATTERN),
+    to_period: str = Query(..., pattern=PERIOD_PATTERN),
+    metric: str = Query(..., pattern=METRIC_PATTERN),
+    db: Session = Depends(get_db)
+) -> FastJSONResponse:
+    """
+    Deepest level of the drill-down: children of one subcategory.
+
+    Returns:
+        {"projects": {job_no: [child rows]}}
+    """
+    logger.info("GET /api/analysis/drilldown/%s/children (cost_type=%s, subcategory=%s)", project_no, cost_type, subcategory)
+    validator_args = (db, "drilldown-children", from_period, to_period, project_no, metric, cost_type, subcategory)
+    cached = not_modified(request, comparison_validator(*validator_args))
+    if cached is not None:
+        return cached
+
+    index, versions = _load_drilldown(db, project_no, from_period, to_period, metric)
+    validator = comparison_validator(*validator_args, versions=versions)
+    found = {
+        job_no: index.children[(job_no, cost_type, subcategory)]
+        for job_no in index.projects
+        if (job_no, cost_type, subcategory) in index.children
+    }
+    if not found:
+        raise HTTPException(status_code=404, detail=f"Subcategory '{subcategory}' not found under '{cost_type}'")
+    return with_validator(FastJSONResponse({"projects": found}), validator)
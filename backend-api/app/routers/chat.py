@@ -1,52 +1,179 @@
 """
 Chat Router
 
-Provides the AI chat endpoint. The backend acts as a pass-through:
-the frontend supplies the financial context in the system_prompt field,
-and the backend proxies it to the external LLM API.
+Provides the AI chat endpoints. The frontend either supplies the financial
+context in the system_prompt field, which the backend passes through to the
+external LLM API, or sends only (project_no, from_period, to_period, metric)
+and the backend builds the context from the cached comparison, within
+CHAT_CONTEXT_MAX_TOKENS.
+
+  - POST /api/chat         — full answer as JSON
+  - POST /api/chat/stream  — answer relayed as server-sent events
+  - GET  /api/chat/stats   — LLM queue depth and answer cache counters
+
+Questions that need the LLM wait for a slot in the LLM limiter; when its
+queue is full they are answered 429 with Retry-After right away.
 """
 
+import json
 import logging
-from fastapi import APIRouter, HTTPException
+
+import httpx
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from app.database import get_db
 from app.models.schemas import ChatRequest
-from app.services.chat_service import chat_call
+from app.services.chat_service import (
+    build_chat_context, chat_call, chat_stream, cached_answer, answer_cache_stats, limiter_stats,
+)
+from app.services.period_store import PeriodNotFoundError
+from app.utils.limiter import LimiterFull
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def _log_request(path: str, request: ChatRequest, system_prompt: str) -> None:
+    source = "built server-side" if request.server_context else "from client"
+    logger.info("POST %s — INCOMING REQUEST: user_input %d chars, system_prompt %d chars (%s)",
+                path, len(request.user_input), len(system_prompt), source)
+    logger.debug("  user_input: %.120s", request.user_input)
+    logger.debug("  system_prompt: %.120s", system_prompt)
+
+    if not system_prompt.strip():
+        logger.warning("  ⚠ system_prompt is EMPTY! The LLM has no context about the project.")
+    elif len(system_prompt) < 100:
+        logger.warning("  ⚠ system_prompt is very short (%d chars) — context may be insufficient.", len(system_prompt))
+
+
+async def _resolve_system_prompt(request: ChatRequest, db: Session) -> str:
+    """The client's system_prompt, or the context built from the comparison."""
+    if not request.server_context:
+        return request.system_prompt
+    try:
+        return await run_in_threadpool(
+            build_chat_context, db, request.project_no, request.from_period, request.to_period, request.metric
+        )
+    except PeriodNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+def _http_error(e: Exception) -> HTTPException:
+    """Map a chat service error to the HTTP error returned to the frontend."""
+    if isinstance(e, LimiterFull):
+        return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    if isinstance(e, ValueError):
+        # LLM not configured
+        logger.warning("  ✗ LLM not configured: %s", e)
+        return HTTPException(status_code=503, detail=str(e))
+    if isinstance(e, httpx.TimeoutException):
+        return HTTPException(status_code=504, detail="Chat failed: LLM request timed out")
+    logger.error("  ✗ Chat failed: %s: %s", type(e).__name__, e, exc_info=True)
+    return HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
+
+
+def _sse(data: dict, event: str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
 
 @router.post("")
-def chat(request: ChatRequest):
+async def chat(request: ChatRequest, db: Session = Depends(get_db)):
     """
     Send a user question to the external LLM, with financial context
-    injected via the system_prompt by the frontend.
+    injected via the system_prompt by the frontend or built by the backend.
 
     Args:
-        request: { user_input, system_prompt }
+        request: { user_input, system_prompt } or
+                 { user_input, project_no, from_period, to_period, metric }
 
     Returns:
-        { "answer": "<LLM response>" }
+        { "answer": "<LLM response>", "cached": <answered from the cache> }
     """
-    logger.info("=" * 60)
-    logger.info("POST /api/chat — INCOMING REQUEST")
-    logger.info(f"  user_input ({len(request.user_input)} chars): {request.user_input[:120]}{'...' if len(request.user_input) > 120 else ''}")
-    logger.info(f"  system_prompt ({len(request.system_prompt)} chars): {request.system_prompt[:120]}{'...' if len(request.system_prompt) > 120 else ''}")
+    system_prompt = await _resolve_system_prompt(request, db)
+    _log_request("/api/chat", request, system_prompt)
 
-    if not request.system_prompt.strip():
-        logger.warning("  ⚠ system_prompt is EMPTY! The LLM has no context about the project.")
-    elif len(request.system_prompt) < 100:
-        logger.warning(f"  ⚠ system_prompt is very short ({len(request.system_prompt)} chars) — context may be insufficient.")
+    if not request.bypass_cache:
+        answer = cached_answer(request.user_input, system_prompt)
+        if answer is not None:
+            return {"answer": answer, "cached": True}
 
     try:
-        answer = chat_call(request.user_input, request.system_prompt)
-        logger.info(f"  ✓ LLM responded with {len(answer)} chars")
-        logger.info(f"  Answer preview: {answer[:200]}{'...' if len(answer) > 200 else ''}")
-        return {"answer": answer}
-    except ValueError as e:
-        # LLM not configured
-        logger.warning(f"  ✗ LLM not configured: {e}")
-        raise HTTPException(status_code=503, detail=str(e))
+        answer = await chat_call(request.user_input, system_prompt)
+        logger.info("  ✓ LLM responded with %d chars", len(answer))
+        logger.debug("  Answer preview: %.200s", answer)
+        return {"answer": answer, "cached": False}
     except Exception as e:
-        logger.error(f"  ✗ Chat failed: {type(e).__name__}: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
+        raise _http_error(e)
+
+
+@router.post("/stream")
+async def chat_streamed(request: ChatRequest, db: Session = Depends(get_db)) -> StreamingResponse:
+    """
+    Same as POST /api/chat, but relays the answer as server-sent events
+    while the LLM produces it.
+
+    Events:
+        data: {"token": "..."}          — one piece of the answer
+        event: done / data: {"cached"}  — the answer is complete
+        event: error / data: {"detail"} — the LLM failed mid-answer
+
+    Errors before the first piece (LLM not configured, unreachable, non-2xx,
+    LLM queue full) are returned as regular HTTP errors, like POST /api/chat. A cached
+    answer is sent as a single piece.
+    """
+    system_prompt = await _resolve_system_prompt(request, db)
+    _log_request("/api/chat/stream", request, system_prompt)
+
+    answer = None if request.bypass_cache else cached_answer(request.user_input, system_prompt)
+    if answer is not None:
+        async def cached_events():
+            yield _sse({"token": answer})
+            yield _sse({"cached": True}, event="done")
+
+        return StreamingResponse(cached_events(), media_type="text/event-stream", headers=_SSE_HEADERS)
+
+    pieces = chat_stream(request.user_input, system_prompt)
+    try:
+        first = await pieces.__anext__()
+    except StopAsyncIteration:
+        first = None
+    except Exception as e:
+        raise _http_error(e)
+
+    async def events():
+        total = 0
+        try:
+            if first is not None:
+                total += len(first)
+                yield _sse({"token": first})
+                async for token in pieces:
+                    total += len(token)
+                    yield _sse({"token": token})
+            logger.info("  ✓ LLM streamed %s chars", total)
+            yield _sse({"cached": False}, event="done")
+        except Exception as e:
+            logger.error("  ✗ Chat stream failed: %s: %s", type(e).__name__, e)
+            yield _sse({"detail": f"Chat failed: {str(e)}"}, event="error")
+        finally:
+            await pieces.aclose()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=_SSE_HEADERS)
+
+
+@router.get("/stats")
+def chat_stats():
+    """
+    LLM limiter and answer cache counters.
+
+    Returns:
+        { "limiter": { in_flight, queued, peak_queued, rejected, ... },
+          "answer_cache": { size, hits, misses, ... } }
+    """
+    return {"limiter": limiter_stats(), "answer_cache": answer_cache_stats()}
@@ -4,107 +4,178 @@ Download Router
 Provides endpoints to generate and download report files.
 Currently supports:
   - POST /api/download/xlsx  — Excel cost breakdown workbook
+  - POST /api/download/portfolio  — bulk export job for every project
+    (poll GET /portfolio/{job_id} or stream /portfolio/{job_id}/events,
+    then fetch /portfolio/{job_id}/file)
 """
 
-import logging
+import asyncio
 import json
-import tempfile
-from pathlib import Path
+import logging
+import os
 
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import Response
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.database import get_db
-from app.models.schemas import ForecastComparisonRequest
-from app.services.sql_queries import query_batch_to_df
-from app.services.data_processor import (
-    combine_projects_rows,
-    table_to_nested_json,
-    compute_forecast_diff,
-)
-from app.config import projects_list, metric_map
-from app.utils.report_builder import build_excel_cost_breakdown, projects_to_dataframe
+from app.models.schemas import ForecastComparisonRequest, PortfolioExportRequest
+from app.services.comparison import get_comparison, PeriodNotFoundError
+from app.services.export_jobs import export_jobs, DONE, FAILED
+from app.utils.report_builder import iter_excel_cost_breakdown
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+ZIP_MIME = "application/zip"
+
+# How often the progress stream checks a running job
+EVENTS_POLL_SECONDS = 0.5
 
 
 @router.post("/xlsx")
 def download_xlsx(
     request: ForecastComparisonRequest,
     db: Session = Depends(get_db),
-) -> Response:
+) -> StreamingResponse:
     """
     Generate and return an Excel (.xlsx) cost breakdown report.
 
-    Internally re-runs the same analysis pipeline as /api/analysis/forecast-comparison,
-    then passes the result through the report builder to produce a multi-sheet workbook:
+    Uses the same cached comparison as /api/analysis/forecast-comparison
+    and passes it through the report builder to produce a multi-sheet workbook:
       - Projects sheet  — all-projects summary
       - {job_no}_main_types, {job_no}_costlines, {job_no}_children
 
     Returns:
-        Binary .xlsx response with Content-Disposition: attachment header.
+        Streamed .xlsx response with Content-Disposition: attachment header.
     """
     logger.info("POST /api/download/xlsx")
     logger.info(
-        f"  Request: from={request.from_period} to={request.to_period} "
-        f"project={request.project_no} metric={request.metric}"
+        "  Request: from=%s to=%s project=%s metric=%s",
+        request.from_period, request.to_period, request.project_no, request.metric,
     )
 
     try:
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmpdir = Path(tmpdir)
-            out_paths = []
-
-            for period in [request.from_period, request.to_period]:
-                logger.info(f"  Processing period: {period}")
-                df = query_batch_to_df(db, period)
-
-                if df.empty:
-                    logger.warning(f"  No data found for period {period}")
-                    raise HTTPException(
-                        status_code=404,
-                        detail=f"No data found for period {period}",
-                    )
-
-                logger.info(f"  Retrieved {len(df)} records")
-                df = combine_projects_rows(
-                    df,
-                    project_groups=projects_list,
-                    sum_cols=metric_map[request.metric],
-                )
-                json_data = table_to_nested_json(df, request.project_no)
-                out_path = tmpdir / f"output_{period}_{request.project_no}.json"
-                with out_path.open("w", encoding="utf-8") as f:
-                    json.dump(json_data, f, ensure_ascii=False, indent=2)
-                out_paths.append(out_path)
-
-            logger.info("  Computing forecast differences...")
-            result = compute_forecast_diff(out_paths, request.metric)
-            projects = result.get("projects", {})
-
-            logger.info(f"  Building Excel workbook for {len(projects)} project(s)...")
-            df_summary = projects_to_dataframe(projects, request.metric)
-            xlsx_bytes = build_excel_cost_breakdown(df_summary, projects)
-
-            logger.info(f"  Workbook built ({len(xlsx_bytes):,} bytes). Returning response.")
-            return Response(
-                content=xlsx_bytes,
-                media_type=XLSX_MIME,
-                headers={
-                    "Content-Disposition": 'attachment; filename="cost_breakdown.xlsx"',
-                },
-            )
+        # Same cached comparison as /api/analysis/forecast-comparison
+        comparison = get_comparison(
+            db, request.from_period, request.to_period, request.project_no, request.metric
+        )
+        projects = comparison.projects
+
+        logger.info("  Building Excel workbook for %d project(s)...", len(projects))
+        chunks = iter_excel_cost_breakdown(comparison.projects_frame, projects)
+
+        logger.info("  Workbook built. Streaming response.")
+        return StreamingResponse(
+            chunks,
+            media_type=XLSX_MIME,
+            headers={
+                "Content-Disposition": 'attachment; filename="cost_breakdown.xlsx"',
+            },
+        )
 
+    except PeriodNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"  Report generation failed: {str(e)}", exc_info=True)
+        logger.error("  Report generation failed: %s", e, exc_info=True)
         raise HTTPException(
             status_code=500,
             detail=f"Report generation failed: {str(e)}",
         )
+
+
+# =============================================================================
+# Bulk portfolio export jobs
+# =============================================================================
+
+def _get_job(job_id: str):
+    job = export_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown export job {job_id}")
+    return job
+
+
+@router.post("/portfolio", status_code=202)
+def submit_portfolio_export(request: PortfolioExportRequest):
+    """
+    Start a background export of every project's cost breakdown.
+
+    Returns immediately with the job id; the comparison and file writing
+    run in a background thread.
+
+    Returns:
+        The job status, including job_id.
+    """
+    logger.info("POST /api/download/portfolio")
+    logger.info(
+        "  Request: from=%s to=%s metric=%s format=%s projects=%s",
+        request.from_period, request.to_period, request.metric, request.format, request.project_nos or "all",
+    )
+    job = export_jobs.submit(
+        request.from_period, request.to_period, request.metric, request.format, request.project_nos
+    )
+    return job.public()
+
+
+@router.get("/portfolio/{job_id}")
+def get_portfolio_export(job_id: str):
+    """Current status and progress (done / total projects) of an export job."""
+    return _get_job(job_id).public()
+
+
+@router.get("/portfolio/{job_id}/events")
+async def stream_portfolio_export(job_id: str, request: Request) -> StreamingResponse:
+    """
+    Stream the job's progress as server-sent events until it finishes.
+
+    Each event's data is the job status JSON; the stream ends after the
+    "done" or "failed" event.
+    """
+    _get_job(job_id)
+
+    async def events():
+        last = None
+        while not await request.is_disconnected():
+            # May read the shared SQLite backend; keep it off the event loop
+            job = await run_in_threadpool(export_jobs.get, job_id)
+            if job is None:
+                break
+            state = job.public()
+            if state != last:
+                yield f"data: {json.dumps(state)}\n\n"
+                last = state
+            if job.status in (DONE, FAILED):
+                break
+            await asyncio.sleep(EVENTS_POLL_SECONDS)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/portfolio/{job_id}/file")
+def download_portfolio_export(job_id: str) -> FileResponse:
+    """
+    Download the finished export (.xlsx or .zip).
+
+    Raises:
+        HTTPException 404: Unknown or expired job
+        HTTPException 409: Job still running
+        HTTPException 500: Job failed
+    """
+    job = _get_job(job_id)
+    if job.status == FAILED:
+        raise HTTPException(status_code=500, detail=f"Export failed: {job.error}")
+    if job.status != DONE:
+        raise HTTPException(status_code=409, detail=f"Export job is {job.status}")
+    if not job.path or not os.path.exists(job.path):
+        raise HTTPException(status_code=404, detail="Export file has expired")
+    return FileResponse(
+        job.path,
+        media_type=ZIP_MIME if job.format == "zip" else XLSX_MIME,
+        filename=job.filename,
+    )
@@ -0,0 +1,66 @@
+"""
+Profiles Router
+
+Read access to the request profiles recorded by ProfilingMiddleware
+(only registered when PROFILING_ENABLED is set):
+
+  - GET /api/profiles                 — newest profile summaries
+  - GET /api/profiles/{id}            — one summary (duration, samples,
+                                        peak allocations, hottest stacks)
+  - GET /api/profiles/{id}/collapsed  — collapsed stacks for flamegraph.pl
+                                        or speedscope
+
+Profiles contain request paths, query strings and stacks, so when
+PROFILING_TOKEN is set every endpoint requires it in X-Profile-Token.
+"""
+
+import logging
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import FileResponse
+
+from app.config import PROFILING_TOKEN
+from app.utils.profiling import profile_store, token_matches
+from app.utils.responses import FastJSONResponse
+
+logger = logging.getLogger(__name__)
+
+
+def require_profile_token(x_profile_token: str = Header("")) -> None:
+    if not token_matches(PROFILING_TOKEN, x_profile_token):
+        logger.warning("Profile read without a valid token")
+        raise HTTPException(status_code=403, detail="Invalid or missing X-Profile-Token")
+
+
+router = APIRouter(default_response_class=FastJSONResponse, dependencies=[Depends(require_profile_token)])
+
+
+@router.get("")
+def list_profiles(limit: int = Query(20, ge=1, le=200)):
+    """
+    Returns:
+        { "profiles": [ {id, method, path, status, duration_ms, samples, peak_alloc_bytes}, ... ] }
+    """
+    fields = ("id", "method", "path", "status", "duration_ms", "samples", "peak_alloc_bytes")
+    profiles = []
+    for profile_id in profile_store.list_ids()[:limit]:
+        summary = profile_store.summary(profile_id)
+        if summary is not None:
+            profiles.append({k: summary.get(k) for k in fields})
+    return {"profiles": profiles}
+
+
+@router.get("/{profile_id}")
+def get_profile(profile_id: str):
+    summary = profile_store.summary(profile_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"Unknown profile: {profile_id}")
+    return summary
+
+
+@router.get("/{profile_id}/collapsed")
+def get_profile_stacks(profile_id: str) -> FileResponse:
+    path = profile_store.collapsed_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Unknown profile: {profile_id}")
+    return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.collapsed.txt")
@@ -6,20 +6,21 @@ projects and periods from the database. These are used to
 populate filter dropdowns in the frontend.
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 import logging
 from app.database import get_db
-from app.utils.helpers import get_filter_options
+from app.services.http_cache import cached_filter_options, filter_options_validator, not_modified, with_validator
+from app.utils.responses import FastJSONResponse
 from typing import List
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(default_response_class=FastJSONResponse)
 
 
 @router.get("/periods")
-def get_available_periods(db: Session = Depends(get_db)):
+def get_available_periods(request: Request, db: Session = Depends(get_db)):
     """
     Get list of available periods from the database.
     
@@ -31,19 +32,24 @@ def get_available_periods(db: Session = Depends(get_db)):
     """
     logger.info("GET /api/projects/periods - Fetching available periods")
     try:
-        periods, _ = get_filter_options(db)
+        validator = filter_options_validator(db, "periods")
+        cached = not_modified(request, validator)
+        if cached is not None:
+            return cached
+
+        periods, _ = cached_filter_options(db)
         # Filter to only include valid YYYYMM format periods
         valid_periods = [p for p in periods if isinstance(p, str) and len(p) == 6 and p.isdigit()]
-        logger.info(f"  Found {len(valid_periods)} valid periods")
-        logger.debug(f"  Periods: {sorted(valid_periods)}")
-        return {"periods": sorted(valid_periods)}
+        logger.info("  Found %d valid periods", len(valid_periods))
+        logger.debug("  Periods: %s", sorted(valid_periods))
+        return with_validator(FastJSONResponse({"periods": sorted(valid_periods)}), validator)
     except Exception as e:
-        logger.error(f"  Failed to fetch periods: {str(e)}", exc_info=True)
+        logger.error("  Failed to fetch periods: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/list")
-def get_available_projects(db: Session = Depends(get_db)):
+def get_available_projects(request: Request, db: Session = Depends(get_db)):
     """
     Get list of available project numbers from the database.
     
@@ -55,10 +61,15 @@ def get_available_projects(db: Session = Depends(get_db)):
     """
     logger.info("GET /api/projects/list - Fetching available projects")
     try:
-        _, projects = get_filter_options(db)
-        logger.info(f"  Found {len(projects)} projects")
-        logger.debug(f"  Projects: {sorted(projects)}")
-        return {"projects": sorted(projects)}
+        validator = filter_options_validator(db, "projects")
+        cached = not_modified(request, validator)
+        if cached is not None:
+            return cached
+
+        _, projects = cached_filter_options(db)
+        logger.info("  Found %d projects", len(projects))
+        logger.debug("  Projects: %s", sorted(projects))
+        return with_validator(FastJSONResponse({"projects": sorted(projects)}), validator)
     except Exception as e:
-        logger.error(f"  Failed to fetch projects: {str(e)}", exc_info=True)
+        logger.error("  Failed to fetch projects: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -1,41 +1,158 @@
 """
 Chat Service
 
-Provides the chat_call() function that proxies user messages and a
-system prompt to an external LLM REST API.
+Proxies user messages and a system prompt to an external LLM REST API.
+
+All calls go through one pooled, keep-alive httpx.AsyncClient, so questions
+reuse connections to the LLM host and wait on the event loop instead of
+holding a threadpool thread. chat_call() returns the full answer;
+chat_stream() yields the answer in pieces as the LLM produces them.
+
+Answers are cached by a hash of (system_prompt, user_input, TEMPERATURE,
+MAX_TOKENS): callers check cached_answer() first (unless the user asked to
+bypass the cache), and every completed answer is stored.
+
+Calls that reach the LLM go through llm_limiter: at most LLM_MAX_IN_FLIGHT
+at once and LLM_MAX_QUEUED waiting; beyond that LimiterFull is raised
+(429 at the router). Cached answers never take a slot.
+
+build_chat_context() builds the system prompt on the server from the cached
+comparison, for clients that only send the analysis selection.
 """
 
+import hashlib
 import logging
 import json
-import requests as http_requests
-from app.config import URL as LLM_URL, api_key as LLM_API_KEY, TEMPERATURE, MAX_TOKENS
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from sqlalchemy.orm import Session
+
+from app.config import (
+    URL as LLM_URL, api_key as LLM_API_KEY, TEMPERATURE, MAX_TOKENS,
+    LLM_TIMEOUT_SECONDS, LLM_MAX_CONNECTIONS, LLM_CACHE_SIZE, LLM_CACHE_TTL_SECONDS,
+    LLM_MAX_IN_FLIGHT, LLM_MAX_QUEUED, LLM_QUEUE_TIMEOUT_SECONDS, CHAT_CONTEXT_MAX_TOKENS, SUMMARY_CHARS_PER_TOKEN,
+)
+from app.services.comparison import get_comparison
+from app.utils.cache import TTLCache
+from app.utils.limiter import ConcurrencyLimiter
+from app.utils.metrics import stage
 
 logger = logging.getLogger(__name__)
 
 # Log LLM configuration at import time
-logger.info(f"[chat_service] LLM_URL configured: {'YES (' + LLM_URL[:30] + '...)' if LLM_URL else 'NO (empty)'}")
-logger.info(f"[chat_service] LLM_API_KEY configured: {'YES (' + LLM_API_KEY[:8] + '...)' if LLM_API_KEY else 'NO (empty)'}")
-logger.info(f"[chat_service] TEMPERATURE={TEMPERATURE}, MAX_TOKENS={MAX_TOKENS}")
+logger.info("[chat_service] LLM_URL configured: %s", f"YES ({LLM_URL[:30]}...)" if LLM_URL else "NO (empty)")
+logger.info("[chat_service] LLM_API_KEY configured: %s", f"YES ({LLM_API_KEY[:8]}...)" if LLM_API_KEY else "NO (empty)")
+logger.info("[chat_service] TEMPERATURE=%s, MAX_TOKENS=%s", TEMPERATURE, MAX_TOKENS)
 
+# Keys different LLM APIs use for the answer text (after "answer")
+_ANSWER_KEYS = ["response", "text", "output", "content", "result", "message"]
+# Keys used for one piece of a streamed answer
+_TOKEN_KEYS = ["token", "delta", "text", "content", "answer", "response"]
 
-def chat_call(user_input: str, system_prompt: str) -> str:
-    """
-    Send a single-turn question to the external LLM API.
+# Same wording as the prompt the frontend builds (ChatPanel)
+_CONTEXT_TEMPLATE = (
+    "You are a financial analyst assistant for construction project cost monitoring.\n"
+    "The following is a cost analysis report for project {project} covering the period "
+    "from {from_period} to {to_period}:\n\n"
+    "{summary}\n\n"
+    "Answer the user's question based on this data. Be specific and reference actual numbers where relevant.\n"
+    "Format your response with numbered lists and bold text where appropriate for clarity."
+)
 
-    Combines the system_prompt and user_input into one prompt string,
-    as per the reference implementation in the LLM feature overview.
+_client: Optional[httpx.AsyncClient] = None
 
-    Args:
-        user_input:    The user's question.
-        system_prompt: Context injected by the frontend (e.g. cost summary text).
+_answer_cache = TTLCache("llm_answers", maxsize=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL_SECONDS, shared=True)
+
+llm_limiter = ConcurrencyLimiter("llm", LLM_MAX_IN_FLIGHT, LLM_MAX_QUEUED, LLM_QUEUE_TIMEOUT_SECONDS)
+
+
+def get_client() -> httpx.AsyncClient:
+    """The shared LLM client (created on first use, inside the event loop)."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS,
+            ),
+            headers={"Authorization": f"Bearer {LLM_API_KEY}"},
+        )
+        logger.info("[chat_service] HTTP client created (max %d connections)", LLM_MAX_CONNECTIONS)
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def answer_cache_key(user_input: str, system_prompt: str) -> str:
+    payload = json.dumps([system_prompt, user_input, TEMPERATURE, MAX_TOKENS])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cached_answer(user_input: str, system_prompt: str) -> Optional[str]:
+    """The cached answer to this exact question and context, if any."""
+    answer = _answer_cache.get(answer_cache_key(user_input, system_prompt))
+    if answer is not None:
+        logger.info("[chat_call] Answer cache hit (%d chars)", len(answer))
+    return answer
 
-    Returns:
-        The LLM's answer string.
+
+def _store_answer(user_input: str, system_prompt: str, answer: str) -> None:
+    if answer:
+        _answer_cache.set(answer_cache_key(user_input, system_prompt), answer)
+
+
+def answer_cache_stats() -> Dict[str, Any]:
+    return _answer_cache.stats()
+
+
+def limiter_stats() -> Dict[str, Any]:
+    return llm_limiter.stats()
+
+
+def build_chat_context(
+    db: Session,
+    project_no: int,
+    from_period: str,
+    to_period: str,
+    metric: str,
+    max_tokens: Optional[int] = CHAT_CONTEXT_MAX_TOKENS,
+) -> str:
+    """
+    Build the system prompt for a project from its (cached) comparison.
+
+    The cost summary lists the highest-impact cost lines first and is cut
+    where the whole prompt would exceed `max_tokens` (estimated at
+    SUMMARY_CHARS_PER_TOKEN characters per token; 0/None means unlimited).
 
     Raises:
-        requests.HTTPError: If the LLM API returns a non-2xx status.
-        Exception: For any other network or parsing error.
+        PeriodNotFoundError: If either period has no data.
     """
+    handle = get_comparison(db, from_period, to_period, project_no, metric)
+    project = next(iter(handle.projects), project_no)
+    fields = {"project": project, "from_period": from_period, "to_period": to_period}
+
+    if max_tokens:
+        overhead = len(_CONTEXT_TEMPLATE.format(summary="", **fields))
+        summary = handle.summary(max_chars=max(max_tokens * SUMMARY_CHARS_PER_TOKEN - overhead, 1), max_tokens=None)
+    else:
+        summary = handle.summary(max_chars=None, max_tokens=None)
+
+    context = _CONTEXT_TEMPLATE.format(summary=summary.strip(), **fields)
+    logger.info("[chat_context] Built context for project %s (%s → %s): %d chars (~%d tokens, budget %s)",
+                project_no, from_period, to_period, len(context), len(context) // SUMMARY_CHARS_PER_TOKEN,
+                max_tokens or "unlimited")
+    return context
+
+
+def _check_configured() -> None:
     if not LLM_URL:
         logger.error("[chat_call] LLM_API_URL is empty/not set! Check your .env file.")
         raise ValueError(
@@ -43,87 +160,218 @@ def chat_call(user_input: str, system_prompt: str) -> str:
             "Set LLM_API_URL and LLM_API_KEY in the backend .env file."
         )
 
+
+def _build_form(user_input: str, system_prompt: str, **extra: Any) -> Dict[str, Any]:
+    """
+    Combine the system_prompt and user_input into one prompt string,
+    as per the reference implementation in the LLM feature overview.
+    """
     prompt = system_prompt + " Question: " + user_input
 
-    logger.info("=" * 60)
-    logger.info("[chat_call] === NEW LLM REQUEST ===")
-    logger.info(f"[chat_call] LLM URL: {LLM_URL}")
-    logger.info(f"[chat_call] Total prompt length: {len(prompt)} chars")
-    logger.info(f"[chat_call] System prompt length: {len(system_prompt)} chars")
-    logger.info(f"[chat_call] User input: {user_input}")
-    logger.info(f"[chat_call] System prompt preview (first 500 chars):")
-    logger.info(f"  {system_prompt[:500]}{'...' if len(system_prompt) > 500 else ''}")
-    logger.info(f"[chat_call] Temperature: {TEMPERATURE}, Max tokens: {MAX_TOKENS}")
+    logger.info("[chat_call] === NEW LLM REQUEST === prompt %d chars (system prompt %d chars), "
+                "temperature=%s, max_tokens=%s", len(prompt), len(system_prompt), TEMPERATURE, MAX_TOKENS)
+    logger.debug("[chat_call] LLM URL: %s", LLM_URL)
+    logger.debug("[chat_call] User input: %s", user_input)
+    logger.debug("[chat_call] System prompt preview (first 500 chars): %.500s", system_prompt)
+
+    return {"prompt": prompt, "temperature": TEMPERATURE, "max_tokens": MAX_TOKENS, **extra}
+
+
+def _extract_answer(response_json: Dict[str, Any]) -> str:
+    answer = response_json.get("answer", "")
+
+    if not answer:
+        # Try alternative response keys that different LLM APIs use
+        for alt_key in _ANSWER_KEYS:
+            answer = response_json.get(alt_key, "")
+            if answer:
+                logger.info("[chat_call] Found answer in alternative key: '%s'", alt_key)
+                break
+
+        # Check for nested structures (OpenAI-style)
+        if not answer and "choices" in response_json:
+            choices = response_json["choices"]
+            if choices and len(choices) > 0:
+                choice = choices[0]
+                answer = choice.get("text", "") or choice.get("message", {}).get("content", "")
+                logger.info("[chat_call] Found answer in choices[0] (OpenAI-style)")
+
+    return answer
+
 
+def _missing_answer(response_json: Dict[str, Any]) -> str:
+    """Placeholder shown when the LLM response has no recognizable answer (never cached)."""
+    logger.warning("[chat_call] No 'answer' key in response. Response keys: %s", list(response_json.keys()))
+    logger.debug("[chat_call] Full response: %s", response_json)
+    return f"(LLM responded but no 'answer' field found. Response keys: {list(response_json.keys())})"
+
+
+def _answer_from(response_json: Dict[str, Any], user_input: str, system_prompt: str) -> str:
+    answer = _extract_answer(response_json)
+    if not answer:
+        return _missing_answer(response_json)
+    _store_answer(user_input, system_prompt, answer)
+    return answer
+
+
+def _parse_json_body(raw_body: str) -> Dict[str, Any]:
     try:
-        logger.info(f"[chat_call] Sending POST to {LLM_URL} (form-encoded)...")
-        response = http_requests.post(
-            LLM_URL,
-            data={
-                "prompt": prompt,
-                "temperature": TEMPERATURE,
-                "max_tokens": MAX_TOKENS,
-            },
-            headers={"Authorization": f"Bearer {LLM_API_KEY}"},
-            timeout=120,
-        )
+        response_json = json.loads(raw_body)
+        logger.debug("[chat_call] Parsed JSON keys: %s", list(response_json.keys()))
+        return response_json
+    except json.JSONDecodeError as e:
+        logger.error("[chat_call] Failed to parse response as JSON: %s", e)
+        logger.error("[chat_call] Raw text: %.500s", raw_body)
+        raise ValueError(f"LLM returned non-JSON response: {raw_body[:200]}")
 
-        logger.info(f"[chat_call] Response status: {response.status_code}")
-        logger.info(f"[chat_call] Response headers: {dict(response.headers)}")
 
-        # Log raw response body for debugging
-        raw_body = response.text
-        logger.info(f"[chat_call] Raw response body ({len(raw_body)} chars):")
-        logger.info(f"  {raw_body[:1000]}{'...' if len(raw_body) > 1000 else ''}")
+def _extract_token(data: str) -> str:
+    """Text of one streamed event: a JSON object with a token field, or raw text."""
+    try:
+        event = json.loads(data)
+    except json.JSONDecodeError:
+        return data
+    if not isinstance(event, dict):
+        return str(event)
+    if "choices" in event and event["choices"]:
+        choice = event["choices"][0]
+        return (choice.get("delta") or {}).get("content") or choice.get("text") or ""
+    for key in _TOKEN_KEYS:
+        value = event.get(key)
+        if isinstance(value, str):
+            return value
+    return ""
 
-        response.raise_for_status()
 
-        # Try to parse as JSON
-        try:
-            response_json = response.json()
-            logger.info(f"[chat_call] Parsed JSON keys: {list(response_json.keys())}")
-        except json.JSONDecodeError as e:
-            logger.error(f"[chat_call] Failed to parse response as JSON: {e}")
-            logger.error(f"[chat_call] Raw text: {raw_body[:500]}")
-            raise ValueError(f"LLM returned non-JSON response: {raw_body[:200]}")
-
-        answer = response_json.get("answer", "")
-
-        if not answer:
-            # Try alternative response keys that different LLM APIs use
-            for alt_key in ["response", "text", "output", "content", "result", "message"]:
-                answer = response_json.get(alt_key, "")
-                if answer:
-                    logger.info(f"[chat_call] Found answer in alternative key: '{alt_key}'")
-                    break
+def _dump_response(tag: str, response: httpx.Response, body: str) -> None:
+    """Response headers and (up to 1 KB of) body, at DEBUG only."""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[%s] Response headers: %s", tag, dict(response.headers))
+        logger.debug("[%s] Raw response body (%d chars): %.1000s", tag, len(body), body)
+
+
+def _log_http_error(e: Exception) -> None:
+    if isinstance(e, httpx.TimeoutException):
+        logger.error("[chat_call] Request timed out after %s seconds!", LLM_TIMEOUT_SECONDS)
+    elif isinstance(e, httpx.ConnectError):
+        logger.error("[chat_call] Connection error: %s", e)
+        logger.error("[chat_call] Is the LLM server running at %s?", LLM_URL)
+    elif isinstance(e, httpx.HTTPStatusError):
+        logger.error("[chat_call] HTTP error: %s", e)
+    else:
+        logger.error("[chat_call] Unexpected error: %s: %s", type(e).__name__, e, exc_info=True)
+
+
+async def chat_call(user_input: str, system_prompt: str) -> str:
+    """
+    Send a single-turn question to the external LLM API and cache the answer.
+
+    Args:
+        user_input:    The user's question.
+        system_prompt: Context injected by the frontend (e.g. cost summary text).
+
+    Returns:
+        The LLM's answer string.
+
+    Raises:
+        ValueError: If the LLM is not configured or returns non-JSON.
+        LimiterFull: If too many questions are already waiting for the LLM.
+        httpx.HTTPStatusError: If the LLM API returns a non-2xx status.
+        httpx.HTTPError: For network errors and timeouts.
+    """
+    _check_configured()
+    form = _build_form(user_input, system_prompt)
+
+    async with llm_limiter.slot():
+        return await _post_question(form, user_input, system_prompt)
+
 
-            # Check for nested structures (OpenAI-style)
-            if not answer and "choices" in response_json:
-                choices = response_json["choices"]
-                if choices and len(choices) > 0:
-                    choice = choices[0]
-                    answer = choice.get("text", "") or choice.get("message", {}).get("content", "")
-                    logger.info(f"[chat_call] Found answer in choices[0] (OpenAI-style)")
+async def _post_question(form: Dict[str, Any], user_input: str, system_prompt: str) -> str:
+    try:
+        logger.info("[chat_call] Sending POST to %s (form-encoded)...", LLM_URL)
+        with stage("llm"):
+            response = await get_client().post(LLM_URL, data=form)
+        logger.info("[chat_call] Response status: %s", response.status_code)
+
+        raw_body = response.text
+        _dump_response("chat_call", response, raw_body)
 
-            if not answer:
-                logger.warning(f"[chat_call] No 'answer' key in response. Full response: {response_json}")
-                answer = f"(LLM responded but no 'answer' field found. Response keys: {list(response_json.keys())})"
+        if response.is_error:
+            logger.error("[chat_call] Response body: %.500s", raw_body)
+        response.raise_for_status()
 
-        logger.info(f"[chat_call] Answer ({len(answer)} chars): {answer[:200]}{'...' if len(answer) > 200 else ''}")
-        logger.info("=" * 60)
+        answer = _answer_from(_parse_json_body(raw_body), user_input, system_prompt)
+        logger.info("[chat_call] Answer (%d chars): %.200s", len(answer), answer)
         return answer
 
-    except http_requests.exceptions.Timeout:
-        logger.error("[chat_call] Request timed out after 120 seconds!")
+    except ValueError:
         raise
-    except http_requests.exceptions.ConnectionError as e:
-        logger.error(f"[chat_call] Connection error: {e}")
-        logger.error(f"[chat_call] Is the LLM server running at {LLM_URL}?")
+    except Exception as e:
+        _log_http_error(e)
         raise
-    except http_requests.exceptions.HTTPError as e:
-        logger.error(f"[chat_call] HTTP error: {e}")
-        logger.error(f"[chat_call] Response body: {e.response.text[:500] if e.response else 'N/A'}")
+
+
+async def chat_stream(user_input: str, system_prompt: str) -> AsyncIterator[str]:
+    """
+    Ask the LLM with streaming requested and yield the answer piece by piece.
+
+    An event-stream response is relayed event by event (JSON events with a
+    token/delta/text field, OpenAI-style choices, or raw text; "[DONE]"
+    ends it). A plain JSON response from an LLM that doesn't stream is
+    yielded as one piece. The answer is cached once the stream completes.
+
+    The limiter slot is held until the stream ends.
+
+    Raises:
+        The same errors as chat_call, before the first piece is yielded.
+    """
+    _check_configured()
+    form = _build_form(user_input, system_prompt, stream="true")
+
+    async with llm_limiter.slot():
+        with stage("llm"):
+            pieces = _stream_question(form, user_input, system_prompt)
+            try:
+                async for piece in pieces:
+                    yield piece
+            finally:
+                await pieces.aclose()
+
+
+async def _stream_question(form: Dict[str, Any], user_input: str, system_prompt: str) -> AsyncIterator[str]:
+    try:
+        logger.info("[chat_stream] Sending streaming POST to %s...", LLM_URL)
+        async with get_client().stream("POST", LLM_URL, data=form) as response:
+            logger.info("[chat_stream] Response status: %s", response.status_code)
+            if response.is_error:
+                body = (await response.aread()).decode("utf-8", errors="replace")
+                logger.error("[chat_stream] Response body: %.500s", body)
+            response.raise_for_status()
+
+            if "text/event-stream" not in response.headers.get("content-type", ""):
+                raw_body = (await response.aread()).decode("utf-8", errors="replace")
+                yield _answer_from(_parse_json_body(raw_body), user_input, system_prompt)
+                return
+
+            pieces = 0
+            received = []
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                # SSE strips exactly one space after "data:"; tokens keep theirs
+                data = line[6:] if line.startswith("data: ") else line[5:]
+                if data.strip() == "[DONE]":
+                    break
+                token = _extract_token(data)
+                if token:
+                    pieces += 1
+                    received.append(token)
+                    yield token
+            logger.info("[chat_stream] Stream finished (%d pieces)", pieces)
+            _store_answer(user_input, system_prompt, "".join(received))
+
+    except ValueError:
         raise
     except Exception as e:
-        logger.error(f"[chat_call] Unexpected error: {type(e).__name__}: {e}", exc_info=True)
+        _log_http_error(e)
         raise
@@ -0,0 +1,253 @@
+"""
+Comparison Service
+
+Shared analysis layer for the analysis, summary, drill-down and download
+endpoints. Compares two periods from the integer-coded period store
+snapshots, keeps the results in a cache and hands them out as
+ComparisonHandles, which lazily derive the drill-down index (one level of
+the cost hierarchy at a time), the narrative summary and the report tables.
+
+Every cached result carries the loaded_at of the two period frames it was
+computed from, so HTTP validators always describe the body that is served.
+"""
+
+import logging
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app.config import (
+    projects_list, metric_map, SUMMARY_MAX_CHARS,
+    COMPARISON_CACHE_SIZE, COMPARISON_CACHE_TTL_SECONDS,
+)
+from app.services.data_processor import compute_coded_forecast_diff, hand_crafted_summary, iter_budgeted_summary
+from app.services.period_store import period_store, PeriodNotFoundError
+from app.utils.cache import TTLCache
+from app.utils.helpers import _normalize_project_groups
+from app.utils.metrics import pipeline_metric, stage
+from app.utils.report_builder import projects_to_dataframe
+
+logger = logging.getLogger(__name__)
+
+_comparison_cache = TTLCache("comparison_results", maxsize=COMPARISON_CACHE_SIZE, ttl=COMPARISON_CACHE_TTL_SECONDS, shared=True)
+# Handles wrap cached results with lazily derived views; they stay per process
+_handle_cache = TTLCache("comparison_handles", maxsize=COMPARISON_CACHE_SIZE, ttl=COMPARISON_CACHE_TTL_SECONDS)
+
+
+_project_to_group = _normalize_project_groups(projects_list)
+
+
+def _comparison_key(from_period: str, to_period: str, project_no: int, metric: str) -> Tuple:
+    # Members of one project group share a comparison (2171 and 2172 both return "2171 & 2172")
+    project_key = _project_to_group.get(int(project_no), str(int(project_no)))
+    return (str(from_period), str(to_period), project_key, metric)
+
+
+def representative_projects() -> List[int]:
+    """One project number per configured project group (used for warm-up)."""
+    reps: Dict[str, int] = {}
+    for members in projects_list.values():
+        mem = members if isinstance(members, (list, tuple, set)) else [members]
+        first = min(int(m) for m in mem)
+        reps.setdefault(_project_to_group.get(first, str(first)), first)
+    return list(reps.values())
+
+
+@dataclass
+class VersionedResult:
+    """A comparison result and the loaded_at of each period frame it was computed from."""
+    result: Dict[str, Any]
+    versions: Dict[str, float]
+
+
+def _versioned_comparison(db: Session, from_period: str, to_period: str, project_no: int, metric: str) -> VersionedResult:
+    key = _comparison_key(from_period, to_period, project_no, metric)
+    return _comparison_cache.get_or_compute(
+        key, lambda: _compute_comparison(db, from_period, to_period, project_no, metric)
+    )
+
+
+def cached_versions(from_period: str, to_period: str, project_no: int, metric: str) -> Optional[Dict[str, float]]:
+    """
+    Period versions of the cached comparison, or None if it isn't cached.
+    Never computes anything.
+    """
+    key = _comparison_key(from_period, to_period, project_no, metric)
+    handle = _handle_cache.peek(key)
+    if handle is not None:
+        return handle.versions
+    entry = _comparison_cache.peek(key)
+    return entry.versions if entry is not None else None
+
+
+def run_forecast_comparison(
+    db: Session,
+    from_period: str,
+    to_period: str,
+    project_no: int,
+    metric: str,
+) -> Dict[str, Any]:
+    """
+    Compare a project's costs between two periods, using the cache when possible.
+
+    Returns the compute_forecast_diff structure: {"projects": {job_no: {...}}}.
+    The returned dict is shared with the cache and must not be mutated.
+
+    Raises:
+        PeriodNotFoundError: If either period has no data.
+    """
+    return _versioned_comparison(db, from_period, to_period, project_no, metric).result
+
+
+def run_portfolio_comparison(db: Session, from_period: str, to_period: str, metric: str) -> Dict[str, Any]:
+    """
+    Compare every project between two periods in one pass (cached).
+
+    Same structure and caveats as run_forecast_comparison, with one entry
+    per project group present in either period.
+    """
+    key = (str(from_period), str(to_period), "*", metric)
+    return _comparison_cache.get_or_compute(
+        key, lambda: _compute_comparison(db, from_period, to_period, None, metric)
+    ).result
+
+
+def _compute_comparison(db: Session, from_period: str, to_period: str, project_no: Optional[int], metric: str) -> VersionedResult:
+    snap1 = period_store.get(db, from_period)
+    snap2 = period_store.get(db, to_period)
+
+    # Diff the integer-coded cost lines; labels are decoded only for the result
+    logger.info("  Computing forecast differences...")
+    with pipeline_metric(metric), stage("diff"):
+        result = compute_coded_forecast_diff(
+            snap1.lines, snap2.lines, snap1.meta, snap2.meta,
+            snap1.period, snap2.period,
+            project_no, metric_map[metric], metric,
+            period_store.dims,
+        )
+    return VersionedResult(result, {snap1.period: snap1.loaded_at, snap2.period: snap2.loaded_at})
+
+
+# ---------------------------------------------------------------------------
+# Drill-down index
+# ---------------------------------------------------------------------------
+
+def _level_row(node: Dict[str, Any], child_key: str) -> Dict[str, Any]:
+    """Copy one hierarchy node without its nested children."""
+    return {
+        "category": node["category"],
+        "file1_metric": node["file1_metric"],
+        "file2_metric": node["file2_metric"],
+        "difference": node["difference"],
+        "child_count": len(node.get(child_key) or []),
+    }
+
+
+class DrilldownIndex:
+    """
+    Flat lookup tables over a comparison result, one per hierarchy level.
+
+    cost_types:    job_no -> [cost type rows]
+    subcategories: (job_no, cost_type) -> [subcategory rows]
+    children:      (job_no, cost_type, subcategory) -> [child rows]
+
+    Rows keep the ordering of the comparison (difference, descending).
+    """
+
+    def __init__(self, result: Dict[str, Any], metric: str):
+        self.metric = metric
+        self.projects: Dict[str, Dict[str, Any]] = {}
+        self.cost_types: Dict[str, List[Dict[str, Any]]] = {}
+        self.subcategories: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        self.children: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = {}
+
+        for job_no, proj in result.get("projects", {}).items():
+            self.projects[job_no] = {
+                "project_meta": proj["project_meta"],
+                f"total_{metric}": proj[f"total_{metric}"],
+            }
+            trajectory = proj.get("costline_increases_trajectory", [])
+            self.cost_types[job_no] = [_level_row(ct, "subcategories") for ct in trajectory]
+            for ct in trajectory:
+                subs = ct.get("subcategories", [])
+                self.subcategories[(job_no, ct["category"])] = [_level_row(sub, "children") for sub in subs]
+                for sub in subs:
+                    self.children[(job_no, ct["category"], sub["category"])] = [
+                        dict(child) for child in sub.get("children", [])
+                    ]
+
+
+# ---------------------------------------------------------------------------
+# Comparison handle
+# ---------------------------------------------------------------------------
+
+class ComparisonHandle:
+    """
+    A computed comparison plus everything derived from it.
+
+    The analysis, summary, drill-down and download endpoints all start from
+    the same handle, so viewing a project, asking the chat about it and
+    exporting it run the pipeline once. Derived views are built lazily on
+    first use and kept on the handle.
+    """
+
+    def __init__(self, from_period: str, to_period: str, project_no: int, metric: str, result: Dict[str, Any],
+                 versions: Dict[str, float]):
+        self.from_period = from_period
+        self.to_period = to_period
+        self.project_no = project_no
+        self.metric = metric
+        self.result = result
+        # loaded_at of the period frames the result was computed from
+        self.versions = versions
+        self._summaries: Dict[Tuple, str] = {}
+
+    @property
+    def projects(self) -> Dict[str, Any]:
+        return self.result.get("projects", {})
+
+    @cached_property
+    def drilldown(self) -> DrilldownIndex:
+        return DrilldownIndex(self.result, self.metric)
+
+    @cached_property
+    def projects_frame(self) -> pd.DataFrame:
+        """All-projects summary table used by the Excel report."""
+        return projects_to_dataframe(self.projects, self.metric)
+
+    def iter_summary(self, max_chars: Optional[int] = None, max_tokens: Optional[int] = None) -> Iterator[str]:
+        return iter_budgeted_summary(self.projects, self.metric, max_chars=max_chars, max_tokens=max_tokens)
+
+    def summary(self, max_chars: Optional[int] = SUMMARY_MAX_CHARS, max_tokens: Optional[int] = None) -> str:
+        """Narrative summary within the given budget (cached per budget)."""
+        key = (max_chars, max_tokens)
+        if key not in self._summaries:
+            self._summaries[key] = hand_crafted_summary(
+                self.projects, self.metric, max_chars=max_chars, max_tokens=max_tokens
+            )
+        return self._summaries[key]
+
+
+def get_comparison(
+    db: Session,
+    from_period: str,
+    to_period: str,
+    project_no: int,
+    metric: str,
+) -> ComparisonHandle:
+    """
+    Return the (cached) ComparisonHandle for a period pair, project and metric.
+
+    Raises:
+        PeriodNotFoundError: If either period has no data.
+    """
+    key = _comparison_key(from_period, to_period, project_no, metric)
+
+    def build() -> ComparisonHandle:
+        entry = _versioned_comparison(db, from_period, to_period, project_no, metric)
+        return ComparisonHandle(from_period, to_period, project_no, metric, entry.result, entry.versions)
+
+    return _handle_cache.get_or_compute(key, build)
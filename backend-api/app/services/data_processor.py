@@ -5,18 +5,20 @@ import pandas as pd
 import numpy as np
 import logging
 from collections import defaultdict
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from app.utils.helpers import (
     _group_by_job, _load_rows, _to_number, period_to_label,
     safe_str, safe_num, _longest_nonempty, filter_by_project,
     _first_nonempty, _normalize_project_groups, merge_or_longest
 )
+from app.utils import dimensions as dims
+from app.config import SUMMARY_MAX_CHARS, SUMMARY_CHARS_PER_TOKEN
 
 logger = logging.getLogger(__name__)
 
 
 def table_to_nested_json(df: pd.DataFrame, projno) -> Dict[str, List[Dict[str, Any]]]:
-    logger.debug(f"Converting table to nested JSON for project {projno}, input shape: {df.shape}")
+    logger.debug("Converting table to nested JSON for project %s, input shape: %s", projno, df.shape)
     req = ["iProjNo_group", "iProjNo", "cSegment", "iProjYear", "cPackage", "cPeriod", "cElementCode", "TYP", "cType",
            "rForecast", "rYearAct", "cSubDesc2", "cSubDesc3", "cClient", "cProjDesc", "cProjMgr", "cClientDesc", "cMajorDesc", "cBookDesc"]
     miss = [c for c in req if c not in df.columns]
@@ -71,13 +73,16 @@ def table_to_nested_json(df: pd.DataFrame, projno) -> Dict[str, List[Dict[str, A
 
 
 def preprocess_df_collapse_projects(df_all: pd.DataFrame, sum_col: str) -> pd.DataFrame:
-    logger.debug(f"Collapsing projects, input shape: {df_all.shape}, sum_col: {sum_col}")
+    logger.debug("Collapsing projects, input shape: %s, sum_col: %s", df_all.shape, sum_col)
     req = {"iProjNo_group", "iProjYear", "cProjDesc", "cClientDesc", sum_col}
     miss = req.difference(df_all.columns)
     if miss:
         logger.error(f"Missing required columns: {sorted(miss)}")
         raise KeyError(f"Missing required columns: {sorted(miss)}")
 
+    # Rows in project order, so the first / merged values don't depend on the source's row order
+    if "iProjNo" in df_all.columns:
+        df_all = df_all.iloc[np.argsort(pd.to_numeric(df_all["iProjNo"], errors="coerce").to_numpy(), kind="stable")]
     df = df_all[["iProjNo_group", "iProjYear", "cProjDesc", "cClientDesc", sum_col]].copy()
     df[sum_col] = pd.to_numeric(df[sum_col], errors="coerce").fillna(0.0)
 
@@ -90,6 +95,27 @@ def preprocess_df_collapse_projects(df_all: pd.DataFrame, sum_col: str) -> pd.Da
               .rename(columns={"iProjNo_group": "iProjNo"}))
 
 
+def _assign_project_groups(out: pd.DataFrame, project_groups: dict) -> pd.DataFrame:
+    # map iProjNo -> group label
+    proj_to_label = _normalize_project_groups(project_groups)
+    out["iProjNo_int"] = pd.to_numeric(out["iProjNo"], errors="coerce").astype("Int64")
+    out["iProjNo_group"] = out["iProjNo_int"].map(proj_to_label).fillna(out["iProjNo_int"].astype(str))
+    return out
+
+
+def collapse_portfolio_totals(totals: pd.DataFrame, project_groups: dict, sum_col: str) -> pd.DataFrame:
+    """
+    Collapse per-project totals (see query_portfolio_totals) to one row per
+    project group. Same result as combine_projects_rows followed by
+    preprocess_df_collapse_projects, but on a few hundred aggregate rows
+    (both merge the text columns of a group in iProjNo order).
+    """
+    out = _assign_project_groups(totals.copy(), project_groups).sort_values("iProjNo_int", kind="stable")
+    text_cols = ["cProjDesc", "cClientDesc"]
+    out[text_cols] = out.groupby("iProjNo_group", dropna=False)[text_cols].transform(merge_or_longest)
+    return preprocess_df_collapse_projects(out, sum_col)
+
+
 def combine_projects_rows(df: pd.DataFrame, project_groups: dict, key_cols=None, sum_cols=None) -> pd.DataFrame:
     if key_cols is None:
         key_cols = ["iProjYear", "cSegment", "cPeriod", "TYP", "cType"]
@@ -102,12 +128,7 @@ def combine_projects_rows(df: pd.DataFrame, project_groups: dict, key_cols=None,
     if miss:
         raise KeyError(f"Missing required columns in df: {miss}")
 
-    out = df.copy()
-
-    # map iProjNo -> group label
-    proj_to_label = _normalize_project_groups(project_groups)
-    out["iProjNo_int"] = pd.to_numeric(out["iProjNo"], errors="coerce").astype("Int64")
-    out["iProjNo_group"] = out["iProjNo_int"].map(proj_to_label).fillna(out["iProjNo_int"].astype(str))
+    out = _assign_project_groups(df.copy(), project_groups)
 
     group_cols = ["iProjNo_group"] + key_cols
 
@@ -140,7 +161,9 @@ def combine_projects_rows(df: pd.DataFrame, project_groups: dict, key_cols=None,
 
     text_cols = [c for c in ["cProjDesc", "cBookDesc", "cClientDesc", "cMainDesc", "cClient", "cBook", "cProjMgr"] if c in combined.columns]
     if text_cols:
-        merged = (combined.groupby("iProjNo_group", dropna=False)[text_cols]
+        # Merge in iProjNo order (assignment aligns back on the index)
+        order = np.argsort(pd.to_numeric(combined["iProjNo"], errors="coerce").to_numpy(), kind="stable")
+        merged = (combined.iloc[order].groupby("iProjNo_group", dropna=False)[text_cols]
                           .transform(merge_or_longest))
         combined[text_cols] = merged
 
@@ -148,16 +171,16 @@ def combine_projects_rows(df: pd.DataFrame, project_groups: dict, key_cols=None,
 
 
 def compute_forecast_diff(path_to_jsons: List[str], metric: str) -> Dict[str, Any]:
-    logger.debug(f"Computing forecast differences for metric: {metric}")
+    logger.debug("Computing forecast differences for metric: %s", metric)
     if not isinstance(path_to_jsons, (list, tuple)) or len(path_to_jsons) != 2:
         logger.error(f"Invalid path_to_jsons: expected 2 paths, got {len(path_to_jsons) if isinstance(path_to_jsons, (list, tuple)) else 'not a list'}")
         raise ValueError("Provide exactly two JSON file paths: [path_file_1, path_file_2].")
 
     p1, p2 = path_to_jsons
-    logger.debug(f"Loading JSON files: {p1}, {p2}")
+    logger.debug("Loading JSON files: %s, %s", p1, p2)
     rows1, period1 = _load_rows(str(p1))
     rows2, period2 = _load_rows(str(p2))
-    logger.debug(f"Period 1 ({period1}): {len(rows1)} rows, Period 2 ({period2}): {len(rows2)} rows")
+    logger.debug("Period 1 (%s): %d rows, Period 2 (%s): %d rows", period1, len(rows1), period2, len(rows2))
 
     proj1 = _group_by_job(rows1)
     proj2 = _group_by_job(rows2)
@@ -313,51 +336,341 @@ def aggregate_costlines_trajectory(
     )
 
 
-def hand_crafted_summary(EAC_cost_change, metric):
-    parts = ""
+def _change_line(cat, f1, f2, diff) -> str:
+    change = "increase" if diff >= 0 else "decrease"
+    return f"  - {cat}: from {f1/1000:,.2f} million to {f2/1000:,.2f} million ({change} of {diff/1000:,.2f} million)\n\n"
+
+
+def _by_impact(nodes):
+    """Non-zero nodes ordered by absolute difference, largest first."""
+    return sorted((n for n in nodes if n["difference"] != 0), key=lambda n: abs(n["difference"]), reverse=True)
+
+
+def _summary_items(EAC_cost_change, metric) -> Iterator[Tuple[int, float, str]]:
+    """
+    The blocks of the narrative summary in document order, as
+    (level, absolute impact, text).
+
+    Level 0 is a project header, 1 a main cost type, 2 a subcategory and 3
+    a child line (the first child of a subcategory carries the heading
+    above its children). Zero-difference lines are skipped at every level.
+    """
     for job_no, proj in EAC_cost_change.items():
         desc = proj["project_meta"]["description"]
-        total_diff = proj[f"total_{metric}"]["difference"]
-        p1 = proj[f'total_{metric}']['period1']
-        p2 = proj[f'total_{metric}']['period2']
-        parts += f"Job No: {job_no}\nDescription: {desc}\nThe {metric} for {p1} is {proj[f'total_{metric}']['file1']/1000} million and for {p2} is {proj[f'total_{metric}']['file2']/1000} million\n"
+        total = proj[f"total_{metric}"]
+        total_diff = total["difference"]
+        p1 = total["period1"]
+        p2 = total["period2"]
         diff = "an increase" if total_diff >= 0 else "a decrease"
-        parts += f"There is {diff} in the total {metric} from {p1} to {p2}: {total_diff/1000:,.2f} million\n\n"
-        costlines_main = proj["costline_increases_trajectory"]
-
-        for costline in costlines_main:
-
-            cat = costline["category"]
-            f1 = costline["file1_metric"]
-            f2 = costline["file2_metric"]
-            diff = costline["difference"]
-            if diff == 0:
-                continue
-            change = "increase" if diff >= 0 else "decrease"
-            parts += "Main Cost Type:\n"
-            parts += f"  - {cat}: from {f1/1000:,.2f} million to {f2/1000:,.2f} million ({change} of {diff/1000:,.2f} million)\n\n"
-
-
-            for subcostline in costline["subcategories"]:
-                cat = subcostline["category"]
-                f1 = subcostline["file1_metric"]
-                f2 = subcostline["file2_metric"]
-                diff = subcostline["difference"]
-                if diff == 0:
-                    continue
-                change = "increase" if diff >= 0 else "decrease"
-                parts += "Subcategory:\n"
-                parts += f"  - {cat}: from {f1/1000:,.2f} million to {f2/1000:,.2f} million ({change} of {diff/1000:,.2f} million)\n\n"
-
-                parts += f"Sub-sub Category of {cat}:\n"
-                for subsubcostline in subcostline["children"]:
-                    cat = subsubcostline["category"]
-                    parent_cat = subcostline["category"]
-                    f1 = subsubcostline["file1_metric"]
-                    f2 = subsubcostline["file2_metric"]
-                    diff = subsubcostline["difference"]
-                    if diff == 0:
-                        continue
-                    change = "increase" if diff >= 0 else "decrease"
-                    parts += f"  - {cat}: from {f1/1000:,.2f} million to {f2/1000:,.2f} million ({change} of {diff/1000:,.2f} million)\n\n"
-    return parts
+        yield 0, 0.0, (
+            f"Job No: {job_no}\nDescription: {desc}\nThe {metric} for {p1} is {total['file1']/1000} million and for {p2} is {total['file2']/1000} million\n"
+            f"There is {diff} in the total {metric} from {p1} to {p2}: {total_diff/1000:,.2f} million\n\n"
+        )
+
+        for costline in _by_impact(proj["costline_increases_trajectory"]):
+            yield 1, abs(costline["difference"]), "Main Cost Type:\n" + _change_line(
+                costline["category"], costline["file1_metric"], costline["file2_metric"], costline["difference"])
+
+            for subcostline in _by_impact(costline["subcategories"]):
+                yield 2, abs(subcostline["difference"]), "Subcategory:\n" + _change_line(
+                    subcostline["category"], subcostline["file1_metric"], subcostline["file2_metric"], subcostline["difference"])
+
+                heading = f"Sub-sub Category of {subcostline['category']}:\n"
+                for child in _by_impact(subcostline["children"]):
+                    yield 3, abs(child["difference"]), heading + _change_line(
+                        child["category"], child["file1_metric"], child["file2_metric"], child["difference"])
+                    heading = ""
+
+
+def iter_summary_chunks(EAC_cost_change, metric) -> Iterator[str]:
+    """
+    Yield the narrative summary one block at a time.
+
+    Each project starts with its header (totals); cost types, subcategories
+    and children follow in order of absolute impact. Zero-difference lines
+    are skipped at every level.
+    """
+    for _, _, text in _summary_items(EAC_cost_change, metric):
+        yield text
+
+
+_TRUNCATION_NOTE = "(Summary truncated: remaining smaller cost changes omitted.)\n"
+
+
+def iter_budgeted_summary(EAC_cost_change, metric, max_chars: Optional[int] = None, max_tokens: Optional[int] = None) -> Iterator[str]:
+    """
+    Like iter_summary_chunks, but keep the output, including the truncation
+    note, within `max_chars` characters (or `max_tokens`, estimated at
+    SUMMARY_CHARS_PER_TOKEN characters per token). The smaller budget wins;
+    None means unlimited. A budget too small for the note yields nothing.
+
+    The budget is spent level by level: first every project header, then
+    the main cost types of all projects, then subcategories, then children,
+    each level by absolute impact across projects. Selection stops at the
+    first block that doesn't fit; the selected blocks are yielded in
+    document order.
+    """
+    budgets = [b for b in (max_chars, max_tokens * SUMMARY_CHARS_PER_TOKEN if max_tokens is not None else None)
+               if b is not None]
+    budget = min(budgets) if budgets else None
+    if budget is None:
+        yield from iter_summary_chunks(EAC_cost_change, metric)
+        return
+
+    items = list(_summary_items(EAC_cost_change, metric))
+    if sum(len(text) for _, _, text in items) <= budget:
+        for _, _, text in items:
+            yield text
+        return
+    budget -= len(_TRUNCATION_NOTE)
+    if budget < 0:
+        return
+
+    order = sorted(range(len(items)), key=lambda i: (items[i][0], -items[i][1], i))
+    selected = set()
+    used = 0
+    for i in order:
+        text = items[i][2]
+        if used + len(text) > budget:
+            break
+        selected.add(i)
+        used += len(text)
+
+    for i in sorted(selected):
+        yield items[i][2]
+    yield _TRUNCATION_NOTE
+
+
+def hand_crafted_summary(EAC_cost_change, metric, max_chars: Optional[int] = SUMMARY_MAX_CHARS, max_tokens: Optional[int] = None) -> str:
+    return "".join(iter_budgeted_summary(EAC_cost_change, metric, max_chars=max_chars, max_tokens=max_tokens))
+
+
+# ---------------------------------------------------------------------------
+# Integer-coded comparison path
+# Same semantics as table_to_nested_json -> compute_forecast_diff, but the
+# category labels are factorized through a shared DimensionDictionary and the
+# aggregation / diffing runs on int code columns.
+# ---------------------------------------------------------------------------
+
+CODED_KEYS = [dims.GROUP, dims.COST_TYPE, dims.SUBCATEGORY, dims.CHILD]
+
+
+def _map_uniques(s: pd.Series, fn) -> pd.Series:
+    """Apply a scalar function once per unique value instead of once per row."""
+    codes, uniques = pd.factorize(s, use_na_sentinel=False)
+    mapped = np.array([fn(u) for u in uniques], dtype=object)
+    return pd.Series(mapped[codes] if len(uniques) else [], index=s.index, dtype=object)
+
+
+LABEL_DIMS = [dims.GROUP, dims.COST_TYPE, dims.SECTION, dims.SUBCATEGORY, dims.CHILD]
+
+
+def normalize_period_costlines(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, Dict[str, str]]]:
+    """
+    Normalize a combined period frame into cost-line rows with categorical labels.
+
+    This is the CPU-heavy half of encode_period_costlines. It doesn't need
+    the shared dimension dictionary, so it can run in a worker process; its
+    output is compact to pickle (categorical labels + float/bool columns).
+
+    Returns:
+        lines: one row per source row with categorical label columns (group,
+               cost_type, section, subcategory, child), the rForecast /
+               rYearAct values, and the in_total / in_trajectory flags.
+        meta:  group label -> {"description", "client"}
+    """
+    req = ["iProjNo_group", "TYP", "rForecast", "rYearAct", "cSegment", "cMajorDesc",
+           "cSubDesc2", "cSubDesc3", "cProjDesc", "cClientDesc"]
+    miss = [c for c in req if c not in df.columns]
+    if miss:
+        logger.error(f"Missing required columns: {miss}")
+        raise ValueError(f"Missing required columns in DataFrame: {miss}")
+
+    group = _map_uniques(df["iProjNo_group"], safe_str)
+    raw_type = _map_uniques(df["TYP"], safe_str)
+    section = _map_uniques(df["cSegment"], safe_str) + " - " + _map_uniques(df["cMajorDesc"], safe_str)
+    parent = _map_uniques(df["cSubDesc2"], safe_str)
+    child = _map_uniques(df["cSubDesc3"], safe_str)
+    child = child.where(child != "", parent)
+
+    type_lc = raw_type.str.lower()
+    is_revenue = type_lc.str.contains("revenue", regex=False).to_numpy()
+    is_variation = section.str.lower().str.contains("variation", regex=False)
+    bucket = type_lc.where(type_lc != "", "uncategorized").where(~is_variation, "70 - variations")
+
+    lines = pd.DataFrame({
+        dims.GROUP: group.astype("category"),
+        dims.COST_TYPE: bucket.astype("category"),
+        dims.SECTION: section.astype("category"),
+        dims.SUBCATEGORY: parent.astype("category"),
+        dims.CHILD: child.astype("category"),
+        "rForecast": pd.to_numeric(df["rForecast"], errors="coerce").fillna(0.0).astype("float64").to_numpy(),
+        "rYearAct": pd.to_numeric(df["rYearAct"], errors="coerce").fillna(0.0).astype("float64").to_numpy(),
+        # Project totals skip untyped and revenue lines; the trajectory keeps untyped ones
+        "in_total": (raw_type != "").to_numpy() & ~is_revenue,
+        "in_trajectory": ~is_revenue,
+    }).reset_index(drop=True)
+
+    meta: Dict[str, Dict[str, str]] = {}
+    text = pd.DataFrame({"group": group.to_numpy(), "cProjDesc": df["cProjDesc"].to_numpy(),
+                         "cClientDesc": df["cClientDesc"].to_numpy()})
+    for label, g in text.groupby("group", sort=False):
+        meta[label] = {
+            "description": safe_str(_longest_nonempty(g["cProjDesc"])),
+            "client": safe_str(_longest_nonempty(g["cClientDesc"])),
+        }
+    return lines, meta
+
+
+def encode_normalized_costlines(
+    lines: pd.DataFrame,
+    meta: Dict[str, Dict[str, str]],
+    dim_dict: dims.DimensionDictionary,
+) -> Tuple[pd.DataFrame, Dict[int, Dict[str, str]]]:
+    """Replace the categorical label columns with shared int32 dimension codes."""
+    encoded = lines.copy()
+    for dim in LABEL_DIMS:
+        col = lines[dim]
+        # Only the categories go through the dictionary; rows are a numpy take
+        lookup = dim_dict.encode(dim, pd.Series(col.cat.categories, dtype=object))
+        encoded[dim] = lookup[col.cat.codes.to_numpy()] if len(lookup) else np.empty(0, dtype=np.int32)
+    group_codes = dim_dict.encode(dims.GROUP, pd.Series(list(meta.keys()), dtype=object))
+    return encoded, {int(code): meta[label] for code, label in zip(group_codes, meta)}
+
+
+def encode_period_costlines(df: pd.DataFrame, dim_dict: dims.DimensionDictionary) -> Tuple[pd.DataFrame, Dict[int, Dict[str, str]]]:
+    """
+    Encode a combined period frame into compact cost-line rows.
+
+    Returns:
+        lines: one row per source row with int32 code columns (group,
+               cost_type, section, subcategory, child), the rForecast /
+               rYearAct values, and the in_total / in_trajectory flags.
+        meta:  group code -> {"description", "client"}
+    """
+    lines, meta = normalize_period_costlines(df)
+    return encode_normalized_costlines(lines, meta, dim_dict)
+
+
+def prepare_period_costlines(df: pd.DataFrame, project_groups: dict, sum_cols) -> Tuple[pd.DataFrame, Dict[str, Dict[str, str]]]:
+    """
+    combine_projects_rows + normalize_period_costlines in one call, so the
+    whole CPU-bound part of a period load can be shipped to a worker process.
+    """
+    combined = combine_projects_rows(df, project_groups=project_groups, sum_cols=sum_cols)
+    return normalize_period_costlines(combined)
+
+
+def project_group_codes(dim_dict: dims.DimensionDictionary, projno) -> List[int]:
+    """Codes of every project group label that contains `projno` (see filter_by_project)."""
+    target = str(projno)
+    return [code for code, label in enumerate(dim_dict.labels(dims.GROUP))
+            if target in [p.strip() for p in label.split("&")]]
+
+
+def _sorted_blocks(labels: List[str], v1: List[float], v2: List[float], children=None, child_key=None) -> List[Dict[str, Any]]:
+    # Build in label order, then stable-sort by difference (matches compute_forecast_diff)
+    blocks = []
+    for i in sorted(range(len(labels)), key=lambda i: labels[i]):
+        block = {
+            "category": labels[i],
+            "file1_metric": v1[i],
+            "file2_metric": v2[i],
+            "difference": v2[i] - v1[i],
+        }
+        if child_key is not None:
+            block[child_key] = children[i]
+        blocks.append(block)
+    return sorted(blocks, key=lambda x: x["difference"], reverse=True)
+
+
+def compute_coded_forecast_diff(
+    lines1: pd.DataFrame,
+    lines2: pd.DataFrame,
+    meta1: Dict[int, Dict[str, str]],
+    meta2: Dict[int, Dict[str, str]],
+    period1: str,
+    period2: str,
+    projno,
+    metric_col: str,
+    metric: str,
+    dim_dict: dims.DimensionDictionary,
+) -> Dict[str, Any]:
+    """
+    Diff two encoded periods for one project and decode the result into the
+    compute_forecast_diff structure: {"projects": {job_no: {...}}}.
+    With projno=None every project of both periods is diffed in one pass.
+    """
+    if projno is None:
+        l1, l2 = lines1, lines2
+    else:
+        group_codes = project_group_codes(dim_dict, projno)
+        l1 = lines1[lines1[dims.GROUP].isin(group_codes)]
+        l2 = lines2[lines2[dims.GROUP].isin(group_codes)]
+
+    totals1 = l1.loc[l1["in_total"]].groupby(dims.GROUP)[metric_col].sum()
+    totals2 = l2.loc[l2["in_total"]].groupby(dims.GROUP)[metric_col].sum()
+
+    leaf1 = l1.loc[l1["in_trajectory"]].groupby(CODED_KEYS, sort=False)[metric_col].sum().rename("v1")
+    leaf2 = l2.loc[l2["in_trajectory"]].groupby(CODED_KEYS, sort=False)[metric_col].sum().rename("v2")
+    leaves = pd.concat([leaf1, leaf2], axis=1).fillna(0.0).reset_index()
+    parents = leaves.groupby(CODED_KEYS[:3], sort=False)[["v1", "v2"]].sum()
+    cost_types = leaves.groupby(CODED_KEYS[:2], sort=False)[["v1", "v2"]].sum()
+
+    # Index the child/parent rows by their parent key for the decode pass
+    leaves_by_parent = {k: g for k, g in leaves.groupby(CODED_KEYS[:3], sort=False)}
+    parents_by_type = {k: g for k, g in parents.reset_index().groupby(CODED_KEYS[:2], sort=False)}
+    types_by_group = {k: g for k, g in cost_types.reset_index().groupby(dims.GROUP, sort=False)}
+
+    label1, label2 = period_to_label(period1), period_to_label(period2)
+    jobs = {}
+    for code in set(l1[dims.GROUP].unique()) | set(l2[dims.GROUP].unique()):
+        code = int(code)
+        job = dim_dict.decode(dims.GROUP, code)
+        if job:
+            jobs[job] = code
+
+    out: Dict[str, Any] = {"projects": {}}
+    for job in sorted(jobs):
+        code = jobs[job]
+        ct_rows = types_by_group.get(code)
+        ct_blocks = []
+        if ct_rows is not None:
+            ct_labels = dim_dict.decode_many(dims.COST_TYPE, ct_rows[dims.COST_TYPE])
+            ct_children = []
+            for ct_code in ct_rows[dims.COST_TYPE]:
+                p_rows = parents_by_type[(code, ct_code)]
+                p_children = []
+                for p_code in p_rows[dims.SUBCATEGORY]:
+                    c_rows = leaves_by_parent[(code, ct_code, p_code)]
+                    p_children.append(_sorted_blocks(
+                        dim_dict.decode_many(dims.CHILD, c_rows[dims.CHILD]),
+                        c_rows["v1"].tolist(), c_rows["v2"].tolist(),
+                    ))
+                ct_children.append(_sorted_blocks(
+                    dim_dict.decode_many(dims.SUBCATEGORY, p_rows[dims.SUBCATEGORY]),
+                    p_rows["v1"].tolist(), p_rows["v2"].tolist(),
+                    p_children, "children",
+                ))
+            ct_blocks = _sorted_blocks(ct_labels, ct_rows["v1"].tolist(), ct_rows["v2"].tolist(),
+                                       ct_children, "subcategories")
+
+        m1, m2 = meta1.get(code, {}), meta2.get(code, {})
+        total1 = float(totals1.get(code, 0.0))
+        total2 = float(totals2.get(code, 0.0))
+        out["projects"][job] = {
+            "project_meta": {
+                "description": _longest_nonempty([m1.get("description"), m2.get("description")]) or "",
+                "client": _longest_nonempty([m1.get("client"), m2.get("client")]) or "",
+            },
+            f"total_{metric}": {
+                "period1": label1,
+                "period2": label2,
+                "file1": total1,
+                "file2": total2,
+                "difference": total2 - total1
+            },
+            "costline_increases_trajectory": ct_blocks,
+        }
+
+    return out
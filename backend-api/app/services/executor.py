@@ -0,0 +1,87 @@
+"""
+CPU Executor
+
+Optional process pool for the CPU-bound pandas stages of the pipeline.
+Sync endpoints run in uvicorn's threadpool and hold the GIL while pandas
+works through Python-level code (groupby aggregations with Python
+callables, per-unique string normalization), so concurrent comparisons
+would otherwise serialize on one interpreter.
+
+With PROCESS_POOL_WORKERS = 0 (the default) everything runs inline.
+Frames are shipped to workers in a compact form: object columns become
+categoricals, so repeated labels are pickled once per unique value.
+"""
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+import pandas as pd
+
+from app.config import PROCESS_POOL_WORKERS
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if PROCESS_POOL_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that already runs server threads is unsafe
+            _pool = ProcessPoolExecutor(
+                max_workers=PROCESS_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            logger.info(f"Process pool started with {PROCESS_POOL_WORKERS} workers")
+        return _pool
+
+
+def process_pool_enabled() -> bool:
+    return PROCESS_POOL_WORKERS > 0
+
+
+def run_cpu_bound(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Run `fn(*args, **kwargs)` in the process pool if enabled, else inline.
+
+    `fn` must be a module-level function and its arguments/result picklable.
+    The calling thread blocks on the result without holding the GIL.
+    """
+    pool = _get_pool()
+    if pool is None:
+        return fn(*args, **kwargs)
+    return pool.submit(fn, *args, **kwargs).result()
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert object columns to categoricals for a smaller pickle."""
+    out = df.copy(deep=False)
+    for col in out.columns:
+        if out[col].dtype == object:
+            out[col] = out[col].astype("category")
+    return out
+
+
+def expand_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Undo compact_frame (categorical keys would change groupby semantics)."""
+    out = df.copy(deep=False)
+    for col in out.columns:
+        if isinstance(out[col].dtype, pd.CategoricalDtype):
+            out[col] = out[col].astype(object)
+    return out
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+            logger.info("Process pool shut down")
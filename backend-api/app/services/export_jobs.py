@@ -0,0 +1,294 @@
+"""
+Export Jobs
+
+Bulk portfolio exports run as background jobs instead of inside an HTTP
+request: the client submits a job, polls (or streams) its progress and then
+downloads the finished file.
+
+A job compares every project between the two periods in one pass
+(run_portfolio_comparison), then writes either one workbook with the
+per-project sheets or a zip with CSV parts per project. The CSV parts are
+rendered in parallel. Finished files stay in EXPORT_DIR for
+EXPORT_JOB_TTL_SECONDS; a purge thread deletes older job directories,
+whichever worker created them.
+
+Job state is kept per process and, when SHARED_CACHE_PATH is set, mirrored
+to the shared cache backend so any uvicorn worker can answer status and
+download requests.
+"""
+
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional
+
+from app.config import EXPORT_WORKERS, EXPORT_DIR, EXPORT_JOB_TTL_SECONDS
+from app.database import session_scope
+from app.services.comparison import run_portfolio_comparison, PeriodNotFoundError
+from app.utils.report_builder import (
+    write_excel_cost_breakdown,
+    projects_to_dataframe,
+    main_costtypes_df,
+    subcategories_df,
+    children_df,
+)
+from app.utils.shared_cache import get_shared_backend
+
+logger = logging.getLogger(__name__)
+
+_NAMESPACE = "export_jobs"
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+# How often EXPORT_DIR is scanned for expired job directories
+PURGE_INTERVAL_SECONDS = 300
+
+
+@dataclass
+class ExportJob:
+    """State of one export job (also its shared-cache record)."""
+    job_id: str
+    from_period: str
+    to_period: str
+    metric: str
+    format: str
+    project_nos: Optional[List[int]] = None
+    status: str = QUEUED
+    stage: str = ""
+    done: int = 0
+    total: int = 0
+    error: Optional[str] = None
+    path: Optional[str] = None
+    filename: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    def public(self) -> Dict[str, Any]:
+        """Status fields returned to clients (no filesystem paths)."""
+        out = asdict(self)
+        out.pop("path")
+        return out
+
+
+def _safe_name(label: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", label).strip("_") or "project"
+
+
+def _select_projects(projects: Dict[str, Any], project_nos: Optional[List[int]]) -> Dict[str, Any]:
+    """Keep the project groups containing any of `project_nos` (all when None)."""
+    if not project_nos:
+        return projects
+    wanted = {str(p) for p in project_nos}
+    return {
+        job: proj for job, proj in projects.items()
+        if wanted.intersection(p.strip() for p in job.split("&"))
+    }
+
+
+class ExportJobManager:
+    """Runs export jobs on a small thread pool and tracks their state."""
+
+    def __init__(self, workers: int = EXPORT_WORKERS, export_dir: str = EXPORT_DIR, ttl: float = EXPORT_JOB_TTL_SECONDS):
+        self.workers = max(1, workers)
+        self.export_dir = export_dir or os.path.join(tempfile.gettempdir(), "finance-dashboard-exports")
+        self.ttl = ttl
+        self._jobs: Dict[str, ExportJob] = {}
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._stop = threading.Event()
+        self._purger: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start the thread that purges expired export files."""
+        if self._purger is not None and self._purger.is_alive():
+            return
+        self._stop.clear()
+        self._purger = threading.Thread(target=self._purge_loop, name="export-purge", daemon=True)
+        self._purger.start()
+
+    def _purge_loop(self) -> None:
+        while not self._stop.wait(min(PURGE_INTERVAL_SECONDS, self.ttl)):
+            try:
+                self.purge_expired()
+            except Exception as e:
+                logger.warning("[export] Purge failed: %s", e)
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="export")
+            return self._pool
+
+    def submit(self, from_period: str, to_period: str, metric: str, format: str,
+               project_nos: Optional[List[int]] = None) -> ExportJob:
+        self.purge_expired()
+        job = ExportJob(job_id=uuid.uuid4().hex, from_period=str(from_period), to_period=str(to_period),
+                        metric=metric, format=format, project_nos=project_nos)
+        with self._lock:
+            self._jobs[job.job_id] = job
+        self._publish(job)
+        self._get_pool().submit(self._run, job)
+        logger.info("[export] Job %s queued (%s -> %s, %s, %s)", job.job_id, from_period, to_period, metric, format)
+        return job
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        """The job's current state, from this process or the shared backend."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        shared = get_shared_backend()
+        if shared is None:
+            return None
+        try:
+            record = shared.get(_NAMESPACE, job_id)
+        except Exception as e:
+            logger.warning("[export] shared job lookup failed: %s", e)
+            return None
+        return ExportJob(**record) if record else None
+
+    def _publish(self, job: ExportJob) -> None:
+        shared = get_shared_backend()
+        if shared is None:
+            return
+        try:
+            shared.set(_NAMESPACE, job.job_id, asdict(job), self.ttl)
+        except Exception as e:
+            logger.warning("[export] shared job update failed: %s", e)
+
+    def _progress(self, job: ExportJob, stage: Optional[str] = None, done: Optional[int] = None,
+                  total: Optional[int] = None) -> None:
+        if stage is not None:
+            job.stage = stage
+        if done is not None:
+            job.done = done
+        if total is not None:
+            job.total = total
+        self._publish(job)
+
+    def _run(self, job: ExportJob) -> None:
+        job.status = RUNNING
+        self._progress(job, stage="comparing")
+        job_dir = os.path.join(self.export_dir, job.job_id)
+        try:
+            os.makedirs(job_dir, exist_ok=True)
+            with session_scope() as db:
+                result = run_portfolio_comparison(db, job.from_period, job.to_period, job.metric)
+            projects = _select_projects(result.get("projects", {}), job.project_nos)
+            logger.info("[export] Job %s: %d project(s) compared", job.job_id, len(projects))
+
+            self._progress(job, stage="writing", done=0, total=len(projects))
+            if job.format == "zip":
+                path = self._write_zip(job, job_dir, projects)
+            else:
+                path = self._write_workbook(job, job_dir, projects)
+
+            job.path = path
+            job.filename = f"portfolio_{job.from_period}_{job.to_period}.{job.format}"
+            job.status = DONE
+            logger.info("[export] Job %s done (%d bytes)", job.job_id, os.path.getsize(path))
+        except Exception as e:
+            if isinstance(e, PeriodNotFoundError):
+                logger.warning("[export] Job %s failed: %s", job.job_id, e)
+            else:
+                logger.error("[export] Job %s failed: %s", job.job_id, e, exc_info=True)
+            job.status = FAILED
+            job.error = str(e)
+            shutil.rmtree(job_dir, ignore_errors=True)
+        finally:
+            job.finished_at = time.time()
+            self._progress(job, stage="")
+
+    def _write_workbook(self, job: ExportJob, job_dir: str, projects: Dict[str, Any]) -> str:
+        # openpyxl writes one workbook sequentially; progress is reported per project
+        path = os.path.join(job_dir, "portfolio.xlsx")
+        with open(path, "wb") as f:
+            write_excel_cost_breakdown(
+                projects_to_dataframe(projects, job.metric), projects, f,
+                on_project=lambda done: self._progress(job, done=done),
+            )
+        return path
+
+    def _write_zip(self, job: ExportJob, job_dir: str, projects: Dict[str, Any]) -> str:
+        parts_dir = os.path.join(job_dir, "parts")
+        os.makedirs(parts_dir, exist_ok=True)
+        projects_to_dataframe(projects, job.metric).to_csv(os.path.join(parts_dir, "projects.csv"), index=False)
+
+        done = 0
+        done_lock = threading.Lock()
+
+        def write_parts(job_no: str, proj: Dict[str, Any]) -> None:
+            nonlocal done
+            proj_dir = os.path.join(parts_dir, _safe_name(job_no))
+            os.makedirs(proj_dir, exist_ok=True)
+            for name, build in (("main_types", main_costtypes_df),
+                                ("costlines", subcategories_df),
+                                ("children", children_df)):
+                df = build(proj)
+                if not df.empty:
+                    df.to_csv(os.path.join(proj_dir, f"{name}.csv"), index=False)
+            with done_lock:
+                done += 1
+                self._progress(job, done=done)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="export-part") as pool:
+            # list() re-raises the first failure
+            list(pool.map(lambda item: write_parts(*item), projects.items()))
+
+        path = os.path.join(job_dir, "portfolio.zip")
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for root, _, files in os.walk(parts_dir):
+                for name in sorted(files):
+                    full = os.path.join(root, name)
+                    zf.write(full, os.path.relpath(full, parts_dir))
+        shutil.rmtree(parts_dir, ignore_errors=True)
+        return path
+
+    def purge_expired(self) -> None:
+        """
+        Delete job directories in the export dir untouched for longer than the
+        TTL (from any worker), and this process's finished jobs older than it.
+        """
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [j for j in self._jobs.values() if j.finished_at is not None and j.finished_at < cutoff]
+            for job in expired:
+                del self._jobs[job.job_id]
+            running = {j.job_id for j in self._jobs.values() if j.status in (QUEUED, RUNNING)}
+
+        try:
+            entries = list(os.scandir(self.export_dir))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if not entry.is_dir() or entry.name in running:
+                continue
+            try:
+                # A job dir is in use while any file in it is still being written
+                mtime = max([entry.stat().st_mtime] + [
+                    os.stat(os.path.join(root, name)).st_mtime
+                    for root, _, files in os.walk(entry.path) for name in files
+                ])
+            except FileNotFoundError:
+                continue
+            if mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                logger.debug("[export] Purged job %s", entry.name)
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+export_jobs = ExportJobManager()
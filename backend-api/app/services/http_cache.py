@@ -0,0 +1,149 @@
+"""
+HTTP Cache Validators
+
+Strong ETags and Cache-Control headers for the analysis and projects
+endpoints, so clients can revalidate instead of downloading a comparison
+again.
+
+A period is closed once a later period exists in the database; the data of
+a closed period never changes, so a result that only involves closed
+periods is identified by its parameters plus DATA_VERSION (bumped by
+operators after a historical reload) and is served as immutable. For the
+latest, still-open period the ETag also includes when its frame was loaded
+into the period store, and clients must revalidate. That version is taken
+from the cached comparison itself (never by loading the frame), and the
+response's ETag from the comparison whose body is sent.
+
+If-None-Match is checked before any comparison is computed or serialized.
+"""
+
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import Request
+from starlette.responses import Response
+from sqlalchemy.orm import Session
+
+from app.config import DATA_VERSION, FILTER_OPTIONS_TTL_SECONDS, IMMUTABLE_MAX_AGE_SECONDS
+from app.services.comparison import _comparison_key, cached_versions
+from app.utils.cache import TTLCache
+from app.utils.helpers import get_filter_options
+
+logger = logging.getLogger(__name__)
+
+_filter_options_cache = TTLCache("filter_options", maxsize=1, ttl=FILTER_OPTIONS_TTL_SECONDS)
+
+REVALIDATE = "no-cache"
+
+
+@dataclass(frozen=True)
+class Validator:
+    etag: str
+    cache_control: str
+    # Request headers the representation depends on (sent on 200 and 304)
+    vary: Optional[str] = None
+
+    @property
+    def headers(self) -> dict:
+        headers = {"ETag": self.etag, "Cache-Control": self.cache_control}
+        if self.vary:
+            headers["Vary"] = self.vary
+        return headers
+
+
+def cached_filter_options(db: Session) -> Tuple[List[Any], List[Any]]:
+    """get_filter_options, cached for FILTER_OPTIONS_TTL_SECONDS."""
+    return _filter_options_cache.get_or_compute("options", lambda: get_filter_options(db))
+
+
+def latest_period(db: Session) -> Optional[str]:
+    periods, _ = cached_filter_options(db)
+    valid = [p for p in periods if isinstance(p, str) and len(p) == 6 and p.isdigit()]
+    return max(valid) if valid else None
+
+
+def _etag(*parts: Any) -> str:
+    digest = hashlib.sha256(repr((DATA_VERSION,) + parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def _immutable() -> str:
+    return f"public, max-age={IMMUTABLE_MAX_AGE_SECONDS}, immutable"
+
+
+def comparison_validator(db: Session, kind: str, from_period: str, to_period: str,
+                         project_no: int, metric: str, *extra: Any,
+                         versions: Optional[Dict[str, float]] = None) -> Optional[Validator]:
+    """
+    Validator for a result derived from one comparison.
+
+    `kind` and `extra` distinguish the representations built from the same
+    comparison (full result, summary with a budget, a drill-down level).
+    If a period is still open, pass the `versions` of the ComparisonHandle
+    whose body is sent; without them the cached comparison's are used, and
+    None is returned when it isn't cached (nothing cheap to compare against).
+    """
+    key = _comparison_key(from_period, to_period, project_no, metric)
+    latest = latest_period(db)
+    open_periods = [p for p in sorted({str(from_period), str(to_period)}) if latest is None or p >= latest]
+    if not open_periods:
+        return Validator(_etag(kind, key, extra, ()), _immutable())
+
+    if versions is None:
+        versions = cached_versions(from_period, to_period, project_no, metric)
+        if versions is None:
+            return None
+    open_versions = tuple((p, round(versions[p], 3)) for p in open_periods)
+    return Validator(_etag(kind, key, extra, open_versions), REVALIDATE)
+
+
+def periods_validator(db: Session, kind: str, periods: List[str], *extra: Any,
+                      vary: Optional[str] = None) -> Optional[Validator]:
+    """
+    Validator for a result over several periods, or None if any of them is
+    still open (those results have no cheap version to compare against).
+    """
+    latest = latest_period(db)
+    if latest is None or any(str(p) >= latest for p in periods):
+        return None
+    return Validator(_etag(kind, tuple(str(p) for p in periods), extra), _immutable(), vary)
+
+
+def filter_options_validator(db: Session, kind: str) -> Validator:
+    """Validator for the period/project lists, from their (cached) contents."""
+    periods, projects = cached_filter_options(db)
+    return Validator(_etag(kind, sorted(map(str, periods)), sorted(map(str, projects))), REVALIDATE)
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return any(t[2:] == etag if t.startswith("W/") else t == etag for t in tags)
+
+
+def not_modified(request: Request, validator: Optional[Validator]) -> Optional[Response]:
+    """A 304 response if the request's If-None-Match matches, else None."""
+    if validator is None:
+        return None
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _matches(if_none_match, validator.etag):
+        logger.debug("  304 Not Modified (%s)", validator.etag)
+        return Response(status_code=304, headers=validator.headers)
+    return None
+
+
+def with_validator(response: Response, validator: Optional[Validator]) -> Response:
+    """Set the validator's ETag / Cache-Control (and Vary) headers on a response."""
+    if validator is not None:
+        for name, value in validator.headers.items():
+            if name == "Vary":
+                present = [v.strip().lower() for v in response.headers.get("vary", "").split(",")]
+                if value.lower() not in present:
+                    response.headers.add_vary_header(value)
+            else:
+                response.headers[name] = value
+    return response
@@ -0,0 +1,137 @@
+"""
+Period Store
+
+Fetches one period from the database, combines related projects and keeps
+an integer-coded snapshot of its cost lines in memory. The normalized
+(label-based) form of each period can also be shared with the other worker
+processes through the shared cache backend. All snapshots share
+one DimensionDictionary, so the same category label has the same code in
+every period and comparisons can diff code columns directly.
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app.config import projects_list, metric_map, PERIOD_CACHE_SIZE, PERIOD_CACHE_TTL_SECONDS
+from app.services.sql_queries import query_batch_to_df
+from app.services.data_processor import prepare_period_costlines, encode_normalized_costlines
+from app.services.executor import process_pool_enabled, run_cpu_bound, compact_frame, expand_frame
+from app.utils.cache import TTLCache
+from app.utils.dimensions import DimensionDictionary
+from app.utils.metrics import stage, record_rows
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodNotFoundError(LookupError):
+    """Raised when the database has no rows for a requested period."""
+
+    def __init__(self, period: str):
+        super().__init__(f"No data found for period {period}")
+        self.period = period
+
+
+def _prepare_compact_period(df: pd.DataFrame, project_groups: dict, sum_cols):
+    """Worker-process entry point: expand the compact frame and prepare it."""
+    return prepare_period_costlines(expand_frame(df), project_groups, sum_cols)
+
+
+@dataclass
+class PeriodFrame:
+    """
+    Normalized cost lines of one period with categorical labels
+    (see normalize_period_costlines). Independent of any process-local
+    dimension codes, so it can live in the shared cache.
+    """
+    period: str
+    lines: pd.DataFrame
+    meta: Dict[str, Dict[str, str]]
+    source_rows: int
+    loaded_at: float = field(default_factory=time.time)
+
+
+@dataclass
+class PeriodSnapshot:
+    """Encoded cost lines of one period (see encode_period_costlines)."""
+    period: str
+    lines: pd.DataFrame
+    meta: Dict[int, Dict[str, str]]
+    source_rows: int
+    loaded_at: float = field(default_factory=time.time)
+
+
+class PeriodStore:
+    """
+    Cache of PeriodSnapshots sharing one dimension dictionary.
+
+    Two layers: normalized PeriodFrames (shared across worker processes
+    when SHARED_CACHE_PATH is set) and the encoded snapshots built from
+    them, which hold this process's dimension codes and stay local.
+    """
+
+    def __init__(self, maxsize: int = PERIOD_CACHE_SIZE, ttl: float = PERIOD_CACHE_TTL_SECONDS):
+        self.dims = DimensionDictionary()
+        self._frames = TTLCache("period_frames", maxsize=maxsize, ttl=ttl, shared=True)
+        self._cache = TTLCache("periods", maxsize=maxsize, ttl=ttl)
+
+    def get(self, db: Session, period: str) -> PeriodSnapshot:
+        """
+        Return the snapshot for `period`, fetching it on a cache miss.
+
+        Raises:
+            PeriodNotFoundError: If the period has no data.
+        """
+        period = str(period)
+        return self._cache.get_or_compute(period, lambda: self._encode(self.get_frame(db, period)))
+
+    def get_frame(self, db: Session, period: str) -> PeriodFrame:
+        """Return the normalized (label-based) frame for `period`."""
+        period = str(period)
+        return self._frames.get_or_compute(period, lambda: self._load(db, period))
+
+    def _load(self, db: Session, period: str) -> PeriodFrame:
+        logger.info("  Loading period %s into the period store", period)
+        with stage("db"):
+            df = query_batch_to_df(db, period)
+        record_rows("db", len(df))
+        if df.empty:
+            logger.warning("    No data found for period %s", period)
+            raise PeriodNotFoundError(period)
+        logger.info("    Retrieved %d records from database", len(df))
+
+        # Combine + normalize (CPU-bound, optionally in a worker process).
+        # Sum both metric columns so one snapshot serves every metric.
+        sum_cols = list(metric_map.values())
+        with stage("combine"):
+            if process_pool_enabled():
+                norm, meta = run_cpu_bound(_prepare_compact_period, compact_frame(df), projects_list, sum_cols)
+            else:
+                norm, meta = prepare_period_costlines(df, projects_list, sum_cols)
+        record_rows("combine", len(norm))
+        logger.info("    After combining: %d records", len(norm))
+        return PeriodFrame(period=period, lines=norm, meta=meta, source_rows=len(df))
+
+    def _encode(self, frame: PeriodFrame) -> PeriodSnapshot:
+        with stage("encode"):
+            lines, meta = encode_normalized_costlines(frame.lines, frame.meta, self.dims)
+        record_rows("encode", len(lines))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("    Encoded %d cost lines (%d bytes)", len(lines), lines.memory_usage(deep=True).sum())
+        return PeriodSnapshot(period=frame.period, lines=lines, meta=meta,
+                              source_rows=frame.source_rows, loaded_at=frame.loaded_at)
+
+    def invalidate(self, period: str = None) -> None:
+        key = None if period is None else str(period)
+        self._frames.invalidate(key)
+        self._cache.invalidate(key)
+
+    def stats(self):
+        return self._cache.stats()
+
+
+period_store = PeriodStore()
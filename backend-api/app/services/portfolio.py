@@ -0,0 +1,128 @@
+"""
+Portfolio Service
+
+Per-period project totals for portfolio-level views (overall summary and
+the projects x months matrix). Each period's totals come from the SQL-side
+aggregate (query_portfolio_totals) and are cached, so a 24-month matrix
+costs at most one small aggregate query per month and nothing afterwards.
+
+Closed periods (see http_cache) never change, so their totals are kept for
+PORTFOLIO_CLOSED_TTL_SECONDS; only the open period expires with the other
+period caches. Both caches hold at least the longest matrix window.
+"""
+
+import logging
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app.config import (
+    projects_list, metric_map, DATA_VERSION, PERIOD_CACHE_TTL_SECONDS,
+    PORTFOLIO_CACHE_SIZE, PORTFOLIO_CLOSED_TTL_SECONDS, PORTFOLIO_MAX_MONTHS,
+)
+from app.services.http_cache import latest_period
+from app.services.sql_queries import query_portfolio_totals
+from app.services.data_processor import collapse_portfolio_totals
+from app.utils.cache import TTLCache
+from app.utils.helpers import make_periods, shift_period, period_to_label
+from app.utils.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+_CACHE_SIZE = max(PORTFOLIO_CACHE_SIZE, PORTFOLIO_MAX_MONTHS)
+_closed_totals_cache = TTLCache("portfolio_totals_closed", maxsize=_CACHE_SIZE,
+                                ttl=PORTFOLIO_CLOSED_TTL_SECONDS, shared=True)
+_open_totals_cache = TTLCache("portfolio_totals", maxsize=_CACHE_SIZE, ttl=PERIOD_CACHE_TTL_SECONDS, shared=True)
+
+
+def get_portfolio_totals(db: Session, period: str) -> pd.DataFrame:
+    """
+    Per-project rForecast / rYearAct totals for one period (cached).
+
+    Returns an empty DataFrame when the period has no data; empty results
+    are cached too so missing months aren't re-queried on every request.
+    The returned frame is shared with the cache and must not be mutated.
+    """
+    period = str(period)
+
+    def fetch() -> pd.DataFrame:
+        with stage("db"):
+            return query_portfolio_totals(db, period)
+
+    latest = latest_period(db)
+    if latest is not None and period < latest:
+        # Keyed by DATA_VERSION too: a historical reload must not be served
+        # from the long-lived (possibly host-wide) entries
+        return _closed_totals_cache.get_or_compute((DATA_VERSION, period), fetch)
+    return _open_totals_cache.get_or_compute(period, fetch)
+
+
+def build_portfolio_matrix(db: Session, to_period: str, months: int, metric: str) -> Dict[str, Any]:
+    """
+    Build a projects x months matrix of the metric (in millions) and its
+    month-over-month change for the `months` periods ending at `to_period`.
+
+    Months without data are kept as null columns, so a change next to a
+    gap is null as well.
+    """
+    sum_col = metric_map[metric]
+    periods = make_periods(shift_period(to_period, -(months - 1)), to_period)
+
+    columns = {}
+    meta_frames = []
+    for period in periods:
+        totals = get_portfolio_totals(db, period)
+        if totals.empty:
+            logger.debug("  No portfolio totals for period %s", period)
+            continue
+        collapsed = collapse_portfolio_totals(totals, projects_list, sum_col).set_index("iProjNo")
+        columns[period] = collapsed[sum_col]
+        meta_frames.append(collapsed[["cProjDesc", "cClientDesc"]])
+
+    matrix = pd.DataFrame(columns, index=None).reindex(columns=periods) / 1000
+    changes = matrix.diff(axis=1)
+
+    # Latest known description/client per project group
+    meta = (pd.concat(meta_frames).groupby(level=0).last()
+            if meta_frames else pd.DataFrame(columns=["cProjDesc", "cClientDesc"]))
+    meta = meta.reindex(matrix.index)
+
+    # Largest movers first
+    order = changes.abs().sum(axis=1, min_count=1).fillna(0.0).sort_values(ascending=False, kind="stable").index
+    matrix, changes, meta = matrix.loc[order], changes.loc[order], meta.loc[order]
+
+    def to_rows(frame: pd.DataFrame) -> List[List[Any]]:
+        values = frame.to_numpy(dtype=float)
+        return np.where(np.isnan(values), None, values).tolist()
+
+    return {
+        "metric": metric,
+        "periods": periods,
+        "period_labels": [period_to_label(p) for p in periods],
+        "projects": [
+            {
+                "iProjNo": str(job_no),
+                "cProjDesc": None if pd.isna(desc) else desc,
+                "cClientDesc": None if pd.isna(client) else client,
+            }
+            for job_no, desc, client in zip(meta.index, meta["cProjDesc"], meta["cClientDesc"])
+        ],
+        "values": to_rows(matrix),
+        "changes": to_rows(changes),
+    }
+
+
+def portfolio_matrix_frame(matrix: Dict[str, Any]) -> pd.DataFrame:
+    """
+    Long-form table of a build_portfolio_matrix result: one row per project
+    and period with the value and change (millions, NaN where missing).
+    """
+    projects = pd.DataFrame(matrix["projects"], columns=["iProjNo", "cProjDesc", "cClientDesc"])
+    n_periods = len(matrix["periods"])
+    frame = projects.loc[projects.index.repeat(n_periods)].reset_index(drop=True)
+    frame["period"] = matrix["periods"] * len(projects)
+    frame["value"] = np.array(matrix["values"], dtype=float).reshape(-1) if len(projects) else []
+    frame["change"] = np.array(matrix["changes"], dtype=float).reshape(-1) if len(projects) else []
+    return frame
@@ -0,0 +1,185 @@
+"""
+Pre-computation Scheduler
+
+Background thread that watches for newly closed periods and warms the
+caches before users arrive. When the filter-options query reports a period
+that hasn't been seen yet, the scheduler:
+
+1. Loads the new period, the previous month and the previous year-end into
+   the period store, plus their portfolio totals (one period at a time, so
+   the database only sees one heavy query from the warm-up).
+2. Pre-computes comparisons against the previous month and the previous
+   year-end for every configured project group and metric, with at most
+   PRECOMPUTE_CONCURRENCY running at once.
+
+Every uvicorn worker starts a scheduler, but only the one holding the
+"precompute" lease in the state file (see PRECOMPUTE_STATE_PATH) polls and
+warms; the others stand by and take over if its lease expires. The last
+warmed period is stored there too, so a restart doesn't warm it again.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from app.config import metric_map, PRECOMPUTE_INTERVAL_SECONDS, PRECOMPUTE_CONCURRENCY, PRECOMPUTE_STATE_PATH
+from app.database import session_scope
+from app.services.period_store import period_store, PeriodNotFoundError
+from app.services.portfolio import get_portfolio_totals
+from app.services.comparison import run_forecast_comparison, representative_projects
+from app.utils.helpers import get_filter_options, shift_period
+from app.utils.shared_cache import SQLiteCacheBackend, get_shared_backend
+
+logger = logging.getLogger(__name__)
+
+_LEASE = "precompute"
+_STATE = "precompute_state"
+
+
+def warmup_periods(period: str) -> List[str]:
+    """The periods pre-loaded for a new period: itself, previous month, previous year-end."""
+    year_end = f"{int(period[:4]) - 1}12"
+    return list(dict.fromkeys([period, shift_period(period, -1), year_end]))
+
+
+def _state_backend() -> SQLiteCacheBackend:
+    if PRECOMPUTE_STATE_PATH:
+        return SQLiteCacheBackend(PRECOMPUTE_STATE_PATH)
+    return get_shared_backend() or SQLiteCacheBackend(
+        os.path.join(tempfile.gettempdir(), "finance-dashboard-scheduler.sqlite")
+    )
+
+
+class PrecomputeScheduler:
+    """Polls for new periods every `interval` seconds and warms the caches (one worker per host)."""
+
+    def __init__(self, interval: float = PRECOMPUTE_INTERVAL_SECONDS, concurrency: int = PRECOMPUTE_CONCURRENCY):
+        self.interval = interval
+        self.concurrency = max(1, concurrency)
+        # Held for two polls, so a busy leader keeps it and a dead one is replaced
+        self.lease_ttl = 2 * interval
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._state: Optional[SQLiteCacheBackend] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def state(self) -> SQLiteCacheBackend:
+        if self._state is None:
+            self._state = _state_backend()
+        return self._state
+
+    @property
+    def last_period(self) -> Optional[str]:
+        return self.state.get(_STATE, "last_period")
+
+    @last_period.setter
+    def last_period(self, period: Optional[str]) -> None:
+        self.state.set(_STATE, "last_period", period, 0)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="precompute-scheduler", daemon=True)
+        self._thread.start()
+        logger.info("Pre-computation scheduler started (interval=%ss, concurrency=%s)", self.interval, self.concurrency)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        try:
+            self.state.release_lease(_LEASE, self.owner)
+        except Exception as e:
+            logger.warning("[scheduler] Could not release the lease: %s", e)
+        logger.info("Pre-computation scheduler stopped")
+
+    def hold_lease(self) -> bool:
+        """Take or renew the warm-up lease; False if another worker holds it."""
+        return self.state.acquire_lease(_LEASE, self.owner, self.lease_ttl)
+
+    def _run(self) -> None:
+        leader = False
+        while not self._stop.is_set():
+            try:
+                was_leader, leader = leader, self.hold_lease()
+                if leader != was_leader:
+                    logger.info("[scheduler] %s the warm-up lease", "Holding" if leader else "Standing by; another worker holds")
+                if leader:
+                    self.check_for_new_period()
+            except Exception as e:
+                logger.error("[scheduler] Warm-up failed: %s", e, exc_info=True)
+            self._stop.wait(self.interval)
+
+    def check_for_new_period(self) -> Optional[str]:
+        """Warm the caches if a new latest period is available. Returns the warmed period."""
+        with session_scope() as db:
+            periods, _ = get_filter_options(db)
+        available = sorted(p for p in periods if isinstance(p, str) and len(p) == 6 and p.isdigit())
+        last_period = self.last_period
+        if not available or available[-1] == last_period:
+            return None
+
+        latest = available[-1]
+        logger.info("[scheduler] New period detected: %s (previous: %s)", latest, last_period)
+        if self.warm(latest, set(available)):
+            self.last_period = latest
+            return latest
+        return None
+
+    def warm(self, period: str, available: set) -> bool:
+        """Warm the caches for `period`. False if the warm-up was stopped or `period` has no data."""
+        targets = [p for p in warmup_periods(period) if p in available]
+
+        # 1) Fetch + pre-aggregate, one period at a time
+        loaded = []
+        with session_scope() as db:
+            for p in targets:
+                if self._stop.is_set() or not self.hold_lease():
+                    return False
+                try:
+                    period_store.get(db, p)
+                    get_portfolio_totals(db, p)
+                    loaded.append(p)
+                    logger.info("[scheduler]   Period %s loaded", p)
+                except PeriodNotFoundError:
+                    # Not cached as missing, so comparisons against it would re-query it
+                    logger.warning("[scheduler]   Period %s has no data, skipping", p)
+        if period not in loaded:
+            return False
+
+        # 2) Comparisons against the previous month / year-end, bounded concurrency
+        jobs = [(from_p, project_no, metric)
+                for from_p in loaded if from_p != period
+                for project_no in representative_projects()
+                for metric in metric_map]
+        logger.info("[scheduler]   Pre-computing %d comparisons for %s", len(jobs), period)
+
+        def run(job):
+            from_p, project_no, metric = job
+            # Renewing the lease also stops the warm-up if another worker took over
+            if self._stop.is_set() or not self.hold_lease():
+                return
+            try:
+                with session_scope() as db:
+                    run_forecast_comparison(db, from_p, period, project_no, metric)
+            except PeriodNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning("[scheduler]   Comparison %s->%s for %s (%s) failed: %s", from_p, period, project_no, metric, e)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="precompute") as pool:
+            list(pool.map(run, jobs))
+        if self._stop.is_set():
+            return False
+        logger.info("[scheduler]   Warm-up for %s complete", period)
+        return True
+
+
+scheduler = PrecomputeScheduler()
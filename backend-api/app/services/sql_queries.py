@@ -7,6 +7,7 @@ project cost data including forecasts, actuals, and cost breakdowns.
 """
 
 import pandas as pd
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 # =============================================================================
@@ -155,13 +156,87 @@ base_sql = """Declare @cBook char(6)='ALL'
 			"""
 
 
+# Columns of the base_sql result, in order
+BASE_SQL_COLUMNS = [
+    "cBook", "iProjYear", "iProjNo", "cSegment", "cPackage", "cPeriod", "cElementCode", "TYP", "cType", "iWidth",
+    "rMthBud", "rMthAct", "rYearBud", "rYearBTD", "rYearAct", "rYearFrc", "rPTDBud", "rPTDAct", "rOrgBud",
+    "rRevBud", "rForecast", "rRateBud", "rRateFrc", "rVariance", "rVarianceChange", "rForecastChange",
+    "rPercCompl", "cSubDesc2", "cSubDesc3", "lCommitted", "iCurrCode", "cClient", "cProjDesc", "cProjMgr",
+    "cClientDesc", "cFirstFrcPeriod", "cCurrAbrv", "rCurrRate", "cCurrDesc", "cMajorDesc", "cAnnex",
+    "cMainDesc", "cBookDesc",
+]
+
+
+# =============================================================================
+# Portfolio Totals SQL
+# Server-side aggregate used by the overall summary: one row per project with
+# summed rForecast / rYearAct. Uses the same joins and row filters as base_sql
+# (with its default parameters) and additionally pushes down the filters that
+# combine_projects_rows applies in pandas:
+# - only forecast lines (cType = 'F')
+# - no Revenue cost types, unless the segment is a variation segment
+#   (those are relabelled to "70 - Variations" and therefore kept)
+# =============================================================================
+portfolio_totals_sql = """
+        SELECT a.iProjNo, a.iProjYear, c.cProjDesc, d.cClientDesc,
+               SUM(a.rForecast) AS rForecast, SUM(a.rYearAct) AS rYearAct
+        FROM Ac_JcPackageDt a (NoLock)
+        inner join  Ac_JcPackageHd b (NoLock) on a.cBook = b.cBook AND a.iProjYear = b.iProjYear AND a.iProjNo = b.iProjNo AND a.cSegment = b.cSegment AND a.cPackage = b.cPackage AND a.cPeriod = b.cPeriod
+        inner join   Ac_JcBudControl c (NoLock) on  a.cBook = c.cBook AND a.iProjYear = c.iProjYear AND a.iProjNo = c.iProjNo AND c.cProjType = 'C'
+        left outer join  vwac_Clients d on c.cClient = d.cClientCode
+        left outer join       Mm_Currency e (Nolock) on c.iCurrCode = e.iCurrCode
+        left outer join        Ac_MainCenter f (NoLock) on  a.cSegment = f.cMajor
+        inner join       Ac_JcPackageRef g (NoLock) on  a.cPackage = g.cPackage
+        left outer join    Ac_JcBudControlDetail h (NoLock) on  a.cBook = h.cBook AND a.iProjYear = h.iProjYear AND a.iProjNo = h.iProjNo and a.cSegment = h.cSegment AND h.cProjType = 'C'
+        left outer join       Ac_ArSegment j (NoLock) on a.cSegment = j.cCoCode
+        left outer join        Cs_Book k (NoLock) on  c.cBook = k.cBook
+        left outer join               Ac_JcResources l (NoLock) on  a.cElementCode =l.cResource
+        left join  AC_JcMgrSegPack m (Nolock)  on a.cSegment = m.cSegment AND a.cPackage = m.cPackage AND SUBSTRING(a.cElementCode, 1, 2) = m.cCode
+        WHERE f.cCompany = 'N'
+          AND a.cPeriod = ?
+          AND a.cPackage NOT IN ('92','93')
+          AND a.cType = 'F'
+          AND (f.cDesc LIKE '%variation%' OR ISNULL(g.cPackage + ' - ' + g.cSubDesc1, '') NOT LIKE '%Revenue%')
+          AND (a.rMthBud <> 0 or a.rMthAct <> 0 or a.rYearBud <> 0 or a.rYearBTD <> 0 or a.rYearAct <> 0 or a.rYearFrc <> 0 or a.rPTDBud <> 0 or a.rPTDAct <> 0 or a.rOrgBud <> 0 or a.rRevBud <> 0 or a.rForecast <> 0 or a.rVariance <> 0
+               or (round(a.rForecast,0) - round(a.rLastMonthStcFrc,0)) <> 0)
+        GROUP BY a.iProjNo, a.iProjYear, c.cProjDesc, d.cClientDesc
+        """
+
+PORTFOLIO_TOTALS_COLUMNS = ["iProjNo", "iProjYear", "cProjDesc", "cClientDesc", "rForecast", "rYearAct"]
+
+# =============================================================================
+# Local Database (LOCAL_DB_PATH)
+# The SQLite stand-in holds base_sql's result rows in one table, so the
+# queries are plain selects over it. The portfolio aggregate applies the same
+# filters as portfolio_totals_sql (LIKE is case-insensitive in both).
+# =============================================================================
+LOCAL_TABLE = "cost_lines"
+
+local_base_sql = f"""
+        SELECT {", ".join(BASE_SQL_COLUMNS)}
+        FROM {LOCAL_TABLE}
+        WHERE cPeriod = :period
+        """
+
+local_portfolio_totals_sql = f"""
+        SELECT iProjNo, iProjYear, cProjDesc, cClientDesc,
+               SUM(rForecast) AS rForecast, SUM(rYearAct) AS rYearAct
+        FROM {LOCAL_TABLE}
+        WHERE cPeriod = :period
+          AND cType = 'F'
+          AND (cMajorDesc LIKE '%variation%' OR IFNULL(TYP, '') NOT LIKE '%Revenue%')
+        GROUP BY iProjNo, iProjYear, cProjDesc, cClientDesc
+        """
+
+
 def query_batch_to_df(db: Session, period: str) -> pd.DataFrame:
     """
     Execute the main SQL query for a specific period and return results as DataFrame.
     
     This function:
     1. In TEST_MODE: Loads data from XLSX files in the project root
-    2. In production: Executes the complex JOIN query against SQL Server
+    2. With LOCAL_DB_PATH: Reads the rows from the local SQLite stand-in
+    3. In production: Executes the complex JOIN query against SQL Server
     
     Args:
         db: SQLAlchemy database session (None in test mode)
@@ -171,10 +246,12 @@ def query_batch_to_df(db: Session, period: str) -> pd.DataFrame:
         pd.DataFrame: Project cost data with columns like iProjNo, rForecast, etc.
                       Returns empty DataFrame if no data found.
     """
-    from app.config import TEST_MODE
+    from app.config import TEST_MODE, LOCAL_DB_PATH
     
     if TEST_MODE:
         return _query_from_xlsx(period)
+    elif LOCAL_DB_PATH:
+        return _query_from_local_db(db, period)
     else:
         return _query_from_database(db, period)
 
@@ -261,3 +338,68 @@ def _query_from_database(db: Session, period: str) -> pd.DataFrame:
     rows = cur.fetchall()
     return pd.DataFrame.from_records(rows, columns=cols)
 
+
+def _query_from_local_db(db: Session, period: str) -> pd.DataFrame:
+    """
+    Read one period from the local SQLite stand-in (see LOCAL_DB_PATH).
+
+    Returns the same columns and dtypes as _query_from_database; SQLite
+    has no boolean type, so lCommitted is converted back from 0/1.
+    """
+    df = pd.read_sql_query(text(local_base_sql), db.connection(), params={"period": period})
+    if df.empty:
+        return pd.DataFrame()
+    df["lCommitted"] = df["lCommitted"].astype(bool)
+    return df
+
+
+def query_portfolio_totals(db: Session, period: str) -> pd.DataFrame:
+    """
+    Fetch per-project rForecast / rYearAct totals for one period.
+
+    Only the aggregate crosses the wire (a few hundred rows), instead of
+    every element-level line fetched by query_batch_to_df.
+
+    Args:
+        db: SQLAlchemy database session (None in test mode)
+        period: Period in YYYYMM format
+
+    Returns:
+        pd.DataFrame with PORTFOLIO_TOTALS_COLUMNS, or an empty DataFrame.
+    """
+    from app.config import TEST_MODE, LOCAL_DB_PATH
+
+    if TEST_MODE:
+        return aggregate_portfolio_totals(_query_from_xlsx(period))
+    if LOCAL_DB_PATH:
+        return pd.read_sql_query(text(local_portfolio_totals_sql), db.connection(), params={"period": period})
+
+    conn = db.connection()
+    cur = conn.connection.cursor()
+    cur.execute("SET NOCOUNT ON;\n" + portfolio_totals_sql, (period,))
+    while cur.description is None:
+        if not cur.nextset():
+            return pd.DataFrame(columns=PORTFOLIO_TOTALS_COLUMNS)
+
+    cols = [c[0] for c in cur.description]
+    return pd.DataFrame.from_records(cur.fetchall(), columns=cols)
+
+
+def aggregate_portfolio_totals(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    pandas equivalent of portfolio_totals_sql for element-level rows
+    (used in TEST_MODE, where rows come from the XLSX files).
+    """
+    if df.empty:
+        return pd.DataFrame(columns=PORTFOLIO_TOTALS_COLUMNS)
+
+    d = df[df["cType"] == "F"]
+    is_variation = d["cMajorDesc"].fillna("").astype(str).str.contains("variation", case=False)
+    is_revenue = d["TYP"].fillna("").astype(str).str.contains("Revenue", case=False)
+    d = d[is_variation | ~is_revenue]
+
+    totals = d[PORTFOLIO_TOTALS_COLUMNS].copy()
+    totals[["rForecast", "rYearAct"]] = totals[["rForecast", "rYearAct"]].apply(pd.to_numeric, errors="coerce").fillna(0.0)
+    return (totals.groupby(["iProjNo", "iProjYear", "cProjDesc", "cClientDesc"], dropna=False, sort=False)
+                  [["rForecast", "rYearAct"]].sum()
+                  .reset_index())
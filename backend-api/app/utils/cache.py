@@ -0,0 +1,220 @@
+"""
+Cache Utilities
+
+Small in-process caches used by the analysis services so that repeated
+requests for the same periods/projects don't re-run the SQL fetch and the
+pandas transformation pipeline.
+"""
+
+import threading
+import time
+import logging
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from app.utils.shared_cache import get_shared_backend
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# Every live TTLCache, for the metrics endpoint
+_caches: "weakref.WeakSet[TTLCache]" = weakref.WeakSet()
+
+
+class _Flight:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight block and receive the same result (or the same exception).
+    Coalescing is per process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.event.set()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after `ttl` seconds.
+
+    FastAPI runs sync endpoints in a threadpool, so every access is guarded
+    by a lock. A `ttl` of 0 (or less) disables expiry; a `maxsize` of 0
+    disables the cache entirely (every lookup is a miss).
+
+    With `shared=True` and SHARED_CACHE_PATH configured, entries are also
+    written to the host-wide shared backend, and local misses are looked up
+    there before being reported as misses. Keys must then be tuples/strings
+    of plain values and values must be picklable.
+    """
+
+    def __init__(self, name: str, maxsize: int = 128, ttl: float = 600.0, shared: bool = False):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.shared = get_shared_backend() if shared else None
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        _caches.add(self)
+
+    def _get_local(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def _set_local(self, key: Hashable, value: Any, shared_expires_at: Optional[float] = None) -> None:
+        # A copy of a shared entry expires with it, never later
+        now = time.monotonic()
+        expiries = [now + self.ttl] if self.ttl > 0 else []
+        if shared_expires_at is not None:
+            expiries.append(now + (shared_expires_at - time.time()))
+        expires_at = min(expiries) if expiries else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted, _ = self._data.popitem(last=False)
+                logger.debug("[%s] evicted %r", self.name, evicted)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._get_local(key)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+        if self.shared is not None and self.maxsize > 0:
+            try:
+                entry = self.shared.get_entry(self.name, key)
+            except Exception as e:
+                logger.warning("[%s] shared cache read failed: %s", self.name, e)
+                entry = None
+            if entry is not None:
+                value, expires_at = entry
+                self._set_local(key, value, expires_at)
+                self.shared_hits += 1
+                return value
+        self.misses += 1
+        return default
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Like get(), but not counted as a hit or miss (for cheap probes)."""
+        value = self._get_local(key)
+        if value is _MISSING and self.shared is not None and self.maxsize > 0:
+            try:
+                value = self.shared.get(self.name, key, _MISSING)
+            except Exception as e:
+                logger.warning("[%s] shared cache read failed: %s", self.name, e)
+                value = _MISSING
+        return default if value is _MISSING else value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        self._set_local(key, value)
+        if self.shared is not None:
+            try:
+                self.shared.set(self.name, key, value, self.ttl)
+            except Exception as e:
+                # The shared layer is an optimization; never fail the request over it
+                logger.warning("[%s] shared cache write failed: %s", self.name, e)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for `key`, computing and storing it on a miss.
+
+        Concurrent misses for the same key are coalesced: one caller computes,
+        the others wait for its result instead of repeating the work.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        def compute_and_store():
+            # A flight that just finished may have stored the value already
+            value = self._get_local(key)
+            if value is not _MISSING:
+                return value
+            value = compute()
+            self.set(key, value)
+            return value
+
+        return self._flight.do(key, compute_and_store)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop one entry, or every entry when `key` is None."""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+        if self.shared is not None:
+            try:
+                self.shared.delete(self.name, key)
+            except Exception as e:
+                logger.warning("[%s] shared cache delete failed: %s", self.name, e)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "coalesced": self._flight.coalesced,
+            }
+
+
+def all_caches() -> List[Dict[str, Any]]:
+    """stats() of every live TTLCache."""
+    return [cache.stats() for cache in list(_caches)]
@@ -0,0 +1,73 @@
+"""
+Dimension Dictionaries
+
+Integer coding for the repeated category labels of the cost hierarchy
+(project group, cost type, section, subcategory, child). Labels are
+factorized once per unique value and every period encoded through the
+same dictionary gets the same code for the same label, so aggregation and
+period-to-period diffing can run on int arrays. Strings are only decoded
+when the response is built.
+"""
+
+import threading
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+# Dimension names used by the period store
+GROUP = "group"
+COST_TYPE = "cost_type"
+SECTION = "section"
+SUBCATEGORY = "subcategory"
+CHILD = "child"
+
+
+class DimensionDictionary:
+    """
+    Append-only label <-> code mapping, one vocabulary per dimension.
+
+    Codes are dense int32 values assigned in first-seen order. Once a label
+    has a code it never changes, so codes stay comparable across periods.
+    """
+
+    def __init__(self):
+        self._codes: Dict[str, Dict[str, int]] = {}
+        self._labels: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def encode(self, dim: str, values: pd.Series) -> np.ndarray:
+        """
+        Encode a Series of (already normalized) string labels to int32 codes.
+
+        Only the unique values touch the Python dict; the per-row mapping is
+        a numpy take.
+        """
+        local_codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        with self._lock:
+            codes = self._codes.setdefault(dim, {})
+            labels = self._labels.setdefault(dim, [])
+            lookup = np.empty(len(uniques), dtype=np.int32)
+            for i, label in enumerate(uniques):
+                code = codes.get(label)
+                if code is None:
+                    code = len(labels)
+                    codes[label] = code
+                    labels.append(label)
+                lookup[i] = code
+        return lookup[local_codes] if len(uniques) else np.empty(0, dtype=np.int32)
+
+    def decode(self, dim: str, code: int) -> str:
+        return self._labels[dim][int(code)]
+
+    def decode_many(self, dim: str, codes: Iterable[int]) -> List[str]:
+        labels = self._labels[dim]
+        return [labels[int(c)] for c in codes]
+
+    def labels(self, dim: str) -> List[str]:
+        """Snapshot of every label known for a dimension, indexed by code."""
+        with self._lock:
+            return list(self._labels.get(dim, []))
+
+    def size(self, dim: str) -> int:
+        return len(self._labels.get(dim, []))
@@ -133,31 +133,42 @@ def make_periods(start_ym="201901", end_ym=None):
     return periods
 
 
+def shift_period(period: str, months: int) -> str:
+    """Shift a YYYYMM period by `months` (negative = earlier), e.g. ('202401', -1) -> '202312'."""
+    y, m = int(str(period)[:4]), int(str(period)[4:6])
+    idx = y * 12 + (m - 1) + months
+    return f"{idx // 12}{idx % 12 + 1:02d}"
+
+
 def get_filter_options(db):
     """
     Get available periods and projects from the database.
     
     In TEST_MODE: Returns hardcoded values matching the XLSX dummy data files.
+    With LOCAL_DB_PATH: Queries the local SQLite stand-in.
     In production: Queries the actual database.
     """
-    from app.config import TEST_MODE
+    from app.config import TEST_MODE, LOCAL_DB_PATH
     
     if TEST_MODE:
         # Return periods and projects that match our XLSX dummy data
         periods = ["202305", "202312"]
         projects = [299, 300, 535]  # Projects available in the dummy data
         return periods, projects
-    
+
+    from app.services.sql_queries import LOCAL_TABLE
+
+    source = LOCAL_TABLE if LOCAL_DB_PATH else "Nibis.dbo.AC_JcPackageDt WITH (NOLOCK)"
     try:
-        periods_sql = text("""
+        periods_sql = text(f"""
             SELECT DISTINCT cPeriod
-            FROM Nibis.dbo.AC_JcPackageDt WITH (NOLOCK)
+            FROM {source}
         """)
         periods = [row[0] for row in db.execute(periods_sql).fetchall()]
 
-        projects_sql = text("""
+        projects_sql = text(f"""
             SELECT DISTINCT iProjNo
-            FROM Nibis.dbo.AC_JcPackageDt WITH (NOLOCK)
+            FROM {source}
         """)
         projects = [row[0] for row in db.execute(projects_sql).fetchall()]
         db.commit()
@@ -0,0 +1,139 @@
+"""
+Concurrency Limiter
+
+Caps how many slow outbound calls (the LLM) run at once, with a bounded
+wait queue in front. A caller that finds the queue full, or waits longer
+than the queue timeout, gets LimiterFull immediately instead of piling up
+behind the others; the routers turn it into 429 with a Retry-After
+estimated from how long recent calls held their slot.
+
+The limiter lives on the event loop: callers await a slot, so waiting
+questions hold no threadpool thread and cannot slow the analysis endpoints.
+"""
+
+import asyncio
+import logging
+import math
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Weight of the latest call in the moving average of slot hold times
+_EWMA_ALPHA = 0.2
+
+# Every live limiter, for the metrics endpoint
+_limiters: "weakref.WeakSet[ConcurrencyLimiter]" = weakref.WeakSet()
+
+
+class LimiterFull(Exception):
+    """No slot is available; retry after `retry_after` seconds."""
+
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"{name}: too many concurrent requests, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """
+    At most `max_in_flight` holders of a slot, at most `max_queued` waiters.
+
+    `max_queued` of 0 rejects as soon as every slot is taken; a
+    `queue_timeout` of 0 (or less) lets admitted waiters wait indefinitely.
+    """
+
+    def __init__(self, name: str, max_in_flight: int, max_queued: int, queue_timeout: Optional[float] = None):
+        self.name = name
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queued = max(0, max_queued)
+        self.queue_timeout = queue_timeout if queue_timeout and queue_timeout > 0 else None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._wait_total = 0.0
+        self._hold_avg: Optional[float] = None
+        _limiters.add(self)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Created lazily, inside the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphore
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free for one more caller."""
+        hold = self._hold_avg if self._hold_avg is not None else 1.0
+        rounds = (self.queued + 1) / self.max_in_flight
+        return max(1, math.ceil(hold * rounds))
+
+    def _reject(self, reason: str) -> LimiterFull:
+        self.rejected += 1
+        retry_after = self.retry_after()
+        logger.warning("[%s] Rejected (%s): %d in flight, %d queued, retry after %ss",
+                       self.name, reason, self.in_flight, self.queued, retry_after)
+        return LimiterFull(self.name, retry_after)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Hold one slot for the duration of the block.
+
+        Raises:
+            LimiterFull: The queue is full, or the wait exceeded queue_timeout.
+        """
+        semaphore = self._get_semaphore()
+        if semaphore.locked():
+            if self.queued >= self.max_queued:
+                raise self._reject("queue full")
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+            waited_from = time.perf_counter()
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise self._reject(f"waited {self.queue_timeout}s")
+            finally:
+                self.queued -= 1
+            self._wait_total += time.perf_counter() - waited_from
+        else:
+            await semaphore.acquire()
+
+        self.in_flight += 1
+        self.admitted += 1
+        held_from = time.perf_counter()
+        try:
+            yield
+        finally:
+            held = time.perf_counter() - held_from
+            self._hold_avg = held if self._hold_avg is None else (
+                _EWMA_ALPHA * held + (1 - _EWMA_ALPHA) * self._hold_avg
+            )
+            self.in_flight -= 1
+            semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "peak_queued": self.peak_queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_ms": round(1000 * self._wait_total / self.admitted, 1) if self.admitted else 0.0,
+            "avg_hold_ms": round(1000 * self._hold_avg, 1) if self._hold_avg is not None else None,
+        }
+
+
+def all_limiters() -> List[Dict[str, Any]]:
+    """stats() of every live limiter."""
+    return [limiter.stats() for limiter in list(_limiters)]
@@ -0,0 +1,122 @@
+"""
+Logging Setup
+
+configure_logging() installs the application's root handler:
+
+  - LOG_ASYNC: request threads only put the record on a queue; a
+    QueueListener thread formats and writes it. Records are queued
+    unformatted, so the message is built off the request path too.
+  - LOG_SAMPLE_RATES: LogSamplingMiddleware decides once per request whether
+    its INFO/DEBUG records are kept (by the longest matching path prefix),
+    so a sampled request keeps all of its lines and an unsampled one costs
+    a filter call per record. Warnings and errors are always kept, as is
+    everything logged outside a request.
+
+Modules should log with %-style arguments (logger.info("x=%s", x)) so that
+records dropped by level or sampling are never formatted.
+"""
+
+import atexit
+import contextvars
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from typing import List, Optional, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# True/False inside a request whose sampling was decided, None elsewhere
+_sampled: contextvars.ContextVar[Optional[bool]] = contextvars.ContextVar("log_sampled", default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def parse_sample_rates(spec: str) -> List[Tuple[str, float]]:
+    """"/health=0,/api/analysis=0.1" -> [(prefix, rate)], longest prefix first."""
+    rates = []
+    for part in spec.split(","):
+        prefix, sep, rate = part.strip().partition("=")
+        if not sep or not prefix:
+            continue
+        try:
+            rates.append((prefix.strip(), min(max(float(rate), 0.0), 1.0)))
+        except ValueError:
+            logging.getLogger(__name__).warning("Ignoring invalid log sample rate %r", part)
+    return sorted(rates, key=lambda item: -len(item[0]))
+
+
+class SamplingFilter(logging.Filter):
+    """Drop INFO/DEBUG records of requests that were not sampled."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or _sampled.get() is not False
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    # The queue stays in-process, so the record needn't be made picklable;
+    # leaving msg/args as they are moves formatting to the listener thread
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class LogSamplingMiddleware:
+    """Decide per request whether its INFO/DEBUG logs are kept."""
+
+    def __init__(self, app: ASGIApp, rates: List[Tuple[str, float]]):
+        self.app = app
+        self.rates = rates
+
+    def _rate(self, path: str) -> float:
+        for prefix, rate in self.rates:
+            if path.startswith(prefix):
+                return rate
+        return 1.0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.rates:
+            await self.app(scope, receive, send)
+            return
+        rate = self._rate(scope["path"])
+        token = _sampled.set(rate >= 1.0 or random.random() < rate)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _sampled.reset(token)
+
+
+def configure_logging(level: str = "INFO", use_queue: bool = True) -> None:
+    """Install the root handler (idempotent; replaces existing root handlers)."""
+    global _listener
+    stop_logging()
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    if use_queue:
+        handler: logging.Handler = _DeferredQueueHandler(queue.SimpleQueue())
+        _listener = logging.handlers.QueueListener(handler.queue, stream, respect_handler_level=True)
+        _listener.start()
+    else:
+        handler = stream
+    handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+def stop_logging() -> None:
+    """Flush and stop the background writer, if running."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,216 @@
+"""
+Pipeline Metrics
+
+Prometheus metrics for the comparison pipeline, exposed at GET /metrics:
+
+  - pipeline_stage_seconds{endpoint, metric, stage}   histogram
+  - pipeline_stage_rows{endpoint, metric, stage}      rows out of the last run
+  - pipeline_stage_bytes{endpoint, stage}             bytes out of the last run
+  - http_request_seconds{endpoint, status}            histogram
+  - cache_hits / cache_misses / cache_hit_ratio{cache} and the limiter
+    gauges, read from the caches' and limiters' own counters at scrape time
+
+Stages are timed with `with stage("db"): ...`. The endpoint label is the
+name of the route's endpoint function (set by MetricsMiddleware), or
+"background" outside a request; the metric label comes from the enclosing
+`with pipeline_metric(metric):` block, "-" when the work serves every
+metric (a period load is shared by both).
+
+A stage costs two perf_counter() calls and one histogram observation, so
+the instrumentation stays on in production. prometheus_client is optional;
+without it stages are still timed but nothing is recorded, and /metrics
+answers 501. Counters are per process.
+
+Inside collect_timings() (one per request, see ServerTimingMiddleware) the
+stages also add their durations to a RequestTimings, which renders them as
+a Server-Timing header.
+"""
+
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.utils.cache import all_caches
+from app.utils.limiter import all_limiters
+
+try:
+    import prometheus_client as prom
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+except ImportError:  # optional dependency
+    prom = None
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND = "background"
+ANY_METRIC = "-"
+
+_STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# ASGI scope of the current request (the router adds the endpoint to it)
+_scope: contextvars.ContextVar[Optional[Scope]] = contextvars.ContextVar("metrics_scope", default=None)
+_metric: contextvars.ContextVar[str] = contextvars.ContextVar("metrics_metric", default=ANY_METRIC)
+_timings: contextvars.ContextVar[Optional["RequestTimings"]] = contextvars.ContextVar("request_timings", default=None)
+
+
+if prom is not None:
+    STAGE_SECONDS = prom.Histogram(
+        "pipeline_stage_seconds", "Time spent in one pipeline stage",
+        ["endpoint", "metric", "stage"], buckets=_STAGE_BUCKETS,
+    )
+    STAGE_ROWS = prom.Gauge(
+        "pipeline_stage_rows", "Rows produced by the last run of a pipeline stage",
+        ["endpoint", "metric", "stage"],
+    )
+    STAGE_BYTES = prom.Gauge(
+        "pipeline_stage_bytes", "Bytes produced by the last run of a pipeline stage",
+        ["endpoint", "stage"],
+    )
+    REQUEST_SECONDS = prom.Histogram(
+        "http_request_seconds", "Time to answer a request",
+        ["endpoint", "status"], buckets=_STAGE_BUCKETS,
+    )
+
+    class _CacheCollector:
+        """Cache and limiter counters, read at scrape time."""
+
+        def collect(self):
+            hits = CounterMetricFamily("cache_hits", "Cache lookups answered from the cache", labels=["cache"])
+            misses = CounterMetricFamily("cache_misses", "Cache lookups that had to compute", labels=["cache"])
+            ratio = GaugeMetricFamily("cache_hit_ratio", "Hits / lookups since start", labels=["cache"])
+            size = GaugeMetricFamily("cache_entries", "Entries held in the cache", labels=["cache"])
+            for stats in all_caches():
+                name = stats["name"]
+                total_hits = stats["hits"] + stats["shared_hits"]
+                lookups = total_hits + stats["misses"]
+                hits.add_metric([name], total_hits)
+                misses.add_metric([name], stats["misses"])
+                ratio.add_metric([name], total_hits / lookups if lookups else 0.0)
+                size.add_metric([name], stats["size"])
+            yield from (hits, misses, ratio, size)
+
+            in_flight = GaugeMetricFamily("limiter_in_flight", "Calls holding a limiter slot", labels=["limiter"])
+            queued = GaugeMetricFamily("limiter_queued", "Calls waiting for a limiter slot", labels=["limiter"])
+            rejected = CounterMetricFamily("limiter_rejected", "Calls rejected by a limiter", labels=["limiter"])
+            for stats in all_limiters():
+                in_flight.add_metric([stats["name"]], stats["in_flight"])
+                queued.add_metric([stats["name"]], stats["queued"])
+                rejected.add_metric([stats["name"]], stats["rejected"])
+            yield from (in_flight, queued, rejected)
+
+    prom.REGISTRY.register(_CacheCollector())
+
+
+def endpoint_label_of(scope: Scope) -> str:
+    return getattr(scope.get("endpoint"), "__name__", "unmatched")
+
+
+def endpoint_label() -> str:
+    scope = _scope.get()
+    return BACKGROUND if scope is None else endpoint_label_of(scope)
+
+
+class RequestTimings:
+    """Stage durations of one request, summed per stage, in first-seen order."""
+
+    __slots__ = ("stages",)
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def header(self, total: Optional[float] = None) -> str:
+        """Server-Timing value, e.g. 'db;dur=12.1, diff;dur=3.4, total;dur=17.0'."""
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        if total is not None:
+            parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+@contextmanager
+def collect_timings() -> Iterator[RequestTimings]:
+    """Collect the stages run inside the block (including in threadpool calls it makes)."""
+    timings = RequestTimings()
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+@contextmanager
+def pipeline_metric(metric: str) -> Iterator[None]:
+    """Label the stages run inside the block with `metric`."""
+    token = _metric.set(metric)
+    try:
+        yield
+    finally:
+        _metric.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the block as pipeline stage `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        timings = _timings.get()
+        if timings is not None:
+            timings.add(name, elapsed)
+        if prom is not None:
+            STAGE_SECONDS.labels(endpoint_label(), _metric.get(), name).observe(elapsed)
+
+
+def record_rows(name: str, rows: int) -> None:
+    if prom is not None:
+        STAGE_ROWS.labels(endpoint_label(), _metric.get(), name).set(rows)
+
+
+def record_bytes(name: str, size: int) -> None:
+    if prom is not None:
+        STAGE_BYTES.labels(endpoint_label(), name).set(size)
+
+
+def metrics_available() -> bool:
+    return prom is not None
+
+
+def render_metrics() -> tuple:
+    """(body, content type) of the Prometheus text exposition."""
+    return prom.generate_latest(prom.REGISTRY), prom.CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """Make the request visible to stage() and time the whole request."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = _scope.set(scope)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _scope.reset(token)
+            if prom is not None:
+                REQUEST_SECONDS.labels(endpoint_label_of(scope), str(status)).observe(time.perf_counter() - start)
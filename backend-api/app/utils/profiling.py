@@ -0,0 +1,275 @@
+"""
+Request Profiling
+
+Opt-in profiling of single requests in a running service. When
+PROFILING_ENABLED is set, a request with the header `X-Profile: 1` (or the
+query parameter `profile=1`) and, if PROFILING_TOKEN is configured, a
+matching `X-Profile-Token` header is run with:
+
+  - a wall-clock sampling profiler: a background thread samples, every
+    PROFILE_INTERVAL_MS, the stacks of the threads currently inside the
+    request's endpoint function (sync endpoints run in the threadpool, so a
+    per-thread profiler like cProfile would miss them). Time spent waiting
+    on the database shows up as driver frames.
+  - tracemalloc, for the peak traced memory during the request and the
+    largest allocation sites still alive at its end.
+
+The profile is stored in PROFILE_DIR as collapsed stacks
+(`<frame>;<frame>;... <samples>`, for flamegraph.pl or speedscope) plus a
+JSON summary; the response carries its id in `X-Profile-Id`, and the
+/api/profiles endpoints return it (to clients with the same token).
+
+Both the sampler and tracemalloc see the whole process, so a concurrent
+request to the same endpoint adds to the profile; only one request is
+profiled at a time (others get `X-Profile: busy`).
+"""
+
+import hmac
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import PROFILING_TOKEN, PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_KEEP
+
+logger = logging.getLogger(__name__)
+
+_PROFILE_ID = re.compile(r"^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$")
+# Allocation sites listed in a profile summary
+TOP_ALLOCATIONS = 15
+
+
+def token_matches(token: str, provided: str) -> bool:
+    """True when no token is configured or `provided` equals it (constant-time)."""
+    return not token or hmac.compare_digest(provided.encode(), token.encode())
+
+
+def _frame_label(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_qualname}"
+
+
+class StackSampler(threading.Thread):
+    """Counts the stacks of threads running the request's endpoint function."""
+
+    def __init__(self, scope: Scope, interval: float):
+        super().__init__(name="request-profiler", daemon=True)
+        self.scope = scope
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.ticks = 0
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            # The router adds the endpoint to the scope once the path matched
+            target = getattr(self.scope.get("endpoint"), "__code__", None)
+            if target is None:
+                continue
+            self.ticks += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    if frame.f_code is target:
+                        self.samples[";".join(reversed(stack))] += 1
+                        break
+                    frame = frame.f_back
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class ProfileStore:
+    """Profiles on disk: <id>.collapsed.txt and <id>.json, newest `keep` kept."""
+
+    def __init__(self, directory: str = PROFILE_DIR, keep: int = PROFILE_KEEP):
+        self.directory = directory or os.path.join(tempfile.gettempdir(), "finance-dashboard-profiles")
+        self.keep = max(1, keep)
+
+    @staticmethod
+    def new_id() -> str:
+        return f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+    def _path(self, profile_id: str, suffix: str) -> Optional[str]:
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        return os.path.join(self.directory, profile_id + suffix)
+
+    def save(self, profile_id: str, collapsed: str, summary: Dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(profile_id, ".collapsed.txt"), "w", encoding="utf-8") as f:
+            f.write(collapsed)
+        with open(self._path(profile_id, ".json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        self._prune()
+
+    def _prune(self) -> None:
+        ids = self.list_ids()
+        for profile_id in ids[self.keep:]:
+            for suffix in (".json", ".collapsed.txt"):
+                try:
+                    os.remove(self._path(profile_id, suffix))
+                except OSError:
+                    pass
+
+    def list_ids(self) -> List[str]:
+        """Stored profile ids, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        ids = [name[:-5] for name in os.listdir(self.directory) if name.endswith(".json")]
+        return sorted((i for i in ids if _PROFILE_ID.match(i)), reverse=True)
+
+    def summary(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        path = self._path(profile_id, ".json")
+        if path is None or not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def collapsed_path(self, profile_id: str) -> Optional[str]:
+        path = self._path(profile_id, ".collapsed.txt")
+        return path if path is not None and os.path.exists(path) else None
+
+
+profile_store = ProfileStore()
+
+
+def _top_allocations(snapshot: tracemalloc.Snapshot) -> List[Dict[str, Any]]:
+    # Leave out tracemalloc's and the sampler's own allocations
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, threading.__file__),
+    ])
+    return [
+        {"site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", "bytes": stat.size, "count": stat.count}
+        for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+    ]
+
+
+class ProfilingMiddleware:
+    """Profile requests that ask for it (see module docstring)."""
+
+    def __init__(self, app: ASGIApp, token: str = PROFILING_TOKEN, store: ProfileStore = profile_store,
+                 interval_ms: float = PROFILE_INTERVAL_MS):
+        self.app = app
+        self.token = token
+        self.store = store
+        self.interval = max(interval_ms, 0.5) / 1000
+        self._busy = threading.Lock()
+
+    @staticmethod
+    def _requested(scope: Scope, headers: Headers) -> bool:
+        if headers.get("x-profile", "").lower() in ("1", "true"):
+            return True
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        return query.get("profile", [""])[0].lower() in ("1", "true")
+
+    def _authorized(self, headers: Headers) -> bool:
+        return token_matches(self.token, headers.get("x-profile-token", ""))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if not self._requested(scope, headers):
+            await self.app(scope, receive, send)
+            return
+
+        if not self._authorized(headers):
+            logger.warning("Profiling requested for %s without a valid token", scope["path"])
+            await self.app(scope, receive, self._with_header(send, "X-Profile", "denied"))
+        elif not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, self._with_header(send, "X-Profile", "busy"))
+        else:
+            try:
+                await self._profile(scope, receive, send)
+            finally:
+                self._busy.release()
+
+    @staticmethod
+    def _with_header(send: Send, name: str, value: str) -> Send:
+        async def send_with_header(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", []).append((name.lower().encode(), value.encode()))
+            await send(message)
+        return send_with_header
+
+    async def _profile(self, scope: Scope, receive: Receive, send: Send) -> None:
+        profile_id = self.store.new_id()
+        status = 500
+        inner_send = self._with_header(send, "X-Profile-Id", profile_id)
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await inner_send(message)
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+
+        sampler = StackSampler(scope, self.interval)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            sampler.stop()
+            duration = time.perf_counter() - start
+            current, peak = tracemalloc.get_traced_memory()
+            top = _top_allocations(tracemalloc.take_snapshot()) if started_tracing else []
+            if started_tracing:
+                tracemalloc.stop()
+            self._save(profile_id, scope, status, duration, sampler, peak - baseline, current - baseline, top)
+
+    def _save(self, profile_id: str, scope: Scope, status: int, duration: float, sampler: StackSampler,
+              peak: int, retained: int, top: List[Dict[str, Any]]) -> None:
+        endpoint = scope.get("endpoint")
+        summary = {
+            "id": profile_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "query": scope.get("query_string", b"").decode("latin-1"),
+            "endpoint": getattr(endpoint, "__qualname__", None),
+            "status": status,
+            "duration_ms": round(duration * 1000, 1),
+            "interval_ms": round(self.interval * 1000, 1),
+            "ticks": sampler.ticks,
+            "samples": sum(sampler.samples.values()),
+            "peak_alloc_bytes": peak,
+            "retained_alloc_bytes": retained,
+            "top_allocations": top,
+            "hottest_stacks": [
+                {"stack": stack, "samples": count} for stack, count in sampler.samples.most_common(10)
+            ],
+        }
+        try:
+            self.store.save(profile_id, sampler.collapsed(), summary)
+            logger.info("Profiled %s %s: %.1f ms, %d samples, peak %d bytes -> profile %s",
+                        scope["method"], scope["path"], duration * 1000, summary["samples"], peak, profile_id)
+        except OSError as e:
+            logger.error("Could not store profile %s: %s", profile_id, e)
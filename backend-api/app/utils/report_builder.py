@@ -1,13 +1,22 @@
 """
 Report Builder Utility
 
-Generates in-memory Excel (.xlsx) workbooks from project cost analysis data.
-Uses openpyxl as the engine via pd.ExcelWriter — no temp files written to disk.
+Generates Excel (.xlsx) workbooks from project cost analysis data.
+Sheets are written with openpyxl's write-only mode, one row at a time, into
+a spooled temporary file that is then streamed out in chunks, so memory
+stays flat regardless of how many projects are exported.
 """
 
 import io
+import tempfile
 import pandas as pd
-from typing import Any, Dict
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Optional
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+from app.utils.metrics import stage, record_bytes
 
 import logging
 
@@ -114,12 +123,33 @@ def children_df(proj: Dict[str, Any]) -> pd.DataFrame:
 # Main builder
 # ---------------------------------------------------------------------------
 
-def build_excel_cost_breakdown(
+# Workbooks up to this size stay in memory; larger ones spill to a temp file
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _write_sheet(wb: Workbook, title: str, df: pd.DataFrame) -> None:
+    """Append a DataFrame to a new write-only sheet (bold header, no index)."""
+    ws = wb.create_sheet(title=title[:31])
+    header = []
+    for col in df.columns:
+        cell = WriteOnlyCell(ws, value=str(col))
+        cell.font = Font(bold=True)
+        header.append(cell)
+    ws.append(header)
+    for row in df.itertuples(index=False, name=None):
+        ws.append(row)
+    logger.debug("Wrote sheet '%s' with %d rows", ws.title, len(df))
+
+
+def write_excel_cost_breakdown(
     projects_df: pd.DataFrame,
     projects: Dict[str, Any],
-) -> bytes:
+    fileobj: BinaryIO,
+    on_project: Optional[Callable[[int], None]] = None,
+) -> None:
     """
-    Build a multi-sheet Excel workbook in memory and return raw bytes.
+    Write the multi-sheet cost breakdown workbook to a binary file object.
 
     Sheet layout:
         Projects              — all-projects summary (sorted by |difference| desc)
@@ -128,33 +158,78 @@ def build_excel_cost_breakdown(
         {job_no}_children    — sub-subcategory breakdown per project
 
     Empty DataFrames produce no sheet. Sheet names truncated to 31 chars.
+    Per-project frames are built and written one at a time, so only one
+    project's rows are held in memory at once. `on_project`, if given, is
+    called with the number of projects written so far after each project.
     """
-    buf = io.BytesIO()
+    wb = Workbook(write_only=True)
+
+    # Summary sheet
+    if not projects_df.empty:
+        _write_sheet(wb, "Projects", projects_df)
+
+    # Per-project detail sheets
+    for n, (job_no, proj) in enumerate(projects.items(), 1):
+        for suffix, build in (
+            ("main_types", main_costtypes_df),
+            ("costlines", subcategories_df),
+            ("children", children_df),
+        ):
+            df = build(proj)
+            if not df.empty:
+                _write_sheet(wb, f"{job_no}_{suffix}", df)
+        if on_project is not None:
+            on_project(n)
+
+    if not wb.worksheets:
+        # openpyxl can't save a workbook without sheets
+        wb.create_sheet(title="Projects")
+    wb.save(fileobj)
+
+
+def iter_excel_cost_breakdown(
+    projects_df: pd.DataFrame,
+    projects: Dict[str, Any],
+    chunk_size: int = STREAM_CHUNK_SIZE,
+) -> Iterator[bytes]:
+    """
+    Build the workbook into a spooled temp file and return an iterator over
+    its bytes, for use with a StreamingResponse.
+
+    The workbook is written before this returns, so errors surface to the
+    caller rather than midway through the response.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    try:
+        with stage("serialize"):
+            write_excel_cost_breakdown(projects_df, projects, spool)
+        record_bytes("serialize", spool.tell())
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+
+    def chunks() -> Iterator[bytes]:
+        with spool:
+            while True:
+                chunk = spool.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    return chunks()
 
-    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
-        # Summary sheet
-        if not projects_df.empty:
-            projects_df.to_excel(writer, sheet_name="Projects", index=False)
-            logger.debug(f"Wrote Projects sheet with {len(projects_df)} rows")
-
-        # Per-project detail sheets
-        for job_no, proj in projects.items():
-            df_main = main_costtypes_df(proj)
-            if not df_main.empty:
-                sheet = f"{job_no}_main_types"[:31]
-                df_main.to_excel(writer, sheet_name=sheet, index=False)
-                logger.debug(f"Wrote sheet '{sheet}' with {len(df_main)} rows")
-
-            df_sub = subcategories_df(proj)
-            if not df_sub.empty:
-                sheet = f"{job_no}_costlines"[:31]
-                df_sub.to_excel(writer, sheet_name=sheet, index=False)
-                logger.debug(f"Wrote sheet '{sheet}' with {len(df_sub)} rows")
-
-            df_ch = children_df(proj)
-            if not df_ch.empty:
-                sheet = f"{job_no}_children"[:31]
-                df_ch.to_excel(writer, sheet_name=sheet, index=False)
-                logger.debug(f"Wrote sheet '{sheet}' with {len(df_ch)} rows")
 
+def build_excel_cost_breakdown(
+    projects_df: pd.DataFrame,
+    projects: Dict[str, Any],
+) -> bytes:
+    """
+    Build the cost breakdown workbook in memory and return raw bytes.
+
+    Prefer iter_excel_cost_breakdown for HTTP responses; see
+    write_excel_cost_breakdown for the sheet layout.
+    """
+    buf = io.BytesIO()
+    write_excel_cost_breakdown(projects_df, projects, buf)
     return buf.getvalue()
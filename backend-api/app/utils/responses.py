@@ -0,0 +1,72 @@
+"""
+Response Utilities
+
+FastJSONResponse: JSON responses rendered with orjson when it is installed
+(falls back to the standard json module). Endpoints that return large
+nested payloads return it directly, which also skips FastAPI's
+jsonable_encoder walk over every node.
+
+SelectiveGZipMiddleware: Starlette's GZipMiddleware, minus the response
+types that must not be compressed (server-sent events, which would be held
+back by the compressor's buffer, and already-compressed downloads).
+"""
+
+import logging
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.types import Message, Receive, Scope, Send
+
+from app.utils.metrics import stage, record_bytes
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Content types passed through uncompressed
+NO_GZIP_TYPES = {
+    "text/event-stream",
+    "application/zip",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when available."""
+
+    def render(self, content: Any) -> bytes:
+        with stage("serialize"):
+            if orjson is None:
+                body = super().render(content)
+            else:
+                body = orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        record_bytes("serialize", len(body))
+        return body
+
+
+class _SelectiveGZipResponder(GZipResponder):
+    async def send_with_gzip(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            await super().send_with_gzip(message)
+            if content_type.split(";")[0].strip().lower() in NO_GZIP_TYPES:
+                # Makes the base responder forward the body untouched
+                self.content_encoding_set = True
+            return
+        await super().send_with_gzip(message)
+
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that skips the content types in NO_GZIP_TYPES."""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("Accept-Encoding", ""):
+            responder = _SelectiveGZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
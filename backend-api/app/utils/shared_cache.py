@@ -0,0 +1,177 @@
+"""
+Shared Cache Backend
+
+A small key/value store in a local SQLite file, shared by every uvicorn
+worker process on the host. TTLCache instances created with shared=True
+fall back to it on a local miss and write through to it on a store, so one
+worker's database fetch serves all of them.
+
+Values are pickled. The file lives on the backend container and must only
+be writable by the service itself. With a `max_bytes` bound, the oldest
+entries are evicted once the stored values exceed it.
+"""
+
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# Expired rows are purged every this many writes
+_PRUNE_EVERY = 200
+
+
+class SQLiteCacheBackend:
+    """Namespaced, TTL-aware pickle store in one SQLite file (WAL mode)."""
+
+    def __init__(self, path: str, max_bytes: int = 0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " expires_at REAL,"
+                " value BLOB NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            # Files created before the size bound lack the eviction order column
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(cache)")}
+            if "stored_at" not in columns:
+                conn.execute("ALTER TABLE cache ADD COLUMN stored_at REAL NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_stored_at ON cache (stored_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                " name TEXT PRIMARY KEY,"
+                " owner TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+        logger.info("Shared cache backend at %s", path)
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _key(key: Hashable) -> str:
+        # Cache keys are tuples of str/int, whose repr is stable across processes
+        return repr(key)
+
+    def get(self, namespace: str, key: Hashable, default: Any = None) -> Any:
+        entry = self.get_entry(namespace, key)
+        return default if entry is None else entry[0]
+
+    def get_entry(self, namespace: str, key: Hashable) -> Optional[Tuple[Any, Optional[float]]]:
+        """(value, expires_at as a time.time() timestamp or None), or None on a miss."""
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?",
+            (namespace, self._key(key)),
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            return None
+        try:
+            return pickle.loads(value), expires_at
+        except Exception as e:
+            logger.warning("[shared_cache] Dropping unreadable entry %s/%r: %s", namespace, key, e)
+            self.delete(namespace, key)
+            return None
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl: float) -> None:
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        expires_at = now + ttl if ttl > 0 else None
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, expires_at, value, stored_at) VALUES (?, ?, ?, ?, ?)",
+            (namespace, self._key(key), expires_at, blob, now),
+        )
+        self._writes += 1
+        if self._writes % _PRUNE_EVERY == 0:
+            self.prune()
+        if self.max_bytes > 0:
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """
+        Delete the oldest entries until the stored values fit in max_bytes.
+        Entries without an expiry (small state rows) go last.
+        """
+        total = conn.execute("SELECT COALESCE(SUM(length(value)), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        self.prune()
+        total = conn.execute("SELECT COALESCE(SUM(length(value)), 0) FROM cache").fetchone()[0]
+        evicted = []
+        for namespace, key, size in conn.execute(
+            "SELECT namespace, key, length(value) FROM cache ORDER BY expires_at IS NULL, stored_at"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            evicted.append((namespace, key))
+            total -= size
+        conn.executemany("DELETE FROM cache WHERE namespace = ? AND key = ?", evicted)
+        logger.debug("[shared_cache] Evicted %d entries to stay under %d bytes", len(evicted), self.max_bytes)
+
+    def delete(self, namespace: str, key: Optional[Hashable] = None) -> None:
+        conn = self._connect()
+        if key is None:
+            conn.execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+        else:
+            conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, self._key(key)))
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """
+        Take or renew the lease `name` for `owner` for `ttl` seconds. Returns
+        False while another owner holds an unexpired lease.
+        """
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)"
+            " ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at"
+            " WHERE leases.owner = excluded.owner OR leases.expires_at < ?",
+            (name, owner, now + ttl, now),
+        )
+        row = conn.execute("SELECT owner FROM leases WHERE name = ?", (name,)).fetchone()
+        return row is not None and row[0] == owner
+
+    def release_lease(self, name: str, owner: str) -> None:
+        self._connect().execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def prune(self) -> None:
+        """Delete expired entries."""
+        self._connect().execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+
+
+_backend: Optional[SQLiteCacheBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_shared_backend() -> Optional[SQLiteCacheBackend]:
+    """The process-wide backend, or None when SHARED_CACHE_PATH is not set."""
+    global _backend
+    from app.config import SHARED_CACHE_PATH, SHARED_CACHE_MAX_MB
+
+    if not SHARED_CACHE_PATH:
+        return None
+    with _backend_lock:
+        if _backend is None:
+            _backend = SQLiteCacheBackend(SHARED_CACHE_PATH, max_bytes=int(SHARED_CACHE_MAX_MB * 2**20))
+        return _backend
@@ -0,0 +1,131 @@
+"""
+Tabular Response Formats
+
+Content negotiation for endpoints whose result is a table. JSON (a list of
+records) stays the default; clients that send
+`Accept: application/vnd.apache.arrow.stream` or
+`Accept: application/vnd.apache.parquet` (or pass `?format=arrow|parquet`)
+get the DataFrame serialized column-wise by pyarrow, which loads without
+per-row Python objects (pyarrow.ipc.open_stream / pandas.read_parquet).
+
+pyarrow is optional; without it the columnar formats answer 406.
+"""
+
+import io
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from fastapi import HTTPException, Request
+from starlette.responses import Response
+
+from app.utils.metrics import stage, record_bytes
+from app.utils.responses import FastJSONResponse
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # optional dependency
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+JSON, ARROW, PARQUET = "json", "arrow", "parquet"
+
+MEDIA_TYPES = {
+    JSON: "application/json",
+    ARROW: "application/vnd.apache.arrow.stream",
+    PARQUET: "application/vnd.apache.parquet",
+}
+_FORMAT_BY_MEDIA_TYPE = {
+    **{media_type: fmt for fmt, media_type in MEDIA_TYPES.items()},
+    "application/x-parquet": PARQUET,
+    "*/*": JSON,
+    "application/*": JSON,
+}
+
+
+def _parse_accept(accept: str) -> List[Tuple[str, float]]:
+    """Media types of an Accept header, highest q first (ties keep header order)."""
+    items = []
+    for part in accept.split(","):
+        fields = [f.strip() for f in part.split(";")]
+        if not fields[0]:
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        items.append((fields[0].lower(), q))
+    return sorted(items, key=lambda item: -item[1])
+
+
+# Every response whose format was negotiated must be cached per Accept header
+VARY = "Accept"
+
+
+def negotiate_table_format(request: Request, requested: Optional[str] = None) -> str:
+    """
+    Pick the response format for a tabular endpoint.
+
+    An explicit `requested` format (the `format` query parameter) wins over
+    the Accept header.
+
+    Raises:
+        HTTPException 406: Only columnar formats are acceptable and pyarrow
+                           is not installed, or nothing acceptable is offered.
+    """
+    if requested:
+        candidates = [requested.lower()]
+    else:
+        accept = request.headers.get("accept", "")
+        if not accept:
+            return JSON
+        candidates = [_FORMAT_BY_MEDIA_TYPE.get(media_type) for media_type, q in _parse_accept(accept) if q > 0]
+
+    for fmt in candidates:
+        if fmt == JSON:
+            return JSON
+        if fmt in (ARROW, PARQUET) and pa is not None:
+            return fmt
+
+    wanted = [f for f in candidates if f in (ARROW, PARQUET)]
+    if wanted and pa is None:
+        raise HTTPException(status_code=406, detail="Columnar formats require pyarrow, which is not installed")
+    raise HTTPException(status_code=406, detail=f"Supported formats: {', '.join(MEDIA_TYPES.values())}")
+
+
+def _arrow_table(df: pd.DataFrame) -> "pa.Table":
+    # Text columns come out of SQL/pandas as object dtype and may mix str and
+    # int (e.g. project numbers); Arrow needs one type per column
+    out = df.copy(deep=False)
+    for col in out.columns:
+        if out[col].dtype == object:
+            out[col] = out[col].map(lambda v: v if v is None or isinstance(v, str) or pd.isna(v) else str(v))
+    return pa.Table.from_pandas(out, preserve_index=False)
+
+
+def table_response(df: pd.DataFrame, fmt: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Serialize a DataFrame in the negotiated format."""
+    headers = {**(headers or {}), "Vary": VARY}
+    if fmt == JSON:
+        return FastJSONResponse(df.to_dict(orient="records"), headers=headers)
+
+    with stage("serialize"):
+        table = _arrow_table(df)
+        if fmt == ARROW:
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            body = sink.getvalue().to_pybytes()
+        else:
+            buf = io.BytesIO()
+            pa.parquet.write_table(table, buf)
+            body = buf.getvalue()
+    record_bytes("serialize", len(body))
+    logger.debug("  Serialized %d rows as %s (%d bytes)", len(df), fmt, len(body))
+    return Response(content=body, media_type=MEDIA_TYPES[fmt], headers=headers)
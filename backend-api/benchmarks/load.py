@@ -0,0 +1,245 @@
+"""
+Load Test
+
+Drives a running API with concurrent requests and reports latency
+percentiles (p50/p95/p99) and throughput per endpoint. Point it at a server
+backed by the local database (see benchmarks.local_db) to load-test without
+SQL Server:
+
+  LOCAL_DB_PATH=/tmp/cost-lines.sqlite uvicorn app.main:app --port 8000 --workers 2
+  python -m benchmarks.load --concurrency 16 --duration 30
+  python -m benchmarks.load --endpoints forecast-comparison=3,xlsx=1 --requests 500
+
+Endpoints (`name` or `name=weight` in --endpoints, default equal weights):
+
+  forecast-comparison  POST /api/analysis/forecast-comparison
+  overall-summary      POST /api/analysis/overall-summary
+  xlsx                 POST /api/download/xlsx
+  projects             GET  /api/projects/periods and /api/projects/list
+
+Every request picks a random project (of /api/projects/list, or --projects)
+and compares the first and last available period unless --from/--to are
+given. The server's caches stay on, so after the warm-up most comparisons
+are cache hits; restart the server between runs for comparable numbers.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+METRIC = "forecast_costs_at_completion"
+
+
+class Scenario:
+    """Builds the requests of the load test from the server's periods and projects."""
+
+    def __init__(self, from_period: str, to_period: str, projects: List[int], seed: int = 0):
+        self.from_period = from_period
+        self.to_period = to_period
+        self.projects = projects
+        self.rng = random.Random(seed)
+
+    def _comparison(self) -> Dict[str, Any]:
+        return {
+            "from_period": self.from_period,
+            "to_period": self.to_period,
+            "project_no": self.rng.choice(self.projects),
+            "metric": METRIC,
+        }
+
+    def request(self, endpoint: str) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+        """(method, path, JSON body) of one request to `endpoint`."""
+        if endpoint == "forecast-comparison":
+            return "POST", "/api/analysis/forecast-comparison", self._comparison()
+        if endpoint == "overall-summary":
+            return "POST", "/api/analysis/overall-summary", {
+                "period_from": self.from_period, "period_to": self.to_period, "metric": METRIC,
+            }
+        if endpoint == "xlsx":
+            return "POST", "/api/download/xlsx", self._comparison()
+        if endpoint == "projects":
+            return "GET", self.rng.choice(["/api/projects/periods", "/api/projects/list"]), None
+        raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+ENDPOINTS = ["forecast-comparison", "overall-summary", "xlsx", "projects"]
+
+
+def parse_endpoints(value: str) -> Dict[str, float]:
+    """'forecast-comparison=3,xlsx' -> {'forecast-comparison': 3.0, 'xlsx': 1.0}"""
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.strip().partition("=")
+        if not name:
+            continue
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r}; choose from {', '.join(ENDPOINTS)}")
+        weights[name] = float(weight) if weight else 1.0
+    return weights
+
+
+class Recorder:
+    """Latencies and status codes per endpoint."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+
+    def add(self, endpoint: str, seconds: float, status: str) -> None:
+        self.latencies[endpoint].append(seconds)
+        self.statuses[endpoint][status] += 1
+
+    @staticmethod
+    def _stats(latencies: List[float], statuses: Counter, elapsed: float) -> Dict[str, Any]:
+        ms = np.array(latencies) * 1000
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (0.0, 0.0, 0.0)
+        return {
+            "requests": len(latencies),
+            "errors": sum(n for status, n in statuses.items() if not status.startswith(("2", "3"))),
+            "statuses": dict(statuses),
+            "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": float(ms.max()) if len(ms) else 0.0,
+        }
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        out = {name: self._stats(self.latencies[name], self.statuses[name], elapsed) for name in sorted(self.latencies)}
+        everything = [t for ts in self.latencies.values() for t in ts]
+        statuses = sum(self.statuses.values(), Counter())
+        out["all"] = self._stats(everything, statuses, elapsed)
+        return out
+
+
+async def _send(client: httpx.AsyncClient, scenario: Scenario, endpoint: str) -> Tuple[float, str]:
+    method, path, body = scenario.request(endpoint)
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, path, json=body)
+        # Read streamed bodies (xlsx) completely, like a browser would
+        await response.aread()
+        status = str(response.status_code)
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    return time.perf_counter() - start, status
+
+
+async def run_load(url: str, weights: Dict[str, float], concurrency: int, duration: Optional[float],
+                   total_requests: Optional[int], warmup: int, scenario_args: Dict[str, Any],
+                   timeout: float) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        scenario = await _discover(client, **scenario_args)
+        print(f"Comparing {scenario.from_period} -> {scenario.to_period} over {len(scenario.projects)} project(s)")
+
+        for endpoint in weights:
+            for _ in range(warmup):
+                _, status = await _send(client, scenario, endpoint)
+                if not status.startswith("2"):
+                    print(f"  warm-up {endpoint}: {status}", file=sys.stderr)
+
+        names, probs = list(weights), list(weights.values())
+        recorder = Recorder()
+        remaining = total_requests
+        deadline = time.perf_counter() + duration if duration else None
+
+        async def worker() -> None:
+            nonlocal remaining
+            while True:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+                if remaining is not None:
+                    if remaining <= 0:
+                        return
+                    remaining -= 1
+                endpoint = scenario.rng.choices(names, probs)[0]
+                seconds, status = await _send(client, scenario, endpoint)
+                recorder.add(endpoint, seconds, status)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {"elapsed_seconds": elapsed, "concurrency": concurrency, "endpoints": recorder.report(elapsed)}
+
+
+async def _discover(client: httpx.AsyncClient, from_period: Optional[str], to_period: Optional[str],
+                    projects: Optional[List[int]], seed: int) -> Scenario:
+    """Fill in the periods and projects the caller didn't give from the server."""
+    if not (from_period and to_period):
+        response = await client.get("/api/projects/periods")
+        response.raise_for_status()
+        periods = response.json()["periods"]
+        if len(periods) < 2:
+            raise SystemExit(f"The server has {len(periods)} period(s); need two to compare")
+        from_period = from_period or periods[0]
+        to_period = to_period or periods[-1]
+    if not projects:
+        response = await client.get("/api/projects/list")
+        response.raise_for_status()
+        projects = response.json()["projects"]
+    return Scenario(from_period, to_period, projects, seed=seed)
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    print(f"\n{result['elapsed_seconds']:.1f}s at concurrency {result['concurrency']}\n")
+    print(f"{'endpoint':<22}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, s in result["endpoints"].items():
+        print(f"{name:<22}{s['requests']:>9}{s['errors']:>8}{s['throughput_rps']:>9.1f}"
+              f"{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}")
+    failed = {status: n for status, n in result["endpoints"]["all"]["statuses"].items()
+              if not status.startswith(("2", "3"))}
+    if failed:
+        print(f"\nFailed responses: {failed}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="base URL of the API")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="endpoints (and weights) to drive")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight (default 8)")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run (default 30)")
+    parser.add_argument("--requests", type=int, help="stop after this many requests instead of --duration")
+    parser.add_argument("--warmup", type=int, default=1, help="sequential requests per endpoint first (default 1)")
+    parser.add_argument("--from", dest="from_period", help="first period (default: the oldest available)")
+    parser.add_argument("--to", dest="to_period", help="second period (default: the newest available)")
+    parser.add_argument("--projects", help="comma-separated project numbers (default: all available)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    try:
+        weights = parse_endpoints(args.endpoints)
+    except ValueError as e:
+        parser.error(str(e))
+    projects = [int(p) for p in args.projects.split(",")] if args.projects else None
+
+    try:
+        result = asyncio.run(run_load(
+            args.url, weights, max(1, args.concurrency),
+            None if args.requests else args.duration, args.requests, args.warmup,
+            {"from_period": args.from_period, "to_period": args.to_period, "projects": projects, "seed": args.seed},
+            args.timeout,
+        ))
+    except httpx.HTTPError as e:
+        print(f"Could not reach the API at {args.url}: {e}", file=sys.stderr)
+        return 2
+    print_report(result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
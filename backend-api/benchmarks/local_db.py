@@ -0,0 +1,75 @@
+"""
+Local Database
+
+Builds the SQLite stand-in for SQL Server (see LOCAL_DB_PATH): one
+cost_lines table with the base_sql result schema, filled with synthetic
+periods (see benchmarks.synthetic). Each period drifts from the previous
+one, so any two periods can be compared.
+
+Usage (from backend-api/):
+
+  python -m benchmarks.local_db --path /tmp/cost-lines.sqlite --rows 100k --periods 202301-202312
+  LOCAL_DB_PATH=/tmp/cost-lines.sqlite uvicorn app.main:app --port 8000
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from typing import List, Optional
+
+from app.services.sql_queries import LOCAL_TABLE
+from app.utils.helpers import shift_period
+from benchmarks.run import parse_rows
+from benchmarks.synthetic import iter_periods
+
+
+def parse_periods(value: str) -> List[str]:
+    """'202301-202303' -> ['202301', '202302', '202303']; also accepts a comma-separated list."""
+    if "-" in value:
+        first, last = (p.strip() for p in value.split("-", 1))
+        periods = [first]
+        while periods[-1] < last:
+            periods.append(shift_period(periods[-1], 1))
+        return periods
+    return [p.strip() for p in value.split(",") if p.strip()]
+
+
+def build_local_db(path: str, n_rows: int, periods: List[str], seed: int = 0) -> None:
+    """(Re)create `path` with `n_rows` synthetic rows per period."""
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        for df in iter_periods(n_rows, periods, seed=seed):
+            start = time.perf_counter()
+            df.to_sql(LOCAL_TABLE, conn, if_exists="append", index=False, chunksize=50_000)
+            print(f"  {df['cPeriod'].iat[0]}: {len(df)} rows in {time.perf_counter() - start:.1f}s")
+        conn.execute(f"CREATE INDEX ix_{LOCAL_TABLE}_period ON {LOCAL_TABLE} (cPeriod)")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default="cost-lines.sqlite", help="SQLite file to (re)create")
+    parser.add_argument("--rows", default="100k", help="rows per period, e.g. 10k, 1m (default 100k)")
+    parser.add_argument("--periods", default="202301-202312",
+                        help="YYYYMM-YYYYMM range or comma-separated list (default 202301-202312)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    periods = parse_periods(args.periods)
+    n_rows = parse_rows(args.rows)[0]
+    print(f"Writing {len(periods)} period(s) of {n_rows} rows to {args.path}")
+    build_local_db(args.path, n_rows, periods, seed=args.seed)
+    print(f"Done ({os.path.getsize(args.path) / 2**20:.0f} MiB). Start the API with LOCAL_DB_PATH={os.path.abspath(args.path)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
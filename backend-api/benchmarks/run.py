@@ -0,0 +1,273 @@
+"""
+Data Processor Benchmarks
+
+Times the pandas stages of the comparison pipeline on synthetic periods
+(see benchmarks.synthetic) and measures their peak traced memory:
+
+  combine_projects_rows            raw period -> combined project groups
+  table_to_nested_json             combined period -> nested JSON of one project
+  compute_forecast_diff            two nested JSON files -> comparison (legacy path)
+  preprocess_df_collapse_projects  combined period -> one row per project group
+  normalize_period_costlines       combined period -> cost lines (current path)
+  compute_coded_forecast_diff      two encoded periods -> portfolio comparison
+  build_excel_cost_breakdown       one project's comparison -> .xlsx bytes
+
+Each benchmark runs on inputs prepared beforehand (the preparation isn't
+timed). The time is the best of --repeat runs; the peak memory comes from
+one extra run under tracemalloc (which slows it down, so it isn't timed).
+
+Usage (from backend-api/):
+
+  python -m benchmarks.run                          # 10k, 100k, 1M rows
+  python -m benchmarks.run --rows 10k,10m --only combine_projects_rows
+  python -m benchmarks.run --save-baseline          # write benchmarks/baseline.json
+  python -m benchmarks.run --compare                # exit 1 on a regression
+
+Baselines are machine-specific: save one before a change and compare
+against it on the same machine.
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.config import projects_list, metric_map
+from app.services.data_processor import (
+    combine_projects_rows,
+    compute_coded_forecast_diff,
+    compute_forecast_diff,
+    encode_normalized_costlines,
+    normalize_period_costlines,
+    preprocess_df_collapse_projects,
+    table_to_nested_json,
+)
+from app.utils.dimensions import DimensionDictionary
+from app.utils.report_builder import build_excel_cost_breakdown, projects_to_dataframe
+from benchmarks.synthetic import generate_period_pair
+
+DEFAULT_ROWS = "10k,100k,1m"
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+PERIODS = ("202305", "202312")
+METRIC = "forecast_costs_at_completion"
+# Differences below this many seconds are never reported as regressions
+TIME_NOISE_FLOOR = 0.002
+
+
+def parse_rows(value: str) -> List[int]:
+    """'10k,1m' -> [10000, 1000000]"""
+    sizes = []
+    for part in value.split(","):
+        part = part.strip().lower()
+        if not part:
+            continue
+        scale = {"k": 1_000, "m": 1_000_000}.get(part[-1], 1)
+        sizes.append(int(float(part.rstrip("km")) * scale))
+    return sizes
+
+
+def rows_label(n: int) -> str:
+    if n >= 1_000_000 and n % 1_000_000 == 0:
+        return f"{n // 1_000_000}m"
+    if n >= 1_000 and n % 1_000 == 0:
+        return f"{n // 1_000}k"
+    return str(n)
+
+
+class Inputs:
+    """
+    Inputs of every benchmark for one data size, built once. The project
+    benchmarks use the configured project with the most rows.
+    """
+
+    def __init__(self, n_rows: int, workdir: str):
+        self.n_rows = n_rows
+        self.sum_cols = list(metric_map.values())
+        self.metric_col = metric_map[METRIC]
+        self.raw1, self.raw2 = generate_period_pair(n_rows, PERIODS)
+
+        configured = {int(p) for p in projects_list}
+        counts = self.raw1.loc[self.raw1["iProjNo"].isin(configured), "iProjNo"].value_counts()
+        self.projno = str(counts.index[0])
+
+        self.combined1 = combine_projects_rows(self.raw1, projects_list, sum_cols=self.sum_cols)
+        self.combined2 = combine_projects_rows(self.raw2, projects_list, sum_cols=self.sum_cols)
+
+        self.json_paths = []
+        for i, combined in enumerate((self.combined1, self.combined2), 1):
+            path = os.path.join(workdir, f"{rows_label(n_rows)}_{i}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(table_to_nested_json(combined, self.projno), f)
+            self.json_paths.append(path)
+
+        self.dims = DimensionDictionary()
+        self.lines1, meta1 = normalize_period_costlines(self.combined1)
+        self.lines2, meta2 = normalize_period_costlines(self.combined2)
+        self.coded1, self.meta1 = encode_normalized_costlines(self.lines1, meta1, self.dims)
+        self.coded2, self.meta2 = encode_normalized_costlines(self.lines2, meta2, self.dims)
+
+        project = self.coded_diff(self.projno)["projects"]
+        self.project = project
+        self.project_frame = projects_to_dataframe(project, METRIC)
+
+    def coded_diff(self, projno) -> Dict[str, Any]:
+        return compute_coded_forecast_diff(
+            self.coded1, self.coded2, self.meta1, self.meta2, PERIODS[0], PERIODS[1],
+            projno, self.metric_col, METRIC, self.dims,
+        )
+
+
+BENCHMARKS: Dict[str, Callable[[Inputs], Any]] = {
+    "combine_projects_rows": lambda i: combine_projects_rows(i.raw1, projects_list, sum_cols=i.sum_cols),
+    "table_to_nested_json": lambda i: table_to_nested_json(i.combined1, i.projno),
+    "compute_forecast_diff": lambda i: compute_forecast_diff(i.json_paths, METRIC),
+    "preprocess_df_collapse_projects": lambda i: preprocess_df_collapse_projects(i.combined2, i.metric_col),
+    "normalize_period_costlines": lambda i: normalize_period_costlines(i.combined1),
+    "compute_coded_forecast_diff": lambda i: i.coded_diff(None),
+    "build_excel_cost_breakdown": lambda i: build_excel_cost_breakdown(i.project_frame, i.project),
+}
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "seconds": min(times),
+        "median_seconds": statistics.median(times),
+        "peak_bytes": peak,
+    }
+
+
+def run(sizes: List[int], names: List[str], repeat: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory(prefix="dp-bench-") as workdir:
+        for n_rows in sizes:
+            start = time.perf_counter()
+            inputs = Inputs(n_rows, workdir)
+            print(f"\n{rows_label(n_rows)} rows (inputs ready in {time.perf_counter() - start:.1f}s, "
+                  f"{len(inputs.combined1)} combined rows, project {inputs.projno})")
+            for name in names:
+                result = measure(lambda: BENCHMARKS[name](inputs), repeat)
+                results[f"{name}[{rows_label(n_rows)}]"] = result
+                print(f"  {name:<34}{result['seconds'] * 1000:>11.1f} ms{result['peak_bytes'] / 2**20:>11.1f} MiB")
+            del inputs
+            gc.collect()
+    return results
+
+
+def environment() -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": f"{platform.system()} {platform.machine()} ({os.cpu_count()} cpus)",
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float, memory_threshold: float) -> List[str]:
+    """Print current vs. baseline for the benchmarks in both; return the regressions."""
+    regressions = []
+    print(f"\n{'benchmark':<48}{'time':>10}{'memory':>10}")
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if base is None:
+            print(f"{key:<48}{'(new)':>10}")
+            continue
+        t_ratio = cur["seconds"] / base["seconds"] if base["seconds"] else 1.0
+        m_ratio = cur["peak_bytes"] / base["peak_bytes"] if base["peak_bytes"] else 1.0
+        slower = t_ratio > 1 + threshold and cur["seconds"] - base["seconds"] > TIME_NOISE_FLOOR
+        bigger = m_ratio > 1 + memory_threshold
+        flag = "  REGRESSION" if slower or bigger else ""
+        print(f"{key:<48}{t_ratio:>9.2f}x{m_ratio:>9.2f}x{flag}")
+        if slower:
+            regressions.append(f"{key}: {base['seconds'] * 1000:.1f} ms -> {cur['seconds'] * 1000:.1f} ms")
+        if bigger:
+            regressions.append(f"{key}: peak {base['peak_bytes'] / 2**20:.1f} MiB -> {cur['peak_bytes'] / 2**20:.1f} MiB")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default=DEFAULT_ROWS, help=f"comma-separated sizes, e.g. 10k,10m (default {DEFAULT_ROWS})")
+    parser.add_argument("--only", default="", help="comma-separated benchmark names (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark (default 3)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file (default benchmarks/baseline.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="compare with the baseline, exit 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown (default 0.15 = 15%%)")
+    parser.add_argument("--memory-threshold", type=float, default=0.10, help="allowed peak memory growth (default 0.10)")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.only.split(",") if n.strip()] or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}; choose from {', '.join(BENCHMARKS)}")
+
+    if args.compare and not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline first", file=sys.stderr)
+        return 2
+
+    # Keep the pipeline's INFO logs out of the report
+    logging.basicConfig(level=logging.WARNING)
+
+    results = run(parse_rows(args.rows), names, max(1, args.repeat))
+    report = {"environment": environment(), "results": results}
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    status = 0
+    if args.compare:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nBaseline from {baseline['environment'].get('created')} on {baseline['environment'].get('machine')}")
+        regressions = compare(results, baseline["results"], args.threshold, args.memory_threshold)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            status = 1
+        else:
+            print("\nNo regressions.")
+
+    if args.save_baseline:
+        # Merge, so sizes or benchmarks not run this time keep their baseline
+        merged = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                merged = json.load(f).get("results", {})
+        merged.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"environment": report["environment"], "results": merged}, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
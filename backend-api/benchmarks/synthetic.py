@@ -0,0 +1,192 @@
+"""
+Synthetic Period Data
+
+Generates DataFrames with the column schema and dtypes of base_sql (what
+query_batch_to_df returns), at any size, with cardinalities close to the
+production data:
+
+  - ~150 projects, including every project of config.projects_list so the
+    project groupings are exercised; row counts per project are skewed
+    (a few large projects hold most of the lines)
+  - 12 segments, a third of them variation segments (code ending in "2",
+    "... Variation" major description); each project books on 3 of them
+  - 40 packages (92/93 excluded like in base_sql), each with a fixed TYP
+    label, two of them revenue packages; each project uses 16 of them
+  - 8 sub-categories (cSubDesc2) per package and 10 children (cSubDesc3)
+    per sub-category, with some empty / missing values
+  - ~70% forecast lines (cType "F")
+
+generate_period_pair() returns two periods of the same projects with a
+realistic month-over-month drift, as a comparison needs.
+"""
+
+from typing import Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.config import projects_list
+from app.services.sql_queries import BASE_SQL_COLUMNS
+
+N_PROJECTS = 150
+N_SEGMENTS = 12
+N_PACKAGES = 40
+SEGMENTS_PER_PROJECT = 3
+PACKAGES_PER_PROJECT = 16
+SUBCATEGORIES_PER_PACKAGE = 8
+CHILDREN_PER_SUBCATEGORY = 10
+N_ELEMENTS = 3000
+N_CLIENTS = 40
+N_MANAGERS = 25
+
+_CURRENCIES = [(1, "AED", 1.0, "UAE Dirham"), (2, "USD", 3.6725, "US Dollar"), (3, "EUR", 4.0, "Euro")]
+_TYP_NAMES = ["Direct Labour", "Materials", "Subcontract", "Plant", "Indirect", "Staff", "Site Overheads",
+              "Marine Equipment", "Design", "Insurance", "Preliminaries", "Temporary Works"]
+
+
+def _strings(values) -> np.ndarray:
+    return np.array(values, dtype=object)
+
+
+def _project_numbers(rng: np.random.Generator) -> np.ndarray:
+    configured = sorted({int(p) for members in projects_list.values()
+                         for p in (members if isinstance(members, (list, tuple)) else [members])})
+    extra = rng.choice(np.setdiff1d(np.arange(3000, 9000), configured), N_PROJECTS - len(configured), replace=False)
+    return np.concatenate([np.array(configured), np.sort(extra)])
+
+
+def generate_period(n_rows: int, period: str, seed: int = 0) -> pd.DataFrame:
+    """One period of base_sql rows (`seed` fixes the projects and the cost lines)."""
+    rng = np.random.default_rng(seed)
+
+    # Dimension tables (identical for every period generated with the same seed)
+    proj_no = _project_numbers(rng)
+    n_proj = len(proj_no)
+    proj_weight = rng.pareto(1.2, n_proj) + 0.05
+    proj_weight /= proj_weight.sum()
+    proj_year = rng.integers(2015, 2026, n_proj)
+    proj_desc = _strings([f"Project {p} - {rng.choice(['Port', 'Quay Wall', 'Breakwater', 'Dredging', 'Marina', 'Causeway'])}"
+                          for p in proj_no])
+    proj_client = rng.integers(0, N_CLIENTS, n_proj)
+    proj_mgr = _strings([f"PM{m:03d}" for m in rng.integers(0, N_MANAGERS, n_proj)])
+    proj_curr = rng.integers(0, len(_CURRENCIES), n_proj)
+    proj_first = _strings([f"{y}{m:02d}" for y, m in zip(proj_year, rng.integers(1, 13, n_proj))])
+    client_code = _strings([f"C{c:04d}" for c in range(N_CLIENTS)])
+    client_desc = _strings([f"Client {c} LLC" for c in range(N_CLIENTS)])
+
+    seg_base = 5001 + 10 * np.arange(N_SEGMENTS // 3 * 2)
+    segments = []
+    for i, code in enumerate(seg_base[: N_SEGMENTS // 3 * 2]):
+        segments.append((str(code), f"Division {i}"))
+        if i % 2 == 0:
+            segments.append((str(code + 1), f"Division {i} Variation"))
+    segments = segments[:N_SEGMENTS]
+    seg_code = _strings([s for s, _ in segments])
+    seg_desc = _strings([d for _, d in segments])
+
+    pkg_code = _strings([f"{i:02d}" for i in range(1, 92) if i not in (92, 93)][:N_PACKAGES - 2] + ["90", "91"])
+    pkg_typ = _strings([f"{c} - {_TYP_NAMES[i % len(_TYP_NAMES)]}" for i, c in enumerate(pkg_code[:-2])]
+                       + ["90 - Revenue", "91 - Revenue Variations"])
+    pkg_annex = _strings([f"A{i % 6}" for i in range(N_PACKAGES)])
+
+    n_sub = N_PACKAGES * SUBCATEGORIES_PER_PACKAGE
+    sub2 = _strings([f"Cost Line {i // SUBCATEGORIES_PER_PACKAGE}.{i % SUBCATEGORIES_PER_PACKAGE}" for i in range(n_sub)])
+    sub2[rng.random(n_sub) < 0.03] = ""
+    n_child = n_sub * CHILDREN_PER_SUBCATEGORY
+    sub3 = _strings([f"Item {i}" for i in range(n_child)])
+    blank = rng.random(n_child)
+    sub3[blank < 0.05] = ""
+    sub3[(blank >= 0.05) & (blank < 0.10)] = None
+
+    proj_segs = np.stack([rng.choice(len(seg_code), SEGMENTS_PER_PROJECT, replace=False) for _ in range(n_proj)])
+    proj_pkgs = np.stack([rng.choice(N_PACKAGES, PACKAGES_PER_PROJECT, replace=False) for _ in range(n_proj)])
+
+    # Rows
+    p = rng.choice(n_proj, n_rows, p=proj_weight)
+    seg = proj_segs[p, rng.integers(0, SEGMENTS_PER_PROJECT, n_rows)]
+    pkg = proj_pkgs[p, rng.integers(0, PACKAGES_PER_PROJECT, n_rows)]
+    sub = pkg * SUBCATEGORIES_PER_PACKAGE + rng.integers(0, SUBCATEGORIES_PER_PACKAGE, n_rows)
+    child = sub * CHILDREN_PER_SUBCATEGORY + rng.integers(0, CHILDREN_PER_SUBCATEGORY, n_rows)
+    curr = proj_curr[p]
+
+    forecast = np.round(rng.lognormal(8.0, 1.6, n_rows), 2)
+    ytd = np.round(forecast * rng.uniform(0.0, 0.6, n_rows), 2)
+    budget = np.round(forecast * rng.uniform(0.8, 1.2, n_rows), 2)
+
+    df = pd.DataFrame({
+        "cBook": "AUH",
+        "iProjYear": proj_year[p],
+        "iProjNo": proj_no[p],
+        "cSegment": seg_code[seg],
+        "cPackage": pkg_code[pkg],
+        "cPeriod": str(period),
+        "cElementCode": _strings([f"E{e:05d}" for e in range(N_ELEMENTS)])[rng.integers(0, N_ELEMENTS, n_rows)],
+        "TYP": pkg_typ[pkg],
+        "cType": np.where(rng.random(n_rows) < 0.7, "F", "B").astype(object),
+        "iWidth": rng.integers(1, 5, n_rows),
+        "rMthBud": np.round(budget / 24, 2),
+        "rMthAct": np.round(ytd / 12, 2),
+        "rYearBud": np.round(budget / 2, 2),
+        "rYearBTD": np.round(budget / 3, 2),
+        "rYearAct": ytd,
+        "rYearFrc": np.round(forecast / 2, 2),
+        "rPTDBud": np.round(budget * 0.6, 2),
+        "rPTDAct": np.round(ytd * 1.5, 2),
+        "rOrgBud": budget,
+        "rRevBud": np.round(budget * 1.02, 2),
+        "rForecast": forecast,
+        "rRateBud": np.round(rng.uniform(10, 500, n_rows), 2),
+        "rRateFrc": np.round(rng.uniform(10, 500, n_rows), 2),
+        "rVariance": np.round(budget - forecast, 2),
+        "rVarianceChange": np.round(rng.normal(0, 100, n_rows), 2),
+        "rForecastChange": np.round(rng.normal(0, 250, n_rows), 0),
+        "rPercCompl": np.round(rng.uniform(0, 100, n_rows), 1),
+        "cSubDesc2": sub2[sub],
+        "cSubDesc3": sub3[child],
+        "lCommitted": rng.random(n_rows) < 0.4,
+        "iCurrCode": np.array([c[0] for c in _CURRENCIES])[curr],
+        "cClient": client_code[proj_client[p]],
+        "cProjDesc": proj_desc[p],
+        "cProjMgr": proj_mgr[p],
+        "cClientDesc": client_desc[proj_client[p]],
+        "cFirstFrcPeriod": proj_first[p],
+        "cCurrAbrv": _strings([c[1] for c in _CURRENCIES])[curr],
+        "rCurrRate": np.array([c[2] for c in _CURRENCIES])[curr],
+        "cCurrDesc": _strings([c[3] for c in _CURRENCIES])[curr],
+        "cMajorDesc": seg_desc[seg],
+        "cAnnex": pkg_annex[pkg],
+        "cMainDesc": _strings([f"Main {d}" for d in seg_desc])[seg],
+        "cBookDesc": "Abu Dhabi",
+    })
+    return df[BASE_SQL_COLUMNS]
+
+
+def drift_period(df: pd.DataFrame, period: str, seed: int = 1, changed: float = 0.2) -> pd.DataFrame:
+    """
+    The next period of `df`: a fraction `changed` of the forecasts move, year-
+    to-date actuals grow, and ~2% of the lines close (are dropped).
+    """
+    rng = np.random.default_rng(seed)
+    n = len(df)
+    out = df.loc[rng.random(n) >= 0.02].copy()
+    m = len(out)
+    move = rng.random(m) < changed
+    out["cPeriod"] = str(period)
+    out["rForecast"] = np.round(out["rForecast"].to_numpy() * np.where(move, rng.normal(1.0, 0.15, m), 1.0), 2)
+    out["rYearAct"] = np.round(out["rYearAct"].to_numpy() * rng.uniform(1.0, 1.3, m), 2)
+    return out.reset_index(drop=True)
+
+
+def generate_period_pair(n_rows: int, periods: Tuple[str, str] = ("202305", "202312"),
+                         seed: int = 0) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    first = generate_period(n_rows, periods[0], seed=seed)
+    return first, drift_period(first, periods[1], seed=seed + 1)
+
+
+def iter_periods(n_rows: int, periods: List[str], seed: int = 0) -> Iterator[pd.DataFrame]:
+    """Consecutive periods, each drifted from the previous one (one held at a time)."""
+    frame = generate_period(n_rows, periods[0], seed=seed)
+    yield frame
+    for i, period in enumerate(periods[1:], start=1):
+        frame = drift_period(frame, period, seed=seed + i)
+        yield frame
@@ -0,0 +1,121 @@
+"""Tests for the single-flight coalescing and the TTLCache probes."""
+
+import threading
+import time
+
+import pytest
+
+from app.utils.cache import SingleFlight, TTLCache
+
+
+def _run_concurrently(n, fn):
+    results, errors = [None] * n, [None] * n
+
+    def call(i):
+        try:
+            results[i] = fn()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    return results, errors
+
+
+def test_single_flight_shares_one_result():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return object()
+
+    def waiter():
+        return flight.do("key", compute)
+
+    # Let every caller reach the flight before the leader finishes
+    timer = threading.Timer(0.2, release.set)
+    timer.start()
+    results, errors = _run_concurrently(8, waiter)
+    timer.join()
+
+    assert errors == [None] * 8
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert flight.coalesced == 7
+
+
+def test_single_flight_shares_one_exception():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        raise ValueError("boom")
+
+    timer = threading.Timer(0.2, release.set)
+    timer.start()
+    _, errors = _run_concurrently(5, lambda: flight.do("key", compute))
+    timer.join()
+
+    assert len(calls) == 1
+    assert all(isinstance(e, ValueError) for e in errors)
+    assert all(e is errors[0] for e in errors)
+
+
+def test_single_flight_runs_again_after_a_flight_lands():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+
+    assert flight.do("key", lambda: 1) == 1
+    assert flight.do("key", lambda: 2) == 2
+    with pytest.raises(ValueError):
+        flight.do("key", fail)
+    assert flight.do("key", lambda: 3) == 3
+
+
+def test_get_or_compute_computes_once_for_concurrent_misses():
+    cache = TTLCache("test_get_or_compute", maxsize=4, ttl=60)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return "value"
+
+    results, errors = _run_concurrently(6, lambda: cache.get_or_compute("k", compute))
+
+    assert errors == [None] * 6
+    assert results == ["value"] * 6
+    assert len(calls) == 1
+    assert cache.get("k") == "value"
+
+
+def test_peek_does_not_count_hits_or_misses():
+    cache = TTLCache("test_peek", maxsize=4, ttl=60)
+
+    assert cache.peek("k") is None
+    assert cache.peek("k", "default") == "default"
+    cache.set("k", "value")
+    assert cache.peek("k") == "value"
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["shared_hits"]) == (0, 0, 0)
+
+
+def test_peek_never_computes_or_returns_expired_entries():
+    cache = TTLCache("test_peek_expiry", maxsize=4, ttl=0.05)
+    cache.set("k", "value")
+    time.sleep(0.1)
+
+    assert cache.peek("k") is None
+    assert cache.stats()["misses"] == 0
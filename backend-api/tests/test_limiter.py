@@ -0,0 +1,89 @@
+"""Tests for the LLM concurrency limiter."""
+
+import asyncio
+
+import pytest
+
+from app.utils.limiter import ConcurrencyLimiter, LimiterFull
+
+
+async def _hold(limiter: ConcurrencyLimiter, release: asyncio.Event) -> None:
+    async with limiter.slot():
+        await release.wait()
+
+
+def test_full_queue_raises_with_retry_after():
+    async def scenario():
+        limiter = ConcurrencyLimiter("test_full", max_in_flight=1, max_queued=1)
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(limiter, release))
+        waiter = asyncio.create_task(_hold(limiter, release))
+        await asyncio.sleep(0.01)
+        assert (limiter.in_flight, limiter.queued) == (1, 1)
+
+        with pytest.raises(LimiterFull) as excinfo:
+            async with limiter.slot():
+                pass
+        assert excinfo.value.retry_after >= 1
+        assert limiter.rejected == 1
+
+        release.set()
+        await asyncio.gather(holder, waiter)
+        assert limiter.admitted == 2
+
+    asyncio.run(scenario())
+
+
+def test_no_queue_rejects_once_every_slot_is_taken():
+    async def scenario():
+        limiter = ConcurrencyLimiter("test_no_queue", max_in_flight=2, max_queued=0)
+        release = asyncio.Event()
+        holders = [asyncio.create_task(_hold(limiter, release)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(LimiterFull):
+            async with limiter.slot():
+                pass
+
+        release.set()
+        await asyncio.gather(*holders)
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_releases_its_place():
+    async def scenario():
+        limiter = ConcurrencyLimiter("test_timeout", max_in_flight=1, max_queued=1, queue_timeout=0.05)
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(limiter, release))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(LimiterFull):
+            async with limiter.slot():
+                pass
+        assert limiter.timed_out == 1
+        assert limiter.queued == 0
+
+        # The freed place in the queue can be taken again
+        waiter = asyncio.create_task(_hold(limiter, release))
+        await asyncio.sleep(0.01)
+        assert limiter.queued == 1
+        release.set()
+        await asyncio.gather(holder, waiter)
+        assert (limiter.in_flight, limiter.queued, limiter.admitted) == (0, 0, 2)
+
+    asyncio.run(scenario())
+
+
+def test_slot_is_released_when_the_block_raises():
+    async def scenario():
+        limiter = ConcurrencyLimiter("test_release", max_in_flight=1, max_queued=0)
+        with pytest.raises(RuntimeError):
+            async with limiter.slot():
+                raise RuntimeError("LLM call failed")
+        assert limiter.in_flight == 0
+
+        async with limiter.slot():
+            assert limiter.in_flight == 1
+
+    asyncio.run(scenario())